@@ -0,0 +1,106 @@
+'''
+Minimal runner for the benchmarks when asv is not installed:
+
+    python -m benchmarks [--filter SUBSTRING] [--max-size N] [--repeat R]
+
+Each time_ benchmark reports its best wall time over R runs, each peakmem_
+benchmark the peak memory traced by tracemalloc (Python and numpy allocations,
+not the process RSS that asv reports), each track_ benchmark its value, and
+each timeraw_ benchmark the best time of running its code in a new interpreter.
+'''
+
+from __future__ import print_function
+import argparse
+import glob
+import importlib
+import inspect
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+def _benchmark_classes():
+    here = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(here, 'bench_*.py'))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        module = importlib.import_module('benchmarks.' + module_name)
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__:
+                yield module_name, cls
+
+
+def _timeraw(code, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return '{:.4f} s'.format(best)
+
+
+def _measure(cls, method_name, param, repeat):
+    bench = cls()
+    if param is None:
+        if method_name.startswith('timeraw_'):
+            return _timeraw(getattr(bench, method_name)(), repeat)
+        call = lambda method: method()
+    else:
+        call = lambda method: method(param)
+    if hasattr(bench, 'setup'):
+        call(bench.setup)
+    method = getattr(bench, method_name)
+    try:
+        if method_name.startswith('time_'):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                call(method)
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            return '{:.4f} s'.format(best)
+        if method_name.startswith('peakmem_'):
+            tracemalloc.start()
+            try:
+                call(method)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            return '{:.1f} MB'.format(peak / 1e6)
+        return '{} {}'.format(call(method), getattr(method, 'unit', ''))
+    finally:
+        if hasattr(bench, 'teardown'):
+            call(bench.teardown)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Run the visJS2jupyter benchmarks without asv.')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks whose name contains this string')
+    parser.add_argument('--max-size', type=int, default=None,
+                        help='skip graph sizes larger than this')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each time_ benchmark, default: 3')
+    args = parser.parse_args(argv)
+
+    for module_name, cls in _benchmark_classes():
+        methods = [m for m in dir(cls) if m.startswith(('time_', 'timeraw_', 'peakmem_', 'track_'))]
+        for method_name in methods:
+            full_name = '{}.{}.{}'.format(module_name, cls.__name__, method_name)
+            if args.filter not in full_name:
+                continue
+            param_name = getattr(cls, 'param_names', ['n'])[0]
+            for param in getattr(cls, 'params', [None]):
+                # --max-size only applies to graph sizes
+                if args.max_size is not None and param_name == 'n' and param is not None and param > args.max_size:
+                    continue
+                result = _measure(cls, method_name, param, args.repeat)
+                label = '' if param is None else '{}={}'.format(param_name, param)
+                print('{:<60} {:<12} {}'.format(full_name, label, result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+'''
+Import time of the package modules, each measured in a fresh interpreter.
+A per-module breakdown is printed by e.g.
+
+    python -X importtime -c "import visJS2jupyter.visualizations"
+'''
+
+
+class ImportTime(object):
+    timeout = 120
+
+    def timeraw_import_visJS_module(self):
+        return 'import visJS2jupyter.visJS_module'
+
+    def timeraw_import_visualizations(self):
+        return 'import visJS2jupyter.visualizations'
+
+    def timeraw_import_batch(self):
+        return 'import visJS2jupyter.batch'
@@ -0,0 +1,111 @@
+'''
+Benchmarks of the heat diffusion kernel in scipy_heatKernel.
+'''
+
+import os
+import shutil
+import tempfile
+
+import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+
+from .common import scale_free_graph, seed_nodes
+
+
+class SciPYKernel(object):
+    # the laplacian is built from the sparse adjacency matrix in linear
+    # time; the kernel itself is a dense n x n matrix
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.seeds = dict((node, 1) for node in seed_nodes(self.G))
+
+    def time_build_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G)
+
+    def peakmem_build_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G)
+
+
+class Diffuse(object):
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        G = scale_free_graph(n)
+        self.kernel = scipy_heatKernel.SciPYKernel(G)
+        self.seeds = dict((node, 1) for node in seed_nodes(G))
+
+    def time_diffuse(self, n):
+        self.kernel.diffuse(self.seeds)
+
+
+class SparseKernel(object):
+    # kernel kept to its 50 largest entries per column, computed in column blocks
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.seeds = dict((node, 1) for node in seed_nodes(self.G))
+        self.kernel = scipy_heatKernel.SciPYKernel(self.G, top_k=50)
+
+    def time_build_sparse_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G, top_k=50)
+
+    def peakmem_build_sparse_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G, top_k=50)
+
+    def time_diffuse(self, n):
+        self.kernel.diffuse(self.seeds)
+
+    def track_truncation_error(self, n):
+        return self.kernel.truncation_error
+    track_truncation_error.unit = 'L1 per unit of input heat'
+
+
+class DiffusionSweep(object):
+    # heat for ten diffusion times from one eigendecomposition of the laplacian
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+    times = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10]
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.seeds = dict((node, 1) for node in seed_nodes(self.G))
+        self.kernel = scipy_heatKernel.SciPYKernel(self.G, mode='eigen')
+        self.kernel.eigendecomposition()
+
+    def time_eigendecomposition_and_sweep(self, n):
+        kernel = scipy_heatKernel.SciPYKernel(self.G, mode='eigen')
+        kernel.diffuseTimes(self.seeds, self.times)
+
+    def time_sweep(self, n):
+        self.kernel.diffuseTimes(self.seeds, self.times)
+
+
+class BlockedKernel(object):
+    # full kernel computed in column blocks and written to a memory-mapped
+    # file, in one process so that timings do not depend on the CPU count
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.directory = tempfile.mkdtemp()
+        self.kernel_file = os.path.join(self.directory, 'kernel.npy')
+
+    def teardown(self, n):
+        shutil.rmtree(self.directory)
+
+    def time_build_blocked_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G, kernel_file=self.kernel_file, n_workers=1)
+
+    def peakmem_build_blocked_kernel(self, n):
+        scipy_heatKernel.SciPYKernel(self.G, kernel_file=self.kernel_file, n_workers=1)
@@ -0,0 +1,65 @@
+'''
+Speed and accuracy of single precision (dtype=np.float32) propagation and
+diffusion, relative to the default double precision.
+'''
+
+import numpy as np
+
+import visJS2jupyter.adjacency as adjacency
+import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+import visJS2jupyter.visualizations as visualizations
+
+from .common import SIZES, scale_free_graph, seed_nodes
+
+
+def _relative_error(heat, reference):
+    '''
+    Largest absolute difference between two heat vectors, relative to the
+    largest reference heat.
+    '''
+
+    heat = np.asarray(heat, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    return float(np.abs(heat - reference).max()/np.abs(reference).max())
+
+
+class Float32Propagation(object):
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = adjacency.graph_to_adjacency(scale_free_graph(n))
+        self.seeds = seed_nodes(scale_free_graph(n))
+        self.Wprime_64 = visualizations.normalized_adj_matrix(self.G)
+        self.Wprime_32 = visualizations.normalized_adj_matrix(self.G, dtype=np.float32)
+
+    def time_network_propagation_float64(self, n):
+        visualizations.network_propagation(self.G, self.Wprime_64, self.seeds)
+
+    def time_network_propagation_float32(self, n):
+        visualizations.network_propagation(self.G, self.Wprime_32, self.seeds)
+
+    def track_relative_error(self, n):
+        return _relative_error(visualizations.network_propagation(self.G, self.Wprime_32, self.seeds),
+                               visualizations.network_propagation(self.G, self.Wprime_64, self.seeds))
+    track_relative_error.unit = 'max abs error / max heat'
+
+
+class Float32Diffusion(object):
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        G = scale_free_graph(n)
+        self.seeds = dict((node, 1) for node in seed_nodes(G))
+        self.kernel_64 = scipy_heatKernel.SciPYKernel(G, dtype=np.float64)
+        self.kernel_32 = scipy_heatKernel.SciPYKernel(G, dtype=np.float32)
+
+    def track_relative_error(self, n):
+        heat_32 = self.kernel_32.diffuse(self.seeds)
+        heat_64 = self.kernel_64.diffuse(self.seeds)
+        nodes = list(heat_64)
+        return _relative_error([heat_32[node] for node in nodes], [heat_64[node] for node in nodes])
+    track_relative_error.unit = 'max abs error / max heat'
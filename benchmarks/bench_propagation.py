@@ -0,0 +1,126 @@
+'''
+Benchmarks of the random walk propagation in visualizations.
+'''
+
+import shutil
+import tempfile
+
+import visJS2jupyter.adjacency as adjacency
+import visJS2jupyter.batch as batch
+import visJS2jupyter.operators as operators
+import visJS2jupyter.visualizations as visualizations
+
+from .common import SIZES, scale_free_graph, seed_nodes
+
+
+class NormalizedAdjMatrix(object):
+    # the normalized adjacency matrix is a dense n x n array (80 GB at 100k nodes)
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+
+    def time_normalized_adj_matrix(self, n):
+        visualizations.normalized_adj_matrix(self.G)
+
+    def peakmem_normalized_adj_matrix(self, n):
+        visualizations.normalized_adj_matrix(self.G)
+
+
+class NetworkPropagation(object):
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.Wprime = visualizations.normalized_adj_matrix(self.G)
+        self.seeds = seed_nodes(self.G)
+
+    def time_network_propagation(self, n):
+        visualizations.network_propagation(self.G, self.Wprime, self.seeds)
+
+    def peakmem_network_propagation(self, n):
+        visualizations.network_propagation(self.G, self.Wprime, self.seeds)
+
+
+class PushPropagation(object):
+    # local push on a sparse operator, which scales to the largest graphs
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = adjacency.graph_to_adjacency(scale_free_graph(n))
+        self.Wprime = visualizations.normalized_adj_matrix(self.G).tocsc()
+        self.seeds = seed_nodes(scale_free_graph(n), num_seeds=5)
+
+    def time_push_propagation(self, n):
+        visualizations.network_propagation(self.G, self.Wprime, self.seeds, method='push')
+
+    def peakmem_push_propagation(self, n):
+        visualizations.network_propagation(self.G, self.Wprime, self.seeds, method='push')
+
+
+class MemmapPropagation(object):
+    # power iteration over a CSR operator memory mapped from disk, 10000 rows
+    # at a time; peak memory should stay near one row block plus the heat vectors
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        G = adjacency.graph_to_adjacency(scale_free_graph(n))
+        self.directory = tempfile.mkdtemp()
+        operators.save_csr_operator(visualizations.normalized_adj_matrix(G), self.directory, labels=G[1])
+        self.Wprime = operators.MemmapCSROperator(self.directory, block_rows=10000)
+        self.seeds = seed_nodes(scale_free_graph(n))
+
+    def teardown(self, n):
+        shutil.rmtree(self.directory)
+
+    def time_memmap_propagation(self, n):
+        visualizations.network_propagation(None, self.Wprime, self.seeds)
+
+    def peakmem_memmap_propagation(self, n):
+        visualizations.network_propagation(None, self.Wprime, self.seeds)
+
+
+class ThreadedPropagation(object):
+    # core scaling of the row-blocked parallel product on a 100,000 node
+    # graph; the parameter is the number of threads, not the graph size
+    params = [1, 2, 4, 8]
+    param_names = ['n_workers']
+    timeout = 600
+
+    def setup(self, n_workers):
+        self.G = adjacency.graph_to_adjacency(scale_free_graph(100000))
+        self.Wprime = visualizations.normalized_adj_matrix(self.G)
+        self.seeds = seed_nodes(scale_free_graph(100000))
+
+    def time_threaded_propagation(self, n_workers):
+        visualizations.network_propagation(self.G, self.Wprime, self.seeds, n_workers=n_workers)
+
+
+class SeedSetPropagation(object):
+    # 1000 seed sets of 5 nodes, keeping the 100 hottest nodes of each
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        G = scale_free_graph(n)
+        self.Wprime = visualizations.normalized_adj_matrix(G, sparse=True)
+        self.G = G
+        self.seed_sets = [seed_nodes(G, num_seeds=5, seed=i) for i in range(1000)]
+
+    def time_propagate_seed_sets_top_k(self, n):
+        batch.propagate_seed_sets(self.G, self.seed_sets, Wprime=self.Wprime, top_k=100)
+
+    def peakmem_propagate_seed_sets_top_k(self, n):
+        batch.propagate_seed_sets(self.G, self.seed_sets, Wprime=self.Wprime, top_k=100)
+
+    def peakmem_propagate_seed_sets_dense(self, n):
+        batch.propagate_seed_sets(self.G, self.seed_sets, Wprime=self.Wprime)
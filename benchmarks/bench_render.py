@@ -0,0 +1,191 @@
+'''
+Benchmarks of graph overlap, color mapping, Cytoscape export, visjs_network
+serialization, community overviews, edge backbones, label culling and static
+PNG rendering.
+'''
+
+import os
+import shutil
+import tempfile
+
+import matplotlib
+import numpy as np
+import visJS2jupyter.adjacency as adjacency
+import visJS2jupyter.backbone as backbone
+import visJS2jupyter.coarsen as coarsen
+import visJS2jupyter.label_culling as label_culling
+import visJS2jupyter.pipeline as pipeline
+import visJS2jupyter.static as static
+import visJS2jupyter.visJS_module as visJS_module
+import visJS2jupyter.visualizations as visualizations
+
+from .common import SIZES, heat_graph, scale_free_graph, seed_nodes, vis_dicts
+
+
+class GraphOverlap(object):
+    # membership tests against numpy arrays make this quadratic in n
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G1 = scale_free_graph(n, seed=0)
+        self.G2 = scale_free_graph(n, seed=1)
+
+    def time_create_graph_overlap(self, n):
+        visualizations.create_graph_overlap(self.G1, self.G2, 'graph 1', 'graph 2')
+
+    def peakmem_create_graph_overlap(self, n):
+        visualizations.create_graph_overlap(self.G1, self.G2, 'graph 1', 'graph 2')
+
+
+class ColorMapping(object):
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = heat_graph(n)
+        self.cmap = matplotlib.cm.autumn_r
+
+    def time_return_node_to_color(self, n):
+        visJS_module.return_node_to_color(self.G, field_to_map='node_heat',
+                                          cmap=self.cmap)
+
+    def time_return_edge_to_color(self, n):
+        visJS_module.return_edge_to_color(self.G, field_to_map='edge_weight',
+                                          cmap=self.cmap)
+
+    def peakmem_return_node_to_color(self, n):
+        visJS_module.return_node_to_color(self.G, field_to_map='node_heat',
+                                          cmap=self.cmap)
+
+
+class ExportToCytoscape(object):
+    # the export is quadratic in n
+    params = [250, 500, 1000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.nodes_dict, self.edges_dict = vis_dicts(n)
+        self.tmpdir = tempfile.mkdtemp()
+        self.export_file = os.path.join(self.tmpdir, 'network.json')
+
+    def teardown(self, n):
+        shutil.rmtree(self.tmpdir)
+
+    def time_export_to_cytoscape(self, n):
+        visJS_module.export_to_cytoscape(nodes_dict=[dict(d) for d in self.nodes_dict],
+                                         edges_dict=self.edges_dict,
+                                         export_file=self.export_file)
+
+
+class VisjsNetwork(object):
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.nodes_dict, self.edges_dict = vis_dicts(n)
+
+    def time_visjs_network_html(self, n):
+        visJS_module.visjs_network(self.nodes_dict, self.edges_dict, output='html')
+
+    def peakmem_visjs_network_html(self, n):
+        visJS_module.visjs_network(self.nodes_dict, self.edges_dict, output='html')
+
+    def track_html_bytes(self, n):
+        return len(visJS_module.visjs_network(self.nodes_dict, self.edges_dict, output='html'))
+    track_html_bytes.unit = 'bytes'
+
+
+class HeatPropOverview(object):
+    # the browser gets at most 200 communities, and 200 nodes per community
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        G = scale_free_graph(n)
+        self.graph = adjacency.graph_to_adjacency(G)
+        self.seeds = seed_nodes(G)
+
+    def _draw(self):
+        pipeline.clear_stage_caches()
+        return visualizations.draw_heat_prop_overview(self.graph, self.seeds, output='html')
+
+    def time_coarsen(self, n):
+        coarsen.coarsen(self.graph[0], max_communities=200)
+
+    def time_draw_heat_prop_overview(self, n):
+        self._draw()
+
+    def peakmem_draw_heat_prop_overview(self, n):
+        self._draw()
+
+    def track_html_bytes(self, n):
+        return len(self._draw())
+    track_html_bytes.unit = 'bytes'
+
+
+class EdgeBackbone(object):
+    # random weighted edges among 10,000 nodes
+    params = [100000, 1000000]
+    param_names = ['num_edges']
+    timeout = 600
+
+    def setup(self, num_edges):
+        rng = np.random.RandomState(0)
+        self.rows = rng.randint(0, 10000, num_edges)
+        self.cols = rng.randint(0, 10000, num_edges)
+        self.weights = rng.exponential(size=num_edges)
+
+    def time_disparity(self, num_edges):
+        backbone.edge_backbone(self.rows, self.cols, self.weights, 10000, 5000, method='disparity')
+
+    def time_top_k(self, num_edges):
+        backbone.edge_backbone(self.rows, self.cols, self.weights, 10000, 5000, method='top_k')
+
+
+class LabelCulling(object):
+    # labels of n nodes spread over a 2000 x 2000 layout, as drawn
+    params = SIZES
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        rng = np.random.RandomState(0)
+        self.positions = [tuple(p) for p in rng.uniform(-1000, 1000, (n, 2))]
+        self.labels = [str(i) for i in range(n)]
+        self.priority = rng.exponential(size=n)
+
+    def time_cull_labels(self, n):
+        label_culling.cull_labels(self.positions, self.labels, self.priority)
+
+    def track_labels_kept(self, n):
+        return sum(1 for label in label_culling.cull_labels(self.positions, self.labels, self.priority) if label)
+    track_labels_kept.unit = 'labels'
+
+
+class StaticRender(object):
+    # 20,000 nodes on a 2000 x 2000 layout, with edges between nearby nodes
+    params = [100000, 1000000]
+    param_names = ['num_edges']
+    timeout = 600
+
+    def setup(self, num_edges):
+        rng = np.random.RandomState(0)
+        positions = rng.uniform(-1000, 1000, (20000, 2))
+        order = np.lexsort((positions[:, 0]//50, positions[:, 1]//50))
+        sources = rng.randint(0, 20000, num_edges)
+        targets = (sources + rng.randint(1, 30, num_edges)) % 20000
+        self.nodes_dict = [{'x': x, 'y': y, 'degree': 5, 'color': 'rgba(255, 0, 0, 1)'} for x, y in positions]
+        self.edges_dict = [{'source': int(order[s]), 'target': int(order[t]), 'color': 'rgba(0, 0, 255, 0.8)'}
+                           for s, t in zip(sources, targets)]
+
+    def time_render_png(self, num_edges):
+        static.render_png(self.nodes_dict, self.edges_dict, density=False)
+
+    def time_render_png_density(self, num_edges):
+        static.render_png(self.nodes_dict, self.edges_dict, density=True)
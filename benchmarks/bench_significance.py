@@ -0,0 +1,28 @@
+'''
+Benchmarks of the permutation based significance of propagated heat.
+'''
+
+import visJS2jupyter.significance as significance
+import visJS2jupyter.visualizations as visualizations
+
+from .common import scale_free_graph, seed_nodes
+
+
+class HeatSignificance(object):
+    # 100 random seed sets in one process, so that timings do not depend on the CPU count
+    params = [1000, 10000]
+    param_names = ['n']
+    timeout = 600
+
+    def setup(self, n):
+        self.G = scale_free_graph(n)
+        self.Wprime = visualizations.normalized_adj_matrix(self.G, sparse=True)
+        self.seeds = seed_nodes(self.G)
+
+    def time_heat_significance(self, n):
+        significance.heat_significance(self.G, self.seeds, Wprime=self.Wprime,
+                                       num_sets=100, n_workers=1)
+
+    def peakmem_heat_significance(self, n):
+        significance.heat_significance(self.G, self.seeds, Wprime=self.Wprime,
+                                       num_sets=100, n_workers=1)
@@ -0,0 +1,67 @@
+'''
+Seeded synthetic graphs shared by the benchmarks.
+'''
+
+import networkx as nx
+import numpy as np
+
+# graph sizes (number of nodes) benchmarked by default; individual benchmarks
+# cap this where the code under test is quadratic in the number of nodes
+SIZES = [1000, 10000, 100000]
+
+_graphs = {}
+
+
+def scale_free_graph(n, m=3, seed=0):
+    '''
+    Barabasi-Albert (scale-free) graph with n nodes, each new node attaching
+    to m existing ones. Memoized, since large graphs are slow to generate.
+    '''
+
+    key = (n, m, seed)
+    if key not in _graphs:
+        _graphs[key] = nx.barabasi_albert_graph(n, m, seed=seed)
+    return _graphs[key]
+
+
+def seed_nodes(G, num_seeds=10, seed=0):
+    '''
+    A reproducible random sample of num_seeds nodes of G.
+    '''
+
+    rng = np.random.RandomState(seed)
+    nodes = list(G.nodes())
+    return [nodes[i] for i in rng.choice(len(nodes), num_seeds, replace=False)]
+
+
+def heat_graph(n, seed=0):
+    '''
+    Scale-free graph with a random 'node_heat' node attribute and an
+    'edge_weight' edge attribute, as set by the heat draw functions.
+    '''
+
+    G = scale_free_graph(n, seed=seed).copy()
+    rng = np.random.RandomState(seed)
+    heat = rng.exponential(size=n)
+    nx.set_node_attributes(G, name='node_heat', values=dict(zip(G.nodes(), heat)))
+    nx.set_edge_attributes(G, name='edge_weight',
+                           values=dict((e, max(heat[e[0]], heat[e[1]])) for e in G.edges()))
+    return G
+
+
+def vis_dicts(n, seed=0):
+    '''
+    nodes_dict and edges_dict for visjs_network built from a scale-free graph.
+    '''
+
+    G = scale_free_graph(n, seed=seed)
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(-1000, 1000, size=(n, 2))
+    nodes = list(G.nodes())
+    node_map = dict(zip(nodes, range(n)))
+    nodes_dict = [{'id': str(node), 'x': float(xy[i, 0]), 'y': float(xy[i, 1]),
+                   'degree': G.degree(node), 'color': 'rgba(255,0,0,1)'}
+                  for i, node in enumerate(nodes)]
+    edges_dict = [{'source': node_map[u], 'target': node_map[v], 'color': 'rgba(0,0,0,0.3)'}
+                  for u, v in G.edges()]
+    return nodes_dict, edges_dict
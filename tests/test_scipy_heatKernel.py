@@ -0,0 +1,47 @@
+'''
+Regression tests of the heat kernel laplacian: degrees on the diagonal
+(the original build left the diagonal at zero on networkx 2).
+'''
+
+import networkx as nx
+import numpy as np
+import scipy.linalg
+
+import visJS2jupyter.adjacency as adjacency
+from visJS2jupyter.scipy_heatKernel import SciPYKernel
+
+
+def _graph():
+    G = nx.barabasi_albert_graph(60, 2, seed=1)
+    G = nx.relabel_nodes(G, lambda n: 'g%d' % n)
+    G.add_edge('g3', 'g3') # self loops are not part of the laplacian
+    return G
+
+
+def test_kernel_is_exponential_of_laplacian():
+    G = _graph()
+    kernel = SciPYKernel(G, dtype=np.float64).kernel
+    H = G.copy()
+    H.remove_edges_from(list(nx.selfloop_edges(H)))
+    L = nx.to_numpy_array(H, nodelist=sorted(H))
+    L = np.diag(L.sum(axis=1)) - L
+    np.testing.assert_allclose(np.asarray(kernel.todense() if hasattr(kernel, 'todense') else kernel),
+                               scipy.linalg.expm(-0.1*L), atol=1e-10)
+
+
+def test_diffused_heats():
+    heats = SciPYKernel(_graph(), dtype=np.float64).diffuse({'g5': 1., 'g1': 1.})
+    hottest = sorted(heats, key=heats.get, reverse=True)[:5]
+    assert hottest == ['g1', 'g5', 'g22', 'g26', 'g3']
+    np.testing.assert_allclose([heats[n] for n in hottest],
+                               [0.572292, 0.363863, 0.117395, 0.117247, 0.066219], atol=1e-6)
+    # the laplacian's columns sum to zero, so diffusion conserves heat
+    assert abs(sum(heats.values()) - 2) < 1e-9
+
+
+def test_adjacency_pair_matches_graph():
+    G = _graph()
+    from_graph = SciPYKernel(G, dtype=np.float64).diffuse({'g5': 1.})
+    from_pair = SciPYKernel(adjacency.graph_to_adjacency(G), dtype=np.float64).diffuse({'g5': 1.})
+    for node in G:
+        assert abs(from_graph[node] - from_pair[node]) < 1e-12
@@ -0,0 +1,164 @@
+'''
+--------------------------------------------------------
+
+Compact sparse adjacency representation of a network: a scipy CSR matrix plus
+a list of node labels, where labels[i] names row and column i. This is what
+the loaders in visJS2jupyter.loaders return, and what normalized_adj_matrix,
+network_propagation and SciPYKernel accept in place of a networkX graph.
+networkX graphs are only built for the (small) subgraph that is drawn.
+
+--------------------------------------------------------
+'''
+
+import sys
+
+import numpy as np
+
+
+def is_adjacency(G):
+    '''
+    True if G is an (adjacency, labels) pair rather than a networkX graph.
+    '''
+
+    if not (isinstance(G, tuple) and len(G) == 2):
+        return False
+    # a scipy.sparse matrix cannot exist before scipy.sparse has been imported
+    sparse = sys.modules.get('scipy.sparse')
+    return sparse is not None and sparse.issparse(G[0])
+
+
+def edges_to_adjacency(rows, cols, weights, num_nodes, directed=False):
+    '''
+    Builds a CSR adjacency matrix from arrays of edge endpoints (node indices).
+    Self loops are dropped, and an edge listed more than once keeps its
+    largest weight.
+
+    Inputs:
+        - rows: array of source node indices
+        - cols: array of target node indices
+        - weights: array of edge weights, or None for an unweighted network
+        - num_nodes: number of rows and columns of the matrix
+        - directed: if False, the matrix is made symmetric, default: False
+
+    Returns:
+        - num_nodes x num_nodes scipy.sparse CSR matrix
+    '''
+
+    import scipy.sparse
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    if weights is None:
+        weights = np.ones(len(rows))
+    weights = np.asarray(weights, dtype=np.float64)
+
+    keep = rows != cols
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    if not directed:
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+        weights = np.concatenate([weights, weights])
+
+    # sort by row, column then weight and keep the last entry of each edge
+    order = np.lexsort((weights, cols, rows))
+    rows, cols, weights = rows[order], cols[order], weights[order]
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+
+    return scipy.sparse.csr_matrix((weights[last], (rows[last], cols[last])),
+                                   shape=(num_nodes, num_nodes))
+
+
+def graph_to_adjacency(G, weight=None, nodelist=None):
+    '''
+    Converts a networkX graph to an (adjacency, labels) pair.
+
+    Inputs:
+        - G: a networkX graph
+        - weight: edge attribute to use as the edge weight, or None for an
+          unweighted adjacency matrix, default: None
+        - nodelist: order of the rows and columns, default: G.nodes()
+
+    Returns:
+        - adjacency: scipy.sparse CSR matrix
+        - labels: list of node labels, in row order
+    '''
+
+    labels = list(G.nodes()) if nodelist is None else list(nodelist)
+    node_to_index = dict(zip(labels, range(len(labels))))
+
+    edges = [(node_to_index[u], node_to_index[v], 1 if weight is None else d[weight])
+             for u, v, d in G.edges(data=True)
+             if u in node_to_index and v in node_to_index]
+    rows, cols, weights = zip(*edges) if edges else ((), (), ())
+
+    adjacency = edges_to_adjacency(rows, cols, weights, len(labels), directed=G.is_directed())
+    return adjacency, labels
+
+
+def as_adjacency(G, weight=None):
+    '''
+    Returns G as an (adjacency, labels) pair, converting networkX graphs.
+    '''
+
+    if is_adjacency(G):
+        return G[0].tocsr(), list(G[1])
+    return graph_to_adjacency(G, weight=weight)
+
+
+def node_labels(G):
+    '''
+    List of the nodes of a networkX graph or of an (adjacency, labels) pair,
+    in row order.
+    '''
+
+    if is_adjacency(G):
+        return list(G[1])
+    return list(G.nodes())
+
+
+def adjacency_to_graph(adjacency, labels, nodes=None, weight='weight'):
+    '''
+    Builds the networkX graph induced by a set of nodes of an (adjacency,
+    labels) network.
+
+    Inputs:
+        - adjacency: scipy.sparse adjacency matrix
+        - labels: list of node labels, in row order
+        - nodes: labels of the nodes to keep, default: all nodes
+        - weight: edge attribute to store edge weights in, or None to drop
+          them, default: 'weight'
+
+    Returns:
+        - networkX Graph (DiGraph if the adjacency matrix is not symmetric)
+    '''
+
+    if nodes is None:
+        index = np.arange(len(labels))
+    else:
+        label_to_index = dict(zip(labels, range(len(labels))))
+        index = np.array([label_to_index[n] for n in nodes], dtype=np.int64)
+    return subgraph_from_indices(adjacency, labels, index, weight=weight)
+
+
+def subgraph_from_indices(adjacency, labels, index, weight='weight'):
+    '''
+    adjacency_to_graph for nodes given by row index rather than label. The
+    nodes are added to the graph in the order of index.
+    '''
+
+    import networkx as nx
+    import scipy.sparse
+
+    index = np.asarray(index, dtype=np.int64)
+    sub = adjacency.tocsr()[index][:, index]
+    directed = (sub != sub.T).nnz > 0
+    sub = sub.tocoo() if directed else scipy.sparse.triu(sub).tocoo()
+
+    G = nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(labels[i] for i in index)
+    if weight is None:
+        G.add_edges_from((labels[index[i]], labels[index[j]]) for i, j in zip(sub.row, sub.col))
+    else:
+        G.add_edges_from((labels[index[i]], labels[index[j]], {weight: float(w)})
+                         for i, j, w in zip(sub.row, sub.col, sub.data))
+    return G
@@ -0,0 +1,176 @@
+'''
+--------------------------------------------------------
+
+Non-blocking variants of the draw functions in visualizations. The work runs
+in a background thread while the notebook stays usable, progress is shown in
+a placeholder output, and the finished network is displayed into it.
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import visJS2jupyter.pipeline as pipeline
+import visJS2jupyter.visualizations as visualizations
+
+# shared pool for background renders, created on first use
+_executor = {}
+_executor_lock = threading.Lock()
+
+
+class RenderCancelled(Exception):
+    '''
+    Raised inside a background render once cancel() has been requested.
+    '''
+
+
+def _get_executor(max_workers=2):
+    with _executor_lock:
+        if 'pool' not in _executor:
+            _executor['pool'] = ThreadPoolExecutor(max_workers=max_workers)
+        return _executor['pool']
+
+
+class BackgroundRender(object):
+    '''
+    Handle on a draw function running in a background thread.
+
+    The underlying concurrent.futures.Future is available as .future, and the
+    handle can be awaited directly from a notebook cell (await handle).
+    Cancellation is cooperative: a render that has already started stops at
+    the next stage boundary (see pipeline.STAGES).
+    '''
+
+    def __init__(self, draw_function, args, kwargs,
+                 display_output=True,
+                 progress_callback=None):
+        self.name = draw_function.__name__
+        self.stage = 'queued'
+        self.stages = []
+        self._cancel_event = threading.Event()
+        self._progress_callback = progress_callback
+        self._display_handle = None
+
+        if display_output:
+            from IPython.display import display, HTML
+            self._display_handle = display(HTML(self._status_html()), display_id=True)
+
+        self.future = _get_executor().submit(self._run, draw_function, args, kwargs)
+        self.future.add_done_callback(self._on_done)
+
+    def _status_html(self):
+        return '<i>{}: {}</i>'.format(self.name, self.stage)
+
+    def _on_stage(self, stage):
+        if self._cancel_event.is_set():
+            raise RenderCancelled('{} cancelled before stage {}'.format(self.name, stage))
+        self.stage = stage
+        self.stages.append(stage)
+        if self._progress_callback is not None:
+            self._progress_callback(stage)
+        if self._display_handle is not None:
+            from IPython.display import HTML
+            self._display_handle.update(HTML(self._status_html()))
+
+    def _run(self, draw_function, args, kwargs):
+        pipeline._stage_listener.callback = self._on_stage
+        try:
+            return draw_function(*args, **kwargs)
+        finally:
+            pipeline._stage_listener.callback = None
+
+    def _on_done(self, future):
+        if future.cancelled():
+            self.stage = 'cancelled'
+        elif isinstance(future.exception(), RenderCancelled):
+            self.stage = 'cancelled'
+        elif future.exception() is not None:
+            self.stage = 'failed: {!r}'.format(future.exception())
+        else:
+            self.stage = 'done'
+
+        if self._display_handle is not None:
+            from IPython.display import HTML
+            if self.stage == 'done' and future.result() is not None:
+                self._display_handle.update(future.result())
+            else:
+                self._display_handle.update(HTML(self._status_html()))
+
+    def cancel(self):
+        '''
+        Request cancellation. Returns True if the render had not started yet
+        (it will never run), False if it will stop at its next stage boundary.
+        '''
+
+        self._cancel_event.set()
+        return self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        '''
+        Block until the render finishes and return the draw function's result.
+        '''
+
+        return self.future.result(timeout)
+
+    def __await__(self):
+        import asyncio
+        return asyncio.wrap_future(self.future).__await__()
+
+    def __repr__(self):
+        return '<BackgroundRender {}: {}>'.format(self.name, self.stage)
+
+
+def draw_heat_prop_async(G, seed_nodes,
+                         display_output=True,
+                         progress_callback=None,
+                         **kwargs):
+    '''
+    Non-blocking visualizations.draw_heat_prop. The kernel build, propagation,
+    layout and rendering run in a background thread; kwargs are passed to
+    draw_heat_prop.
+
+    Inputs:
+        - G: a networkX graph
+        - seed_nodes: nodes on which to initialize the simulation
+        - display_output: display a placeholder that shows progress and is
+          replaced by the network when done, default: True
+        - progress_callback: function called with the name of each stage as it starts, default: None
+
+    Returns:
+        - BackgroundRender handle (awaitable; .future, .cancel(), .result())
+    '''
+
+    return BackgroundRender(visualizations.draw_heat_prop, (G, seed_nodes), kwargs,
+                            display_output=display_output,
+                            progress_callback=progress_callback)
+
+
+def draw_colocalization_async(G, seed_nodes_1, seed_nodes_2,
+                              display_output=True,
+                              progress_callback=None,
+                              **kwargs):
+    '''
+    Non-blocking visualizations.draw_colocalization. The propagation, layout
+    and rendering run in a background thread; kwargs are passed to
+    draw_colocalization.
+
+    Inputs:
+        - G: a networkX graph
+        - seed_nodes_1: first set of nodes on which to initialize the simulation
+        - seed_nodes_2: second set of nodes on which to initialize the simulation
+        - display_output: display a placeholder that shows progress and is
+          replaced by the network when done, default: True
+        - progress_callback: function called with the name of each stage as it starts, default: None
+
+    Returns:
+        - BackgroundRender handle (awaitable; .future, .cancel(), .result())
+    '''
+
+    return BackgroundRender(visualizations.draw_colocalization, (G, seed_nodes_1, seed_nodes_2), kwargs,
+                            display_output=display_output,
+                            progress_callback=progress_callback)
@@ -0,0 +1,338 @@
+'''
+--------------------------------------------------------
+
+Headless batch rendering of heat propagation reports, one standalone html
+file per seed set. Run as:
+
+    python -m visJS2jupyter graph.txt seeds.txt -o reports/ -w 8
+
+propagate_seed_sets scores many seed sets without rendering them.
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+import argparse
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import visJS2jupyter.adjacency as adjacency
+
+# graph, propagation operator and draw options shared by every job in a worker
+_worker_state = {}
+
+
+def read_seed_table(seed_file, delimiter='\t', seed_delimiter=','):
+    '''
+    Reads a table of seed sets, one job per line: a job id followed by the
+    job's seed nodes. Blank lines and lines starting with '#' are skipped.
+
+    Inputs:
+        - seed_file: path to the seed table
+        - delimiter: separator between the job id and the seed list, default: tab
+        - seed_delimiter: separator between seed nodes, default: ','
+
+    Returns:
+        - list of (job_id, list of seed nodes) tuples, in file order
+    '''
+
+    jobs = []
+    with open(seed_file, 'r') as f:
+        for row in csv.reader(f, delimiter=delimiter):
+            if not row or row[0].startswith('#'):
+                continue
+            seeds = [s.strip() for s in seed_delimiter.join(row[1:]).split(seed_delimiter)]
+            jobs.append((row[0].strip(), [s for s in seeds if s]))
+    return jobs
+
+
+def _job_file_name(job_id):
+    '''
+    Makes a job id safe to use as a file name inside the output directory:
+    characters other than letters, digits, '.', '_' and '-' become '_', and
+    a leading '.' (as in '..') becomes '_'.
+    '''
+
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', str(job_id))
+    return re.sub(r'^\.', '_', name) or '_'
+
+
+def _init_worker(G, Wprime, heat_kernel, draw_kwargs):
+    '''
+    Process pool initializer: receives the graph and operator once per worker.
+    '''
+
+    # never pick an interactive backend in a worker
+    import matplotlib
+    matplotlib.use('Agg')
+
+    _worker_state['G'] = G
+    _worker_state['graph_nodes'] = set(adjacency.node_labels(G))
+    _worker_state['Wprime'] = Wprime
+    _worker_state['heat_kernel'] = heat_kernel
+    _worker_state['draw_kwargs'] = draw_kwargs
+
+
+def _render_job(job_index, job_id, file_name, seed_nodes, output_dir):
+    '''
+    Renders a single seed set to output_dir/file_name.html inside a worker.
+    '''
+
+    import visJS2jupyter.visualizations as visualizations
+
+    G = _worker_state['G']
+    graph_nodes = _worker_state['graph_nodes']
+    draw_kwargs = dict(_worker_state['draw_kwargs'])
+    output_file = os.path.join(output_dir, '{}.html'.format(file_name))
+
+    missing = [node for node in seed_nodes if node not in graph_nodes]
+    if missing:
+        print('Job {}: dropping seed nodes not in graph: {}'.format(job_id, ', '.join(missing)))
+    seed_nodes = [node for node in seed_nodes if node in graph_nodes]
+    if not seed_nodes:
+        print('Job {}: no seed nodes in graph, skipping'.format(job_id))
+        return job_id, None
+
+    # a unique graph_id and export file per job, so concurrent jobs never share file names
+    if draw_kwargs.get('export_network'):
+        draw_kwargs['export_file'] = os.path.join(output_dir, '{}.json'.format(file_name))
+
+    html = visualizations.draw_heat_prop(G, seed_nodes,
+                                         Wprime=_worker_state['Wprime'],
+                                         heat_kernel=_worker_state['heat_kernel'],
+                                         graph_id=job_index,
+                                         graph_title=job_id,
+                                         output='html',
+                                         **draw_kwargs)
+    if html is None:
+        return job_id, None
+
+    f = open(output_file, 'w')
+    f.write(html)
+    f.close()
+    return job_id, output_file
+
+
+def render_heat_prop_batch(G, jobs, output_dir,
+                           n_workers=None,
+                           random_walk=True,
+                           **kwargs):
+    '''
+    Renders draw_heat_prop for many seed sets in a process pool, writing one
+    standalone html file per job. The propagation operator (normalized
+    adjacency matrix, or heat kernel when random_walk = False) is computed
+    once and shared with each worker along with the graph, instead of being
+    rebuilt for every job. Additional kwargs are passed to draw_heat_prop.
+
+    Inputs:
+        - G: a networkX graph, or an (adjacency, labels) pair (see visJS2jupyter.loaders)
+        - jobs: list of (job_id, seed nodes) tuples, e.g. from read_seed_table()
+        - output_dir: directory in which to write job_id.html files (characters
+          other than letters, digits, '.', '_' and '-' in job ids become '_')
+        - n_workers: number of worker processes, default: None (one per CPU)
+        - random_walk: True for random walk style propagation, False for diffusion
+
+    Returns:
+        - dictionary mapping each job_id to its html file, or None if the job
+          failed; None if job ids are not unique
+    '''
+
+    import visJS2jupyter.visualizations as visualizations
+    import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+
+    # each job's files are named after its id, so the file names made from
+    # the ids (compared case-insensitively) must be unique
+    file_names = [_job_file_name(job_id) for job_id, seeds in jobs]
+    seen = {}
+    duplicates = []
+    for (job_id, seeds), name in zip(jobs, file_names):
+        if name.lower() in seen:
+            duplicates.append('{} ({})'.format(job_id, seen[name.lower()]))
+        else:
+            seen[name.lower()] = job_id
+    if duplicates:
+        print('Job ids must be unique, duplicates: {}'.format(', '.join(duplicates)))
+        return
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    Wprime = None
+    heat_kernel = None
+    if random_walk:
+        # sparse, so workers are not each sent a dense nodes x nodes matrix
+        Wprime = visualizations.normalized_adj_matrix(G, sparse=True)
+    else:
+        heat_kernel = scipy_heatKernel.SciPYKernel(G)
+    kwargs['random_walk'] = random_walk
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker,
+                             initargs=(G, Wprime, heat_kernel, kwargs)) as executor:
+        futures = dict((executor.submit(_render_job, i, job_id, name, seeds, output_dir), job_id)
+                       for i, ((job_id, seeds), name) in enumerate(zip(jobs, file_names)))
+        for done, future in enumerate(as_completed(futures)):
+            job_id = futures[future]
+            try:
+                output_file = future.result()[1]
+            except Exception as e: # one failed job must not abort the batch
+                print('Job {} failed: {!r}'.format(job_id, e))
+                output_file = None
+            results[job_id] = output_file
+            print('[{}/{}] {} -> {}'.format(done + 1, len(jobs), job_id, output_file))
+
+    return results
+
+
+def propagate_seed_sets(G, seed_sets,
+                        random_walk=True,
+                        Wprime=None,
+                        heat_kernel=None,
+                        alpha=.5,
+                        num_its=20,
+                        batch_size=100,
+                        top_k=None):
+    '''
+    Propagates heat from many seed sets, batch_size sets at a time as the
+    columns of one matrix. With top_k, only the top_k hottest nodes of each
+    seed set are kept from each batch, so the full nodes x seed sets heat
+    matrix is never held in memory.
+
+    Inputs:
+        - G: a networkX graph, or an (adjacency, labels) pair (see visJS2jupyter.loaders)
+        - seed_sets: list of seed node lists (or, if random_walk = False,
+          dictionaries of initial heats), or of (job_id, seed nodes) tuples
+          as returned by read_seed_table
+        - random_walk: True for random walk style propagation (as in
+          network_propagation), False for diffusion with a heat kernel, default: True
+        - Wprime: normalized adjacency matrix or operator, default: None (a
+          sparse one is computed from G)
+        - heat_kernel: precomputed scipy_heatKernel.SciPYKernel of G, used
+          when random_walk = False, default: None
+        - alpha: heat dissipation coefficient, default: 0.5
+        - num_its: number of propagation iterations, default: 20
+        - batch_size: number of seed sets propagated together, default: 100
+        - top_k: number of hottest nodes to keep per seed set, default: None (all)
+
+    Returns:
+        - if top_k is None, a pandas DataFrame of heats with one row per node
+          and one column per seed set (named by job id, if given)
+        - otherwise a (nodes, indices, heats) tuple: the list of node labels,
+          and num_sets x top_k arrays of the positions in nodes and the heats
+          of each seed set's hottest nodes, hottest first
+    '''
+
+    import visJS2jupyter.propagation as propagation
+
+    if seed_sets and isinstance(seed_sets[0], tuple):
+        job_ids = [job_id for job_id, seeds in seed_sets]
+        seed_sets = [seeds for job_id, seeds in seed_sets]
+    else:
+        job_ids = list(range(len(seed_sets)))
+
+    if random_walk:
+        if Wprime is None:
+            import visJS2jupyter.visualizations as visualizations
+            Wprime = visualizations.normalized_adj_matrix(G, sparse=True)
+        nodes = adjacency.node_labels(G)
+    else:
+        if heat_kernel is None:
+            import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+            heat_kernel = scipy_heatKernel.SciPYKernel(G)
+        nodes = list(heat_kernel.labels)
+    node_to_index = dict(zip(nodes, range(len(nodes))))
+    num_nodes = len(nodes)
+    num_sets = len(seed_sets)
+    dtype = getattr(Wprime if random_walk else heat_kernel, 'dtype', np.float64)
+
+    if top_k is None:
+        heat = np.zeros((num_nodes, num_sets), dtype=dtype)
+    else:
+        top_k = min(top_k, num_nodes)
+        top_indices = np.zeros((num_sets, top_k), dtype=np.int64)
+        top_heats = np.zeros((num_sets, top_k), dtype=dtype)
+
+    for start in range(0, num_sets, batch_size):
+        stop = min(start + batch_size, num_sets)
+
+        # initial heats of the batch, one column per seed set
+        Y = np.zeros((num_nodes, stop - start), dtype=dtype)
+        for column, seeds in enumerate(seed_sets[start:stop]):
+            missing = [node for node in seeds if node not in node_to_index]
+            if missing:
+                print('Seed set {}: dropping seed nodes not in graph: {}'.format(
+                    job_ids[start + column], ', '.join(str(node) for node in missing)))
+            seeds_in_graph = [node for node in seeds if node in node_to_index]
+            for node in seeds_in_graph:
+                if random_walk:
+                    Y[node_to_index[node], column] += 1/float(len(seeds_in_graph))
+                else:
+                    Y[node_to_index[node], column] += seeds[node] if isinstance(seeds, dict) else 1
+
+        if random_walk:
+            batch_heat = propagation.power_propagation(Wprime, Y, alpha=alpha, num_its=num_its)
+        else:
+            # never builds the dense kernel of an eigen mode or edited heat_kernel
+            batch_heat = heat_kernel.diffuseArray(Y)
+
+        if top_k is None:
+            heat[:, start:stop] = batch_heat
+            continue
+        # top_k rows of each column, then sorted hottest first
+        rows = np.argpartition(-batch_heat, top_k - 1, axis=0)[:top_k].T
+        values = np.take_along_axis(batch_heat.T, rows, axis=1)
+        order = np.argsort(-values, axis=1, kind='stable')
+        top_indices[start:stop] = np.take_along_axis(rows, order, axis=1)
+        top_heats[start:stop] = np.take_along_axis(values, order, axis=1)
+
+    if top_k is None:
+        import pandas as pd
+        return pd.DataFrame(heat, index=nodes, columns=job_ids)
+    return nodes, top_indices, top_heats
+
+
+def main(argv=None):
+    '''
+    Command line entry point for python -m visJS2jupyter.
+    '''
+
+    parser = argparse.ArgumentParser(
+        prog='python -m visJS2jupyter',
+        description='Render a standalone heat propagation html report for each seed set in a table.')
+    parser.add_argument('graph_file', help='edge list of the network, one edge per line')
+    parser.add_argument('seed_file', help='seed table: a job id and a list of seed nodes per line')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory for the html reports (default: .)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--diffusion', action='store_true', help='use heat kernel diffusion instead of a random walk')
+    parser.add_argument('--num-nodes', type=int, default=None, help='number of hottest nodes to draw (default: all)')
+    parser.add_argument('--largest-connected-component', action='store_true', help='only draw the largest connected component')
+    parser.add_argument('--graph-delimiter', default=None, help='edge list separator (default: any whitespace)')
+    parser.add_argument('--delimiter', default='\t', help='seed table separator between job id and seeds (default: tab)')
+    parser.add_argument('--seed-delimiter', default=',', help='separator between seed nodes (default: ,)')
+    args = parser.parse_args(argv)
+
+    import visJS2jupyter.loaders as loaders
+
+    # the network is only held as a sparse adjacency matrix; networkX graphs
+    # are built for the drawn nodes of each report
+    G = loaders.load_edge_list(args.graph_file, delimiter=args.graph_delimiter or r'\s+')
+    jobs = read_seed_table(args.seed_file, delimiter=args.delimiter, seed_delimiter=args.seed_delimiter)
+
+    results = render_heat_prop_batch(G, jobs, args.output_dir,
+                                     n_workers=args.workers,
+                                     random_walk=not args.diffusion,
+                                     num_nodes=args.num_nodes,
+                                     largest_connected_component=args.largest_connected_component)
+    if results is None:
+        return 1
+
+    failed = [job_id for job_id, output_file in results.items() if output_file is None]
+    if failed:
+        print('{} of {} jobs failed: {}'.format(len(failed), len(results), ', '.join(failed)))
+        return 1
+    return 0
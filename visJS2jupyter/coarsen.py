@@ -0,0 +1,223 @@
+'''
+--------------------------------------------------------
+
+Community coarsening of large networks, for overview drawings.
+
+Communities are found by modularity-driven label propagation, vectorized over
+the sparse adjacency matrix: each round is a few sparse products and sorts,
+rather than a loop over nodes. As in the Louvain method, the graph of the
+communities found (its quotient graph) is then coarsened again in the same
+way, until at most max_communities communities remain (see coarsen).
+
+--------------------------------------------------------
+'''
+
+import numpy as np
+
+
+def _symmetric_adjacency(A):
+    '''
+    Undirected CSR adjacency matrix of A, with absolute edge weights and no
+    self loops.
+    '''
+
+    import scipy.sparse
+
+    A = abs(scipy.sparse.csr_matrix(A, dtype=np.float64))
+    A = A.maximum(A.T).tocsr()
+    A = A - scipy.sparse.diags(A.diagonal())
+    A.eliminate_zeros()
+    return A
+
+
+def _indicator(membership, num_communities):
+    '''
+    Sparse nodes x communities matrix with a one in each node's community.
+    '''
+
+    import scipy.sparse
+
+    num_nodes = len(membership)
+    return scipy.sparse.csr_matrix((np.ones(num_nodes), (np.arange(num_nodes), membership)),
+                                   shape=(num_nodes, num_communities))
+
+
+def _row_argmax(M, rng):
+    '''
+    Column of the largest entry of each row of the CSR matrix M (random among
+    equal entries), and its value. Empty rows get column -1 and value -inf.
+    '''
+
+    num_rows = M.shape[0]
+    rows = np.repeat(np.arange(num_rows), np.diff(M.indptr))
+    filled = np.diff(M.indptr) > 0
+    starts = M.indptr[:-1][filled]
+
+    best_value = np.full(num_rows, -np.inf)
+    best_column = np.full(num_rows, -1, dtype=np.int64)
+    if not len(starts):
+        return best_column, best_value
+    best_value[filled] = np.maximum.reduceat(M.data, starts)
+
+    # among the largest entries of a row, keep the one with the largest random key
+    key = np.where(M.data == best_value[rows], rng.random(len(M.data)), -1.)
+    best_key = np.full(num_rows, -1.)
+    best_key[filled] = np.maximum.reduceat(key, starts)
+    chosen = (key == best_key[rows]) & (key >= 0)
+    best_column[rows[chosen]] = M.indices[chosen]
+    return best_column, best_value
+
+
+def label_propagation(A, max_iter=20, random_state=0):
+    '''
+    Communities of an undirected network by modularity-driven label
+    propagation (Barber and Clark, "Detecting network communities by
+    propagating labels under constraints", 2009). Every node starts in its own
+    community, and in each round a random half of the nodes move to the
+    neighboring community that most increases the modularity, which is the
+    weight of their edges into it minus what a random graph with the same
+    degrees would give. Unlike plain label propagation, this keeps a few hubs
+    from pulling a scale-free network into a single community. Updating half
+    of the nodes at a time keeps labels from oscillating between neighbors.
+
+    Inputs:
+        - A: symmetric scipy.sparse adjacency matrix. Self loops count
+          towards a node's degree (as after coarsening) but never move it
+        - max_iter: maximum number of rounds, default: 20
+        - random_state: seed of the random updates and tie breaks, default: 0
+
+    Returns:
+        - numpy array of the community (0, 1, ...) of each node
+    '''
+
+    import scipy.sparse
+
+    A = scipy.sparse.csr_matrix(A)
+    num_nodes = A.shape[0]
+    rng = np.random.default_rng(random_state)
+    degree = np.asarray(A.sum(axis=1)).reshape(-1)
+    total_weight = degree.sum()
+    if total_weight == 0:
+        return np.arange(num_nodes)
+    A = A - scipy.sparse.diags(A.diagonal())
+    A.eliminate_zeros()
+
+    labels = np.arange(num_nodes, dtype=np.int64)
+    for it in range(max_iter):
+        community_degree = np.bincount(labels, weights=degree, minlength=num_nodes)
+        M = A.dot(_indicator(labels, num_nodes)).tocsr() # edge weight of each node into each community
+        rows = np.repeat(np.arange(num_nodes), np.diff(M.indptr))
+
+        # modularity gain of placing each node in each neighboring community,
+        # and of leaving it where it is
+        own = M.indices == labels[rows]
+        stay = np.bincount(rows[own], weights=M.data[own], minlength=num_nodes) \
+               - degree*(community_degree[labels] - degree)/total_weight
+        M.data -= degree[rows]*(community_degree[M.indices] - own*degree[rows])/total_weight
+
+        best, gain = _row_argmax(M, rng)
+        moves = (gain > stay + 1e-12*degree) & (best != labels)
+        if not moves.any():
+            break
+        moves &= rng.random(num_nodes) < .5
+        labels[moves] = best[moves]
+
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+def quotient_adjacency(A, membership, self_loops=False):
+    '''
+    Adjacency matrix of the graph of communities: entry (a, b) is the total
+    weight of the edges between communities a and b.
+
+    Inputs:
+        - A: scipy.sparse adjacency matrix
+        - membership: numpy array of the community of each node
+        - self_loops: keep the weight of the edges within each community on
+          the diagonal, default: False
+
+    Returns:
+        - scipy.sparse CSR matrix with one row and column per community
+    '''
+
+    import scipy.sparse
+
+    num_communities = int(membership.max()) + 1 if len(membership) else 0
+    P = _indicator(membership, num_communities)
+    Q = P.T.dot(A).dot(P).tocsr()
+    if not self_loops:
+        Q = Q - scipy.sparse.diags(Q.diagonal())
+        Q.eliminate_zeros()
+    return Q
+
+
+def _merge_small(Q, max_communities, rng):
+    '''
+    Moves every community but the max_communities with the most edge weight
+    into its most connected neighbor. Returns the new community of each community, or None
+    if no small community has a neighbor.
+    '''
+
+    import scipy.sparse
+    import scipy.sparse.csgraph
+
+    num_communities = Q.shape[0]
+    weight = np.asarray(Q.sum(axis=1)).reshape(-1)
+    small = np.argsort(-weight, kind='stable')[max_communities:]
+    Q = Q - scipy.sparse.diags(Q.diagonal())
+    Q.eliminate_zeros()
+    target = _row_argmax(Q[small], rng)[0]
+    small, target = small[target >= 0], target[target >= 0]
+    if not len(small):
+        return None
+
+    # chains and cycles of moves merge into one community
+    moves = scipy.sparse.csr_matrix((np.ones(len(small)), (small, target)),
+                                    shape=(num_communities, num_communities))
+    return scipy.sparse.csgraph.connected_components(moves, directed=False)[1]
+
+
+def coarsen(A, max_communities=200, max_iter=20, random_state=0):
+    '''
+    Groups the nodes of a network into at most max_communities communities,
+    in the manner of the Louvain method: label_propagation is run on the
+    network, then on the graph of its communities, and so on for as long as
+    there are more than max_communities communities. There is no modularity
+    stopping rule, so a network with at most max_communities nodes is
+    returned as is, one community per node. When a level merges no
+    communities, the smallest ones are merged into their most connected
+    neighbor instead, and any left beyond max_communities - 1 once no
+    more can be merged (isolated nodes and small components) are pooled
+    into a last community.
+
+    Inputs:
+        - A: scipy.sparse adjacency matrix (directed edges are made undirected)
+        - max_communities: maximum number of communities, default: 200
+        - max_iter: maximum number of label propagation rounds per level,
+          default: 20
+        - random_state: seed of label propagation, default: 0
+
+    Returns:
+        - numpy array of the community of each node, numbered by decreasing
+          size (community 0 is the largest)
+    '''
+
+    rng = np.random.default_rng(random_state)
+    Q = _symmetric_adjacency(A)
+    membership = np.arange(Q.shape[0], dtype=np.int64)
+    level = 0
+    while Q.shape[0] > max_communities:
+        labels = label_propagation(Q, max_iter=max_iter, random_state=random_state + level)
+        if labels.max() + 1 == Q.shape[0]: # no two communities merged
+            labels = _merge_small(Q, max_communities, rng)
+            if labels is None:
+                break
+        membership = labels[membership]
+        Q = quotient_adjacency(Q, labels, self_loops=True)
+        level += 1
+
+    # number communities by decreasing size, pooling any beyond max_communities
+    sizes = np.bincount(membership)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+    return np.minimum(rank[membership], max_communities - 1)
@@ -0,0 +1,68 @@
+'''
+--------------------------------------------------------
+
+Label culling: keeps the node labels of a drawing that do not overlap a
+more important label, so that vis.js does not draw thousands of unreadable
+overlapping labels on every frame.
+
+vis.js draws labels in network coordinates (font size 14 is 14 units tall at
+any zoom), so whether two labels overlap does not depend on the zoom and can
+be decided once, from the layout positions. Labels are placed greedily in
+order of priority, and each is checked against the labels already placed in
+the neighboring cells of a grid whose cells are as large as the largest
+label.
+
+--------------------------------------------------------
+'''
+
+import math
+
+import numpy as np
+
+
+def cull_labels(positions, labels, priority, font_size=14, char_width=.6):
+    '''
+    Hides the labels that overlap a label of higher priority.
+
+    Inputs:
+        - positions: list of (x, y) node positions, in vis.js network
+          coordinates (the x and y of nodes_dict)
+        - labels: list of node labels, aligned with positions. Empty labels
+          are not drawn and never hide others
+        - priority: list of label priorities, aligned with positions (e.g.
+          heat or degree). Labels are kept in order of decreasing priority
+        - font_size: label font size (visjs_network's node_font_size times
+          its scaling_factor), default: 14
+        - char_width: average character width, as a fraction of the font
+          size, default: 0.6
+
+    Returns:
+        - list of labels, with the hidden ones replaced by ''
+    '''
+
+    widths = [char_width*font_size*len(label) for label in labels]
+    cell_width = max(max(widths) if widths else 0, 1)
+    cell_height = max(font_size, 1)
+
+    grid = {} # (column, row) -> indices of the labels placed in that cell
+    culled = [''] * len(labels)
+    for i in np.argsort(-np.asarray(priority, dtype=np.float64), kind='stable'):
+        if not labels[i]:
+            continue
+        x, y = positions[i]
+        column, row = int(math.floor(x/cell_width)), int(math.floor(y/cell_height))
+
+        # two labels overlap if their boxes (centered on the nodes) intersect
+        overlaps = False
+        for cell in [(column + dc, row + dr) for dc in (-1, 0, 1) for dr in (-1, 0, 1)]:
+            for j in grid.get(cell, ()):
+                if 2*abs(x - positions[j][0]) < widths[i] + widths[j] and abs(y - positions[j][1]) < font_size:
+                    overlaps = True
+                    break
+            if overlaps:
+                break
+
+        if not overlaps:
+            culled[i] = labels[i]
+            grid.setdefault((column, row), []).append(i)
+    return culled
@@ -0,0 +1,258 @@
+'''
+--------------------------------------------------------
+
+Streaming loaders for interaction files (edge lists, SIF and PSI-MITAB).
+
+The files are read in chunks and only integer node indices are kept per
+edge, so a network with millions of interactions loads into a label list plus
+a scipy CSR adjacency matrix without creating a Python object per edge. The
+result can be passed directly to normalized_adj_matrix, network_propagation
+and SciPYKernel (see visJS2jupyter.adjacency).
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+import gzip
+import re
+
+import numpy as np
+import pandas as pd
+
+import visJS2jupyter.adjacency as adjacency
+
+# PSI-MITAB 2.5 columns used by load_mitab
+MITAB_ID_A = 0
+MITAB_ID_B = 1
+MITAB_CONFIDENCE = 14
+
+
+class _EdgeAccumulator(object):
+    '''
+    Assigns integer indices to node labels as they are seen, and collects
+    edges chunk by chunk as arrays of indices and weights.
+    '''
+
+    def __init__(self):
+        self.labels = []
+        self.node_to_index = {}
+        self.rows = []
+        self.cols = []
+        self.weights = []
+
+    def _index(self, names):
+        # look up each distinct label of the chunk once
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for i, name in enumerate(uniques):
+            index = self.node_to_index.get(name)
+            if index is None:
+                index = len(self.labels)
+                self.node_to_index[name] = index
+                self.labels.append(name)
+            ids[i] = index
+        return ids[codes]
+
+    def add(self, sources, targets, weights=None):
+        if len(sources) == 0:
+            return
+        self.rows.append(self._index(sources))
+        self.cols.append(self._index(targets))
+        if weights is not None:
+            self.weights.append(np.asarray(weights, dtype=np.float64))
+
+    def result(self, directed):
+        rows = np.concatenate(self.rows) if self.rows else np.zeros(0, dtype=np.int64)
+        cols = np.concatenate(self.cols) if self.cols else np.zeros(0, dtype=np.int64)
+        weights = np.concatenate(self.weights) if self.weights else None
+        A = adjacency.edges_to_adjacency(rows, cols, weights, len(self.labels), directed=directed)
+        return A, self.labels
+
+
+def _score_filter(scores, min_score):
+    '''
+    Boolean mask of the rows to keep: those with a score, and of at least
+    min_score if given.
+    '''
+
+    keep = np.array(scores.notnull())
+    if min_score is not None:
+        keep &= np.array(scores >= min_score)
+    return keep
+
+
+def load_edge_list(edge_file,
+                   chunksize=1000000,
+                   comment='#',
+                   delimiter='\t',
+                   directed=False,
+                   min_score=None,
+                   score_column=None,
+                   source_column=0,
+                   target_column=1):
+    '''
+    Loads a delimited edge list into a sparse adjacency matrix, one edge per
+    line. Compressed files (.gz, .bz2, .zip, .xz) are read transparently.
+
+    Inputs:
+        - edge_file: path to the edge list
+        - chunksize: number of lines parsed at a time, default: 1000000
+        - comment: lines starting with this character are skipped, default: '#'
+        - delimiter: column separator, default: tab
+        - directed: keep edge direction instead of symmetrizing, default: False
+        - min_score: drop edges whose score is below this value, default: None
+        - score_column: index of a numeric column to use as edge weight; lines
+          without a numeric score are dropped, default: None
+        - source_column: index of the source node column, default: 0
+        - target_column: index of the target node column, default: 1
+
+    Returns:
+        - adjacency: scipy.sparse CSR adjacency matrix
+        - labels: list of node labels (strings), in row order
+    '''
+
+    columns = [source_column, target_column]
+    if score_column is not None:
+        columns.append(score_column)
+
+    edges = _EdgeAccumulator()
+    reader = pd.read_csv(edge_file, sep=delimiter, header=None, usecols=columns,
+                         comment=comment, dtype={source_column: str, target_column: str},
+                         chunksize=chunksize, skip_blank_lines=True)
+    for chunk in reader:
+        weights = None
+        if score_column is not None:
+            weights = pd.to_numeric(chunk[score_column], errors='coerce')
+            keep = _score_filter(weights, min_score)
+            chunk, weights = chunk[keep], weights[keep].values
+        edges.add(chunk[source_column].values, chunk[target_column].values, weights)
+
+    return edges.result(directed)
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def load_sif(sif_file,
+             chunksize=1000000,
+             directed=False,
+             interaction_types=None):
+    '''
+    Loads a SIF (simple interaction format) file into a sparse adjacency
+    matrix. Each line is a source node, an interaction type and one or more
+    target nodes, separated by tabs (or by spaces if the line has no tabs).
+    Lines with a single node add that node without edges.
+
+    Inputs:
+        - sif_file: path to the SIF file (may be gzipped)
+        - chunksize: number of edges collected before they are indexed, default: 1000000
+        - directed: keep edge direction instead of symmetrizing, default: False
+        - interaction_types: only keep interactions of these types, default: None (all)
+
+    Returns:
+        - adjacency: scipy.sparse CSR adjacency matrix
+        - labels: list of node labels (strings), in row order
+    '''
+
+    if interaction_types is not None:
+        interaction_types = set(interaction_types)
+
+    edges = _EdgeAccumulator()
+    sources = []
+    targets = []
+    with _open_text(sif_file) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            fields = line.split('\t') if '\t' in line else line.split()
+            if len(fields) == 1:
+                edges._index([fields[0]])
+                continue
+            if interaction_types is not None and fields[1] not in interaction_types:
+                continue
+            for target in fields[2:]:
+                sources.append(fields[0])
+                targets.append(target)
+            if len(sources) >= chunksize:
+                edges.add(sources, targets)
+                sources, targets = [], []
+    edges.add(sources, targets)
+
+    return edges.result(directed)
+
+
+def _first_identifier(ids, id_prefix):
+    '''
+    First identifier of each MITAB interactor field (fields may list several
+    identifiers separated by '|'), restricted to id_prefix if given. Returns
+    an array with NaN where no identifier matches or the field is empty ('-').
+    '''
+
+    ids = ids.astype(str)
+    if id_prefix is None:
+        return ids.str.split('|').str[0].replace('-', np.nan)
+    pattern = '(?:^|\\|)(' + re.escape(id_prefix) + '[^|]*)'
+    return ids.str.extract(pattern, expand=False)
+
+
+def load_mitab(mitab_file,
+               chunksize=1000000,
+               directed=False,
+               id_prefix=None,
+               min_score=None,
+               score_name=None):
+    '''
+    Loads a PSI-MITAB (2.5 or later) interaction file into a sparse adjacency
+    matrix. Interactors are labelled with their first identifier, e.g.
+    'uniprotkb:P04637'. The header line, if present, is skipped.
+
+    Inputs:
+        - mitab_file: path to the MITAB file (compressed files are read transparently)
+        - chunksize: number of lines parsed at a time, default: 1000000
+        - directed: keep edge direction (A -> B) instead of symmetrizing, default: False
+        - id_prefix: only keep interactors with an identifier starting with
+          this prefix, e.g. 'uniprotkb:', and label them with it, default: None
+        - min_score: drop interactions whose score_name confidence is below
+          this value, default: None
+        - score_name: confidence score (column 15) to use as edge weight, e.g.
+          'intact-miscore'; interactions without it are dropped, default:
+          None (unweighted)
+
+    Returns:
+        - adjacency: scipy.sparse CSR adjacency matrix
+        - labels: list of node labels (strings), in row order
+    '''
+
+    columns = [MITAB_ID_A, MITAB_ID_B]
+    if score_name is not None:
+        columns.append(MITAB_CONFIDENCE)
+        score_pattern = re.escape(score_name) + ':([-+0-9.eE]+)'
+
+    if min_score is not None and score_name is None:
+        print('Please specify score_name to filter interactions by min_score when calling loaders.load_mitab')
+        return
+
+    edges = _EdgeAccumulator()
+    reader = pd.read_csv(mitab_file, sep='\t', header=None, usecols=columns, dtype=str,
+                         comment=None, quoting=3, chunksize=chunksize)
+    for chunk_number, chunk in enumerate(reader):
+        if chunk_number == 0 and len(chunk) and str(chunk.iloc[0, 0]).startswith('#'):
+            chunk = chunk.iloc[1:]
+
+        sources = _first_identifier(chunk[MITAB_ID_A], id_prefix)
+        targets = _first_identifier(chunk[MITAB_ID_B], id_prefix)
+        keep = np.array(sources.notnull() & targets.notnull())
+
+        weights = None
+        if score_name is not None:
+            weights = pd.to_numeric(chunk[MITAB_CONFIDENCE].str.extract(score_pattern, expand=False),
+                                    errors='coerce')
+            keep &= _score_filter(weights, min_score)
+            weights = weights[keep].values
+        edges.add(sources[keep].values, targets[keep].values, weights)
+
+    return edges.result(directed)
@@ -0,0 +1,471 @@
+'''
+--------------------------------------------------------
+
+Propagation operators that stand in for the matrix from normalized_adj_matrix.
+
+normalized_adj_matrix has to be recomputed from scratch whenever an edge is
+added or removed. NormalizedAdjacencyOperator instead keeps the adjacency
+matrix and node degrees separately: an edit changes a couple of matrix
+entries and two degrees, and the degree normalization is applied on the fly
+in dot(). MemmapCSROperator reads a CSR matrix saved with save_csr_operator
+from memory-mapped files, a block of rows at a time, for networks whose
+operator does not fit in memory, and ThreadedCSROperator multiplies blocks of
+rows of a sparse operator on a thread pool. All can be passed as Wprime to
+network_propagation and the draw functions.
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import visJS2jupyter.adjacency as adjacency
+
+# thread pools of ThreadedCSROperator, one per worker count, created on first use
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+class EditableAdjacency(object):
+    '''
+    Symmetric sparse adjacency matrix with cheap edge insertions and
+    deletions. Edits are kept as a dictionary of changes on top of a CSR base
+    matrix, and merged into it once they make up more than merge_fraction of
+    its entries.
+    '''
+
+    def __init__(self, A, merge_fraction=0.05):
+        self.merge_fraction = merge_fraction
+        self._base = A.tocsr()
+        self._base.sum_duplicates()
+        self._delta = {} # (row, column) -> change from the base matrix
+        self._delta_matrix = None
+
+    @property
+    def shape(self):
+        return self._base.shape
+
+    def _base_value(self, i, j):
+        row = slice(self._base.indptr[i], self._base.indptr[i+1])
+        k = np.searchsorted(self._base.indices[row], j)
+        if k < row.stop - row.start and self._base.indices[row][k] == j:
+            return self._base.data[row][k]
+        return 0.0
+
+    def get(self, i, j):
+        return self._base_value(i, j) + self._delta.get((i, j), 0.0)
+
+    def set(self, i, j, weight):
+        '''
+        Set the weight of edge (i, j), and of (j, i). A weight of 0 removes it.
+        '''
+
+        for a, b in ((i, j), (j, i)):
+            change = weight - self._base_value(a, b)
+            if change:
+                self._delta[(a, b)] = change
+            else:
+                self._delta.pop((a, b), None)
+        self._delta_matrix = None
+        if len(self._delta) > self.merge_fraction*max(self._base.nnz, 1):
+            self.merge()
+
+    def _delta_csr(self):
+        import scipy.sparse
+
+        if self._delta_matrix is None:
+            if self._delta:
+                (rows, cols), values = zip(*self._delta.keys()), list(self._delta.values())
+            else:
+                rows, cols, values = [], [], []
+            self._delta_matrix = scipy.sparse.csr_matrix((values, (rows, cols)), shape=self.shape,
+                                                         dtype=self._base.dtype)
+        return self._delta_matrix
+
+    def merge(self):
+        '''
+        Fold the pending edits into the base matrix.
+        '''
+
+        if self._delta:
+            self._base = self.tocsr()
+            self._delta = {}
+            self._delta_matrix = None
+
+    def dot(self, x):
+        if not self._delta:
+            return self._base.dot(x)
+        return self._base.dot(x) + self._delta_csr().dot(x)
+
+    def tocsr(self):
+        if not self._delta:
+            return self._base
+        A = (self._base + self._delta_csr()).tocsr()
+        A.eliminate_zeros()
+        return A
+
+
+class NormalizedAdjacencyOperator(object):
+    '''
+    Editable equivalent of normalized_adj_matrix(G, sparse=True), for
+    undirected networks.
+
+    dot(x) returns the same as normalized_adj_matrix(G).dot(x), so the
+    operator can be passed as Wprime to network_propagation, draw_heat_prop
+    and draw_colocalization. add_edge and remove_edge update one adjacency
+    entry (and its mirror) and two node degrees; the normalized matrix
+    itself is only built when tocsr() or tocsc() is called (e.g. by push
+    propagation) and is cached until the next edit. version counts the edits,
+    so that cached propagation results of an earlier version are not reused.
+    '''
+
+    def __init__(self, G, conserve_heat=True, weighted=False, dtype=np.float64):
+        '''
+        Inputs:
+            - G: networkX graph or (adjacency, labels) pair
+            - conserve_heat: as for normalized_adj_matrix, default: True
+            - weighted: use edge weights ('weight' attribute), default: False
+            - dtype: floating point type of the operator, as for
+              normalized_adj_matrix, default: np.float64
+        '''
+
+        A, labels = adjacency.as_adjacency(G, weight='weight' if weighted else None)
+        A = A.maximum(A.T).tocsr()
+        A.eliminate_zeros()
+        if not weighted:
+            A.data[:] = 1
+
+        self.labels = labels
+        self.node_to_index = dict(zip(labels, range(len(labels))))
+        self.conserve_heat = conserve_heat
+        self.weighted = weighted
+        self.dtype = np.dtype(dtype)
+        self.version = 0
+        self._adjacency = EditableAdjacency(A.astype(self.dtype))
+        self._degree = A.getnnz(axis=1).astype(np.float64)
+        self._matrix = None
+        self._matrix_csc = None
+
+    @property
+    def shape(self):
+        return self._adjacency.shape
+
+    def _scale(self):
+        '''
+        Per-node factors applied to the adjacency matrix: columns are divided
+        by degree when conserving heat, rows and columns by sqrt(degree)
+        otherwise. Isolated nodes get 0.
+        '''
+
+        degree = self._degree
+        if self.conserve_heat:
+            scale = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+        else:
+            scale = np.divide(1.0, np.sqrt(degree), out=np.zeros_like(degree), where=degree > 0)
+        return scale.astype(self.dtype)
+
+    def dot(self, x):
+        scale = self._scale()
+        if np.ndim(x) == 2:
+            scale = scale[:, np.newaxis]
+        if self.conserve_heat:
+            return self._adjacency.dot(scale*x)
+        return scale*self._adjacency.dot(scale*x)
+
+    def tocsr(self):
+        '''
+        The normalized adjacency matrix as a scipy.sparse CSR matrix.
+        '''
+
+        if self._matrix is None:
+            import scipy.sparse
+            scale = scipy.sparse.diags(self._scale())
+            A = self._adjacency.tocsr()
+            if self.conserve_heat:
+                self._matrix = (A.dot(scale)).tocsr()
+            else:
+                self._matrix = (scale.dot(A).dot(scale)).tocsr()
+        return self._matrix
+
+    def tocsc(self):
+        if self._matrix_csc is None:
+            self._matrix_csc = self.tocsr().tocsc()
+        return self._matrix_csc
+
+    def toarray(self):
+        return self.tocsr().toarray()
+
+    def _indices(self, u, v, caller):
+        missing = [n for n in (u, v) if n not in self.node_to_index]
+        for n in missing:
+            print('Node {} not in graph when calling NormalizedAdjacencyOperator.{}'.format(n, caller))
+        if missing:
+            return None
+        return self.node_to_index[u], self.node_to_index[v]
+
+    def _set_edge(self, i, j, weight):
+        old = self._adjacency.get(i, j)
+        if i == j or old == weight:
+            return
+        self._adjacency.set(i, j, weight)
+        if old == 0:
+            self._degree[i] += 1
+            self._degree[j] += 1
+        elif weight == 0:
+            self._degree[i] -= 1
+            self._degree[j] -= 1
+        self._matrix = None
+        self._matrix_csc = None
+        self.version += 1
+
+    def add_edge(self, u, v, weight=1):
+        '''
+        Add the edge (u, v), or change its weight. Both nodes must already be
+        in the network; self loops are ignored.
+        '''
+
+        index = self._indices(u, v, 'add_edge')
+        if index is None:
+            return
+        self._set_edge(index[0], index[1], weight if self.weighted else 1)
+
+    def remove_edge(self, u, v):
+        '''
+        Remove the edge (u, v), if present.
+        '''
+
+        index = self._indices(u, v, 'remove_edge')
+        if index is None:
+            return
+        self._set_edge(index[0], index[1], 0)
+
+    def add_edges_from(self, edges):
+        '''
+        Add each (u, v) or (u, v, weight) edge of edges.
+        '''
+
+        for edge in edges:
+            self.add_edge(*edge)
+
+    def remove_edges_from(self, edges):
+        for edge in edges:
+            self.remove_edge(edge[0], edge[1])
+
+    def has_edge(self, u, v):
+        index = self._indices(u, v, 'has_edge')
+        return index is not None and self._adjacency.get(index[0], index[1]) != 0
+
+    def degree(self, u):
+        return int(self._degree[self.node_to_index[u]])
+
+    def __repr__(self):
+        return '<NormalizedAdjacencyOperator: {} nodes, version {}>'.format(len(self.labels), self.version)
+
+
+def save_csr_operator(Wprime, directory, labels=None):
+    '''
+    Saves a sparse operator (e.g. from normalized_adj_matrix(G, sparse=True))
+    as the indptr.npy, indices.npy and data.npy files of its CSR form, for
+    MemmapCSROperator. Operators too large to build in memory can be written
+    in the same format by other tools, one block of rows at a time.
+
+    Inputs:
+        - Wprime: scipy.sparse matrix, or any operator with a tocsr() method
+        - directory: directory to write the files to (created if missing)
+        - labels: node labels in row order, saved to labels.json, default:
+          None (Wprime.labels if it has them)
+    '''
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    W = Wprime.tocsr()
+    W.sort_indices()
+    np.save(os.path.join(directory, 'indptr.npy'), W.indptr.astype(np.int64))
+    np.save(os.path.join(directory, 'indices.npy'), W.indices)
+    np.save(os.path.join(directory, 'data.npy'), W.data)
+
+    if labels is None:
+        labels = getattr(Wprime, 'labels', None)
+    meta = {'shape': list(W.shape)}
+    if labels is not None:
+        meta['labels'] = list(labels)
+    with open(os.path.join(directory, 'labels.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+class MemmapCSROperator(object):
+    '''
+    Read-only CSR operator whose indptr, indices and data arrays are memory
+    mapped from the files written by save_csr_operator. dot(x) multiplies
+    block_rows rows at a time, so only one block of the matrix needs to be
+    resident at once; the operating system pages blocks in from disk and
+    drops them again as memory is needed.
+
+    It can be passed as Wprime to network_propagation (method = 'power'),
+    with G = None to take the node labels saved with the operator.
+    '''
+
+    def __init__(self, directory, block_rows=100000):
+        '''
+        Inputs:
+            - directory: directory written by save_csr_operator
+            - block_rows: number of rows multiplied at a time, default: 100000
+        '''
+
+        self.directory = directory
+        self.block_rows = block_rows
+        self.indptr = np.load(os.path.join(directory, 'indptr.npy'), mmap_mode='r')
+        self.indices = np.load(os.path.join(directory, 'indices.npy'), mmap_mode='r')
+        self.data = np.load(os.path.join(directory, 'data.npy'), mmap_mode='r')
+
+        meta_file = os.path.join(directory, 'labels.json')
+        meta = {}
+        if os.path.exists(meta_file):
+            with open(meta_file, 'r') as f:
+                meta = json.load(f)
+        num_rows = len(self.indptr) - 1
+        self.shape = tuple(meta.get('shape', (num_rows, num_rows)))
+        self.labels = meta.get('labels')
+        self.dtype = self.data.dtype
+
+    @property
+    def nnz(self):
+        return int(self.indptr[-1])
+
+    def _row_block(self, start, stop):
+        '''
+        Rows start to stop as an in-memory CSR matrix.
+        '''
+
+        import scipy.sparse
+
+        indptr = np.array(self.indptr[start:stop+1])
+        begin, end = indptr[0], indptr[-1]
+        return scipy.sparse.csr_matrix((np.array(self.data[begin:end]),
+                                        np.array(self.indices[begin:end]),
+                                        indptr - begin),
+                                       shape=(stop - start, self.shape[1]))
+
+    def dot(self, x):
+        x = np.asarray(x)
+        dtype = np.result_type(self.dtype, x.dtype)
+        out = np.empty((self.shape[0],) + x.shape[1:], dtype=dtype)
+        for start in range(0, self.shape[0], self.block_rows):
+            stop = min(start + self.block_rows, self.shape[0])
+            out[start:stop] = self._row_block(start, stop).dot(x)
+        return out
+
+    def tocsr(self):
+        '''
+        The whole operator as an in-memory CSR matrix (only for operators
+        that fit in memory).
+        '''
+
+        return self._row_block(0, self.shape[0])
+
+    def tocsc(self):
+        return self.tocsr().tocsc()
+
+    def __repr__(self):
+        return '<MemmapCSROperator: {} x {}, {} entries, {}>'.format(self.shape[0], self.shape[1],
+                                                                    self.nnz, self.directory)
+
+
+def _forget_executors():
+    # a forked process (e.g. a process pool worker) inherits the pools, but not their threads
+    global _executors_lock
+    _executors.clear()
+    _executors_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_executors)
+
+
+def _get_executor(n_workers):
+    with _executors_lock:
+        if n_workers not in _executors:
+            _executors[n_workers] = ThreadPoolExecutor(max_workers=n_workers)
+        return _executors[n_workers]
+
+
+class ThreadedCSROperator(object):
+    '''
+    Sparse operator whose products with a vector (or a block of vectors) run
+    on a thread pool. The CSR matrix is split into n_blocks blocks of
+    consecutive rows with about the same number of entries; each thread
+    multiplies one block into its slice of the result. scipy's sparse
+    products release the GIL, so the blocks run on separate cores.
+
+    The blocks share the arrays of the original matrix, so wrapping an
+    operator takes no extra memory. The thread pool is shared by all
+    operators with the same number of workers.
+    '''
+
+    def __init__(self, Wprime, n_workers=None, n_blocks=None):
+        '''
+        Inputs:
+            - Wprime: scipy.sparse matrix (e.g. from normalized_adj_matrix(G, sparse=True)),
+              or an operator with a tocsr() method
+            - n_workers: number of threads, default: None (one per CPU)
+            - n_blocks: number of row blocks, default: None (4 per thread, to
+              even out differences in block run times)
+        '''
+
+        import scipy.sparse
+
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if n_blocks is None:
+            n_blocks = 4*n_workers
+        W = Wprime.tocsr()
+        W.sum_duplicates()
+
+        self.n_workers = n_workers
+        self.shape = W.shape
+        self.dtype = W.dtype
+        self.labels = getattr(Wprime, 'labels', None)
+        self._matrix = W
+        self._matrix_csc = None
+
+        # row boundaries that split the entries evenly
+        targets = np.linspace(0, W.nnz, min(n_blocks, max(W.shape[0], 1)) + 1)
+        bounds = np.unique(np.concatenate([[0], np.searchsorted(W.indptr, targets[1:-1]), [W.shape[0]]]))
+        self._blocks = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            begin, end = W.indptr[start], W.indptr[stop]
+            block = scipy.sparse.csr_matrix((W.data[begin:end], W.indices[begin:end],
+                                             W.indptr[start:stop+1] - begin),
+                                            shape=(stop - start, W.shape[1]))
+            self._blocks.append((start, stop, block))
+
+    def dot(self, x):
+        x = np.asarray(x)
+        if self.n_workers == 1 or len(self._blocks) == 1:
+            return self._matrix.dot(x)
+        out = np.empty((self.shape[0],) + x.shape[1:], dtype=np.result_type(self.dtype, x.dtype))
+
+        def multiply(block):
+            start, stop, matrix = block
+            out[start:stop] = matrix.dot(x)
+
+        # list() waits for every block, and re-raises the first error
+        list(_get_executor(self.n_workers).map(multiply, self._blocks))
+        return out
+
+    def tocsr(self):
+        return self._matrix
+
+    def tocsc(self):
+        if self._matrix_csc is None:
+            self._matrix_csc = self._matrix.tocsc()
+        return self._matrix_csc
+
+    def __repr__(self):
+        return '<ThreadedCSROperator: {} x {}, {} blocks, {} threads>'.format(self.shape[0], self.shape[1],
+                                                                           len(self._blocks), self.n_workers)
@@ -0,0 +1,437 @@
+'''
+--------------------------------------------------------
+
+Staged render pipeline shared by the draw functions in visualizations.
+
+A render is split into explicit stages
+
+    propagate (or overlap) -> select -> layout -> style -> color -> serialize -> export -> render
+
+and, once enabled with set_stage_caching(True), each stage's result is
+memoized on the inputs that determine it. A new colormap then only reruns
+color and serialize, a new num_nodes skips propagation, and so on. serialize, export and render always rerun: their
+outputs are handed to visJS_module, which may modify them (visjs_network
+has its own opt-in render_cache).
+
+Stages can be profiled (wall time, peak traced memory, element counts and
+payload sizes) with the profile_render() context manager, or by passing
+profile=True to a draw function.
+
+Stage caching is off by default. Graphs and precomputed operators are
+identified by a per-object token plus, for graphs, their node and edge
+counts, so modifying a graph's edges or attributes or a Wprime array in
+place is not detected; call clear_stage_caches() after doing so.
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import hashlib
+import itertools
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+
+STAGES = ('propagate', 'overlap', 'coarsen', 'select', 'backbone', 'layout', 'style', 'labels', 'color', 'serialize', 'drilldown', 'export', 'render')
+
+# per-thread listener notified as a render moves between stages
+# (used by visJS2jupyter.background for progress reporting and cancellation)
+_stage_listener = threading.local()
+
+# per-thread RenderProfile that run_stage records into (see profile_render)
+_active_profile = threading.local()
+
+# id(obj) -> (weak reference, token) for graphs and operators used in cache keys
+_object_tokens = {}
+_token_counter = itertools.count()
+_token_lock = threading.Lock()
+
+
+class StageCache(object):
+    '''
+    Least recently used cache for the results of a single stage, with hit and
+    miss counters.
+    '''
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        Return (True, value) on a hit and (False, None) on a miss.
+        '''
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries[key] = self._entries.pop(key) # mark as most recently used
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._evict()
+
+    def resize(self, max_entries):
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_stage_caches = dict((stage, StageCache()) for stage in STAGES)
+
+# stage results are only cached after set_stage_caching(True)
+_stage_caching = {'enabled': False}
+
+
+def report_stage(stage):
+    '''
+    Notify the current thread's stage listener, if any, that a render is
+    starting the given stage.
+    '''
+
+    callback = getattr(_stage_listener, 'callback', None)
+    if callback is not None:
+        callback(stage)
+
+
+def run_stage(stage, key, func, *args, **kwargs):
+    '''
+    Run one stage of a render.
+
+    Inputs:
+        - stage: name of the stage (one of STAGES)
+        - key: hashable description of everything the stage's result depends
+          on, or None to always recompute
+        - func: function computing the stage, called with args and kwargs
+
+    Returns:
+        - the (possibly cached) result of func
+    '''
+
+    report_stage(stage)
+    profile = getattr(_active_profile, 'profile', None)
+    if profile is not None:
+        return profile._run(stage, key, func, args, kwargs)
+    return _run_cached(stage, key, func, args, kwargs)
+
+
+def _run_cached(stage, key, func, args, kwargs):
+    '''
+    Returns the result of a stage, from its cache when key is not None.
+    '''
+
+    if key is None or not _stage_caching['enabled']:
+        return func(*args, **kwargs)
+
+    cache = _stage_caches[stage]
+    hit, value = cache.get(key)
+    if hit:
+        return value
+    value = func(*args, **kwargs)
+    cache.put(key, value)
+    return value
+
+
+def _stage_size(stage, result):
+    '''
+    Element counts and payload size (in characters) of a stage's result, for
+    profiling. Returns (elements, payload_bytes).
+    '''
+
+    if result is None:
+        return None, None
+    if stage == 'serialize':
+        nodes_dict, edges_dict = result
+        return [len(nodes_dict), len(edges_dict)], len(json.dumps(nodes_dict)) + len(json.dumps(edges_dict))
+    if stage == 'render':
+        import visJS2jupyter.visJS_module as visJS_module
+        return None, visJS_module._render_size(result)
+    if isinstance(result, dict) and result and all(isinstance(r, list) for r in result.values()):
+        return len(next(iter(result.values()))), None # per-node attribute lists
+    if isinstance(result, tuple):
+        return [_element_count(r) for r in result], None
+    return _element_count(result), None
+
+
+def _element_count(result):
+    '''
+    Length of a stage result (rows of a matrix), or None if it has none.
+    '''
+
+    if hasattr(result, 'shape') and len(result.shape):
+        return result.shape[0]
+    if hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+
+class RenderProfile(object):
+    '''
+    Per-stage report of one or more renders. Each entry of .stages is a
+    dictionary with:
+        - stage: stage name
+        - seconds: wall time
+        - peak_memory_bytes: peak memory traced (tracemalloc) above the
+          stage's starting point, None if memory tracing is off. Before
+          Python 3.9, the peak cannot be reset between stages, so this is
+          the peak since tracing started
+        - cached: True if the result came from the stage cache
+        - elements: element count(s) of the result, e.g. [nodes, edges]
+        - payload_bytes: serialized size of the data handed to vis.js
+          (serialize) or of the rendered output (render)
+    '''
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def _run(self, stage, key, func, args, kwargs):
+        cached = key is not None and _stage_caching['enabled'] and key in _stage_caches[stage]
+        if self.trace_memory:
+            if hasattr(tracemalloc, 'reset_peak'): # Python 3.9+
+                tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        result = _run_cached(stage, key, func, args, kwargs)
+        seconds = time.perf_counter() - start
+
+        peak_memory = None
+        if self.trace_memory:
+            peak_memory = max(tracemalloc.get_traced_memory()[1] - memory_start, 0)
+
+        elements, payload_bytes = _stage_size(stage, result)
+        self.stages.append({'stage': stage,
+                            'seconds': seconds,
+                            'peak_memory_bytes': peak_memory,
+                            'cached': cached,
+                            'elements': elements,
+                            'payload_bytes': payload_bytes})
+        return result
+
+    @property
+    def total_seconds(self):
+        return sum(s['seconds'] for s in self.stages)
+
+    def to_dict(self):
+        '''
+        JSON serializable form of the report, e.g. for logging.
+        '''
+
+        return {'total_seconds': self.total_seconds, 'stages': [dict(s) for s in self.stages]}
+
+    def summary(self):
+        '''
+        Table of the recorded stages as a string.
+        '''
+
+        lines = ['{:<10} {:>9} {:>12} {:>7} {:>16} {:>14}'.format(
+            'stage', 'seconds', 'peak memory', 'cached', 'elements', 'payload bytes')]
+        for s in self.stages:
+            lines.append('{:<10} {:>9.4f} {:>12} {:>7} {:>16} {:>14}'.format(
+                s['stage'], s['seconds'],
+                '-' if s['peak_memory_bytes'] is None else s['peak_memory_bytes'],
+                str(s['cached']),
+                '-' if s['elements'] is None else str(s['elements']),
+                '-' if s['payload_bytes'] is None else s['payload_bytes']))
+        lines.append('total: {:.4f} seconds'.format(self.total_seconds))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.summary()
+
+
+@contextmanager
+def profile_render(trace_memory=True):
+    '''
+    Context manager recording every stage run in this thread into a
+    RenderProfile, which it yields:
+
+        with pipeline.profile_render() as report:
+            visualizations.draw_heat_prop(G, seeds)
+        print(report.summary())
+
+    Inputs:
+        - trace_memory: also record peak memory with tracemalloc (slows
+          the render down), default: True
+    '''
+
+    profile = RenderProfile(trace_memory=trace_memory)
+    previous = getattr(_active_profile, 'profile', None)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active_profile.profile = profile
+    try:
+        yield profile
+    finally:
+        _active_profile.profile = previous
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def profiled(func, *args, **kwargs):
+    '''
+    Call func inside profile_render() and return (result, RenderProfile).
+    '''
+
+    with profile_render() as profile:
+        result = func(*args, **kwargs)
+    return result, profile
+
+
+def object_token(obj):
+    '''
+    Return an integer that identifies obj for as long as it is alive, for use
+    in stage keys. Returns None for None.
+    '''
+
+    if obj is None:
+        return None
+
+    obj_id = id(obj)
+    with _token_lock:
+        entry = _object_tokens.get(obj_id)
+        if entry is not None and entry[0]() is obj:
+            return entry[1]
+
+        token = next(_token_counter)
+
+        def _forget(ref, obj_id=obj_id, token=token):
+            with _token_lock:
+                if obj_id in _object_tokens and _object_tokens[obj_id][1] == token:
+                    del _object_tokens[obj_id]
+
+        _object_tokens[obj_id] = (weakref.ref(obj, _forget), token)
+        return token
+
+
+def operator_key(obj):
+    '''
+    Key for a precomputed operator (Wprime or heat kernel): its token, plus
+    its version for operators that can be edited in place (see
+    visJS2jupyter.operators).
+    '''
+
+    return (object_token(obj), getattr(obj, 'version', None))
+
+
+def graph_key(G):
+    '''
+    Key identifying a networkX graph: its token plus node and edge counts, so
+    that adding or removing nodes or edges invalidates dependent stages. For
+    an (adjacency, labels) pair, the adjacency matrix's token, size and
+    number of stored entries.
+    '''
+
+    if isinstance(G, tuple):
+        A = G[0]
+        return (object_token(A), A.shape[0], A.nnz)
+    return (object_token(G), G.number_of_nodes(), G.number_of_edges())
+
+
+def seeds_key(seed_nodes):
+    '''
+    Order independent key for a list of seed nodes (repeats count) or a dict
+    mapping seed nodes to initial heats.
+    '''
+
+    if seed_nodes is None:
+        return None
+    if isinstance(seed_nodes, dict):
+        return frozenset(seed_nodes.items())
+    return frozenset(Counter(seed_nodes).items())
+
+
+def heat_key(heat):
+    '''
+    Digest of a heat vector (a pandas Series, a dictionary mapping nodes to
+    heats, or an array), e.g. network_propagation's prev_heat. The same heats
+    in a different order get a different digest, which only costs a cache miss.
+    '''
+
+    if heat is None:
+        return None
+    import numpy as np
+    if hasattr(heat, 'index'): # pandas Series
+        labels, values = list(heat.index), heat.values
+    elif isinstance(heat, dict):
+        labels, values = list(heat.keys()), list(heat.values())
+    else:
+        labels, values = None, heat
+    digest = hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    digest.update(repr(labels).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cmap_key(cmap):
+    '''
+    Key for a matplotlib colormap (colormaps themselves are not hashable).
+    '''
+
+    return getattr(cmap, 'name', cmap)
+
+
+def set_stage_caching(enabled=True):
+    '''
+    Turn caching of stage results on or off (it is off by default). With
+    caching on, call clear_stage_caches() after modifying a graph or
+    operator in place.
+    '''
+
+    _stage_caching['enabled'] = bool(enabled)
+
+
+def clear_stage_caches():
+    '''
+    Empty every stage cache and reset the hit/miss counters.
+    '''
+
+    for cache in _stage_caches.values():
+        cache.clear()
+
+
+def set_stage_cache_size(max_entries):
+    '''
+    Set the number of results each stage cache keeps, default: 8
+    '''
+
+    for cache in _stage_caches.values():
+        cache.resize(max_entries)
+
+
+def stage_cache_info():
+    '''
+    Return a dictionary mapping each stage to its hits, misses and number of
+    cached entries.
+    '''
+
+    return dict((stage, {'hits': cache.hits, 'misses': cache.misses, 'entries': len(cache)})
+                for stage, cache in _stage_caches.items())
@@ -0,0 +1,158 @@
+'''
+--------------------------------------------------------
+
+Propagation kernels: power iteration over a matrix of seed vectors, and local
+push propagation (Andersen, Chung and Lang, "Local graph partitioning using
+PageRank vectors", 2006).
+
+network_propagation iterates F = alpha*Wprime*F + (1-alpha)*Y over the whole
+graph. Its fixed point can also be approximated by pushing heat out of the
+nodes that hold a large residual, starting from the seeds. Only the
+neighborhood that receives a noticeable amount of heat is ever touched, so for
+a few seed nodes the cost depends on that neighborhood's size, not the graph's.
+
+--------------------------------------------------------
+'''
+
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import visJS2jupyter.pipeline as pipeline
+
+# column-compressed copies of recently used operators, keyed by object_token
+_csc_operators = OrderedDict()
+_max_csc_operators = 2
+
+
+def csc_operator(Wprime):
+    '''
+    Wprime in compressed sparse column form, which push_propagation reads one
+    column at a time. Conversions of dense or CSR operators are cached for the
+    last few operators, so repeated queries do not pay for them again.
+    '''
+
+    import scipy.sparse
+
+    if scipy.sparse.isspmatrix_csc(Wprime):
+        return Wprime
+    if not scipy.sparse.issparse(Wprime) and hasattr(Wprime, 'tocsc'):
+        # editable operators (see visJS2jupyter.operators) cache their own
+        # matrix, and may change after it was converted
+        return Wprime.tocsc()
+
+    token = pipeline.object_token(Wprime)
+    if token in _csc_operators:
+        _csc_operators[token] = _csc_operators.pop(token) # mark as most recently used
+        return _csc_operators[token]
+
+    W = scipy.sparse.csc_matrix(Wprime)
+    W.sum_duplicates()
+    _csc_operators[token] = W
+    while len(_csc_operators) > _max_csc_operators:
+        _csc_operators.popitem(last=False)
+    return W
+
+
+def power_propagation(Wprime, Y, alpha=.5, num_its=20):
+    '''
+    network_propagation's iteration F = alpha*Wprime*F + (1-alpha)*Y, for Y
+    a vector or a matrix with one column per seed set, whose columns are
+    propagated together (one matrix product per iteration).
+
+    Inputs:
+        - Wprime: normalized adjacency matrix or operator (anything with a
+          dot() method)
+        - Y: initial heats, as a numpy array of one or more columns
+        - alpha: heat dissipation coefficient, default: 0.5
+        - num_its: number of iterations, default: 20
+
+    Returns:
+        - numpy array of the heats, of the same shape as Y
+    '''
+
+    F = Y.copy()
+    for t in range(num_its):
+        F = alpha*Wprime.dot(F) + (1-alpha)*Y
+    return np.asarray(F)
+
+
+def push_propagation(Wprime, Y, alpha=.5, tol=1e-6):
+    '''
+    Approximates the fixed point of F = alpha*Wprime*F + (1-alpha)*Y.
+
+    Each node u keeps a residual r[u], initially Y. While some node has
+    |r[u]| >= tol*degree(u), (1-alpha)*r[u] is added to its heat and
+    alpha*r[u]*Wprime[:, u] is added to the residuals of its neighbors. When
+    Wprime is column stochastic (normalized_adj_matrix with conserve_heat),
+    the total (L1) error of the returned heat is at most the heat left in the
+    residuals, which is below tol times the summed degree of the nodes.
+
+    Residuals and heats are kept in dictionaries of the nodes reached, so
+    when Y is a dictionary the cost depends only on the edges of the nodes
+    pushed, not on the size of the graph.
+
+    Inputs:
+        - Wprime: normalized adjacency matrix (from normalized_adj_matrix),
+          dense or scipy.sparse
+        - Y: initial heats, as a numpy array of the heat of every node or a
+          dictionary mapping node indices to heats (other nodes get 0).
+          Heats may be negative, e.g. for the change between two seed sets
+        - alpha: heat dissipation coefficient, default: 0.5
+        - tol: residual per unit of degree below which a node is not pushed,
+          default: 1e-6
+
+    Returns:
+        - heat: numpy array of the heat of every node or, if Y is a
+          dictionary, dictionary mapping the indices of the nodes reached to
+          their heat
+        - residual: total heat left in the residuals (an error bound)
+        - pushes: number of push operations performed
+    '''
+
+    W = csc_operator(Wprime)
+    indptr, indices, data = W.indptr, W.indices, W.data
+
+    if isinstance(Y, dict):
+        r = dict((int(u), float(y)) for u, y in Y.items() if y != 0)
+    else:
+        nonzero = np.flatnonzero(Y)
+        r = dict(zip(nonzero.tolist(), np.asarray(Y, dtype=np.float64)[nonzero].tolist()))
+
+    # push thresholds; isolated nodes push out whatever heat they hold
+    def thresholds(nodes):
+        return (tol*np.maximum(indptr[nodes + 1] - indptr[nodes], 1)).tolist()
+
+    start_nodes = np.fromiter(r, dtype=np.int64, count=len(r))
+    queue = deque(u for u, th in zip(start_nodes.tolist(), thresholds(start_nodes)) if abs(r[u]) >= th)
+    queued = set(queue)
+
+    heat = {}
+    pushes = 0
+    while queue:
+        u = queue.popleft()
+        queued.discard(u)
+        ru = r.pop(u)
+        heat[u] = heat.get(u, 0.) + (1-alpha)*ru
+        pushes += 1
+
+        start, end = indptr[u], indptr[u+1]
+        if start == end:
+            continue
+        neighbors = indices[start:end]
+        pushed = (alpha*ru*data[start:end]).tolist()
+
+        # queue the neighbors that now hold enough residual to be pushed
+        for v, dr, th in zip(neighbors.tolist(), pushed, thresholds(neighbors)):
+            rv = r.get(v, 0.) + dr
+            r[v] = rv
+            if v not in queued and abs(rv) >= th:
+                queued.add(v)
+                queue.append(v)
+
+    residual = float(sum(abs(rv) for rv in r.values()))
+    if not isinstance(Y, dict):
+        dense = np.zeros(W.shape[0])
+        dense[np.fromiter(heat, dtype=np.int64, count=len(heat))] = list(heat.values())
+        heat = dense
+    return heat, residual, pushes
@@ -14,20 +14,92 @@
 ###
 
 import networkx as nx
-from numpy import genfromtxt, dot
+from numpy import genfromtxt, dot, array, float32, float64, zeros, ones, arange, absolute, argpartition, nonzero, concatenate, exp, outer, asarray
+from numpy.linalg import eigh
 import sys
 import math
-from array import array
-from scipy.sparse import coo_matrix
-from scipy.sparse.linalg import expm
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.format import open_memmap
+from scipy.sparse import diags, csc_matrix
+from scipy.sparse.linalg import expm, expm_multiply, eigsh
+from visJS2jupyter.adjacency import is_adjacency, graph_to_adjacency
+
+# time_T*L and the output file, shared by the blocks a kernel worker computes
+_worker_state = {}
+
+
+def _expmColumns(A, start, stop, dtype):
+    """
+    Columns start to stop of expm(A), by applying the exponential to the
+    corresponding columns of the identity matrix
+    """
+    num_nodes = A.shape[0]
+    identity = zeros((num_nodes, stop - start), dtype=dtype)
+    identity[arange(start, stop), arange(stop - start)] = 1
+    return expm_multiply(A, identity)
+
+
+def _initKernelWorker(A, kernel_file):
+    _worker_state['A'] = A
+    _worker_state['kernel_file'] = kernel_file
+
+
+def _writeKernelBlock(start, stop):
+    """
+    Computes columns start to stop of the kernel and writes them to the
+    kernel file. The kernel is symmetric, so they are written as rows, which
+    are contiguous in the file.
+    """
+    kernel = open_memmap(_worker_state['kernel_file'], mode='r+')
+    kernel[start:stop, :] = _expmColumns(_worker_state['A'], start, stop, kernel.dtype).T
+    kernel.flush()
+    del kernel
+    return start, stop
+
 
 class SciPYKernel:
 
-    def __init__(self, G):
+    def __init__(self, G, top_k=None, eps=None, block_size=256,
+                 diffusion_time=0.1, mode='expm', num_eigenvectors=None, dtype=float32,
+                 kernel_file=None, n_workers=None):
         """ 
         Input:
 
-              A networkx graph G
+              A networkx graph G, or an (adjacency, labels) pair as returned
+              by visJS2jupyter.loaders
+
+              diffusion_time: t of the kernel exp(-t*L), default 0.1
+
+              mode: 'expm' to compute the kernel matrix, or 'eigen' to
+              compute (and cache) an eigendecomposition of the laplacian
+              instead, with which diffuseTimes diffuses heat for any number
+              of diffusion times for the cost of a few small matrix products.
+              num_eigenvectors truncates it to the eigenvectors of the
+              smallest eigenvalues, which dominate exp(-t*L) for all but
+              small t (default: all of them, from a dense decomposition)
+
+              dtype: floating point type of the laplacian and kernel, and of
+              the diffused heats, default float32 (float64 for more accurate
+              heats, at twice the memory). The eigendecomposition is always
+              computed in float64
+
+              top_k, eps: to store a sparsified kernel, keep only the top_k
+              largest entries of each column and/or the entries of at least
+              eps. The kernel is then computed block_size columns at a time,
+              and takes O(n*top_k) rather than O(n^2) memory. The L1 norm of
+              the dropped entries of each column is kept in column_error, and
+              its maximum in truncation_error: for any input heat vector x,
+              the L1 error of the diffused heats is at most
+              truncation_error*|x|_1.
+
+              kernel_file: to precompute the full kernel in parallel, a .npy
+              file to write it to. Blocks of block_size columns are computed
+              by n_workers processes (default: one per CPU) and written
+              straight into the memory-mapped file, so no process holds more
+              than a block of the kernel. The kernel is then read from the
+              file, which np.load(kernel_file, mmap_mode='r') also reopens.
+              Cannot be combined with top_k, eps or mode='eigen', whose
+              kernels are not written to a file (raises a ValueError)
 
         Returns:
 
@@ -35,72 +107,258 @@ class SciPYKernel:
 
         """
 
+        if kernel_file is not None and (top_k is not None or eps is not None or mode == 'eigen'):
+            raise ValueError('kernel_file cannot be combined with top_k, eps or mode=\'eigen\'')
+
         self.labels = {}
         # The number of rows and columns for each kernel
         self.ncols = {}
         self.nrows = {}
 
         # parse the network, build indexes
-        num_nodes = len(G.nodes())
-        node_order = sorted(G.nodes())
-        index2node = {}
-        node2index = {}
-        for i in range(0, num_nodes):
-            index2node[i] = node_order[i]    
-            node2index[node_order[i]] = i
-  
-        # undirected node degree dict 
-        node_degrees = G.degree()
- 
-        # construct the diagonals
-        # SCIPY uses row and column indexes to build the matrix
-        # row and columns are just indexes: the data column stores 
-        # the actual entries of the matrix
-        row = array('i')
-        col = array('i')
-        data = array('f')
-        # build the diagonals, including the out-degree 
-        for i in range(0, num_nodes):
-            # diag entries: out degree
-            degree = 0 
-            if index2node[i] in node_degrees:
-                degree = node_degrees[index2node[i]]    
-            # append to the end
-            # array object: first argument is the index, the second is the data value
-            # append the out-degree to the data array
-            data.insert(len(data), degree)    
-            # build the diagonals
-            row.insert(len(row), i)    
-            col.insert(len(col), i)    
-
-        # add off-diagonal edges 
-        for i in range(0, num_nodes):
-            for j in range(0, num_nodes):
-                if i == j:
-                    continue
-                # treat the graph as undirected, generate a symmetric matrix
-                if ((index2node[i], index2node[j]) not in G.edges()) and ((index2node[j], index2node[i]) not in G.edges()):
-                    continue
-                # append index to i-th row, j-th column
-                row.insert(len(row), i)
-                col.insert(len(col), j)
-                # -1 for laplacian: i.e. the negative of the adjacency matrix 
-                data.insert(len(data), -1)
+        # treat the graph as undirected: the adjacency matrix is made symmetric
+        if is_adjacency(G):
+            A = G[0].tocsr()
+            node_order = list(G[1])
+        else:
+            node_order = sorted(G.nodes())
+            A, _ = graph_to_adjacency(G, nodelist=node_order)
+        A = (A + A.T).tocsr()
+        A = (A - diags(A.diagonal())).tocsr()
+        A.eliminate_zeros()
+        A.data[:] = 1
+        # diag entries: undirected node degree, not counting self loops (the
+        # original membership test on G.degree() always failed on networkx 2,
+        # leaving the diagonal at zero)
+        node_degrees = A.getnnz(axis=1)
+        num_nodes = len(node_order)
+        index2node = dict(zip(range(num_nodes), node_order))
+
+        # the laplacian: degrees on the diagonal, and -1 (the negative of the
+        # adjacency matrix) for each edge
+        self.dtype = dtype
+        L = diags(array(node_degrees, dtype=dtype)) - A.astype(dtype)
 
         # Build the graph laplacian: the CSC matrix provides a sparse matrix format
         # that can be exponentiated efficiently
-        L = coo_matrix((data,(row, col)), shape=(num_nodes,num_nodes)).tocsc()
-        time_T = -0.1
-        self.laplacian = L
+        L = L.tocsc()
+        time_T = -diffusion_time
+        self.time_T = time_T
+        self.mode = mode
+        self.num_eigenvectors = num_eigenvectors
+        self._eigen = None
+        self.top_k = top_k
+        self.eps = eps
+        self.block_size = block_size
+        self.kernel_file = kernel_file
+        self.n_workers = n_workers
+        self.column_error = zeros(num_nodes)
+        self.truncation_error = 0.0
+        self._laplacian = L
+        self._laplacian_lil = None
         self.index2node = index2node
+        self.node2index = dict(zip(node_order, range(num_nodes)))
         # this is the matrix exponentiation calculation. 
         # Uses the Pade approximiation for accurate approximation. Computationally expensive.
         # O(n^2), n= # of features, in memory as well. 
-        self.kernel = expm(time_T*L)
         self.labels = node_order
+        self._kernel = None if mode == 'eigen' else self._computeKernel()
+        # number of edge edits, see add_edge and remove_edge
+        self.version = 0
     
         #self.printLaplacian()
     
+    @property
+    def laplacian(self):
+        """
+        The graph laplacian, as a CSC matrix
+        """
+        if self._laplacian is None:
+            self._laplacian = self._laplacian_lil.tocsc()
+        return self._laplacian
+
+    @property
+    def kernel(self):
+        """
+        The heat kernel expm(time_T*L). After edges have been edited it is
+        only recomputed when accessed (or by refresh()); until then diffuse
+        multiplies by the exponential of the current laplacian directly.
+        """
+        if self._kernel is None:
+            self._kernel = self._computeKernel()
+        return self._kernel
+
+    def _computeKernel(self):
+        """
+        expm(time_T*L), sparsified if top_k or eps is set
+        """
+        if self.mode == 'eigen':
+            values, vectors = self.eigendecomposition()
+            return dot(vectors*exp(self.time_T*values), vectors.T).astype(self.dtype)
+        if self.top_k is not None or self.eps is not None:
+            return self._sparseKernel()
+        if self.kernel_file is not None:
+            return self._blockedKernel()
+        return expm(self.time_T*self.laplacian)
+
+    def _blockedKernel(self):
+        """
+        Computes the full kernel block_size columns at a time in a process
+        pool, writing each block into the memory-mapped kernel_file
+        """
+        A = (self.time_T*self.laplacian).tocsc()
+        num_nodes = A.shape[0]
+        kernel = open_memmap(self.kernel_file, mode='w+', dtype=self.dtype, shape=(num_nodes, num_nodes))
+        del kernel
+
+        starts = list(range(0, num_nodes, self.block_size))
+        stops = [min(start + self.block_size, num_nodes) for start in starts]
+        if self.n_workers == 1:
+            _initKernelWorker(A, self.kernel_file)
+            for start, stop in zip(starts, stops):
+                _writeKernelBlock(start, stop)
+            _worker_state.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers,
+                                     initializer=_initKernelWorker,
+                                     initargs=(A, self.kernel_file)) as executor:
+                list(executor.map(_writeKernelBlock, starts, stops))
+
+        return open_memmap(self.kernel_file, mode='r')
+
+    def _sparseKernel(self):
+        """
+        Computes the kernel block_size columns at a time, by applying the
+        exponential to columns of the identity matrix, and keeps the top_k
+        largest entries (by magnitude) and/or the entries of at least eps of
+        each column. Records the L1 norm of the dropped entries of each column.
+        """
+        A = (self.time_T*self.laplacian).tocsc()
+        num_nodes = A.shape[0]
+        rows, cols, values = [], [], []
+        column_error = zeros(num_nodes)
+
+        for start in range(0, num_nodes, self.block_size):
+            stop = min(start + self.block_size, num_nodes)
+            block = _expmColumns(A, start, stop, self.dtype)
+            magnitude = absolute(block)
+
+            keep = ones(block.shape, dtype=bool)
+            if self.eps is not None:
+                keep &= magnitude >= self.eps
+            if self.top_k is not None and self.top_k < num_nodes:
+                top = zeros(block.shape, dtype=bool)
+                top_rows = argpartition(-magnitude, self.top_k - 1, axis=0)[:self.top_k]
+                top[top_rows, arange(stop - start)] = True
+                keep &= top
+
+            column_error[start:stop] = (magnitude*~keep).sum(axis=0)
+            r, c = nonzero(keep)
+            rows.append(r)
+            cols.append(c + start)
+            values.append(block[r, c])
+
+        self.column_error = column_error
+        self.truncation_error = float(column_error.max()) if num_nodes else 0.0
+        return csc_matrix((concatenate(values), (concatenate(rows), concatenate(cols))),
+                          shape=(num_nodes, num_nodes))
+
+    def refresh(self):
+        """
+        Recompute the heat kernel after edges have been edited
+        """
+        self._kernel = None
+        return self.kernel
+
+    def _editEdge(self, a, b, present):
+        """
+        Add (present = True) or remove the undirected edge a-b. Only the two
+        diagonal entries and the two off-diagonal entries of the laplacian
+        change; the kernel is invalidated.
+        """
+        for node in (a, b):
+            if node not in self.node2index:
+                print('Node {} not in kernel'.format(node))
+                return
+        i = self.node2index[a]
+        j = self.node2index[b]
+        if i == j:
+            return
+
+        if self._laplacian_lil is None:
+            self._laplacian_lil = self._laplacian.tolil()
+        L = self._laplacian_lil
+        if (L[i, j] != 0) == present:
+            return
+
+        step = 1 if present else -1
+        L[i, i] = L[i, i] + step
+        L[j, j] = L[j, j] + step
+        L[i, j] = -step if present else 0
+        L[j, i] = -step if present else 0
+
+        self._laplacian = None
+        self._kernel = None
+        self._eigen = None
+        self.version += 1
+
+    def add_edge(self, a, b):
+        """
+        Add the undirected edge a-b (both nodes must be in the kernel)
+        """
+        self._editEdge(a, b, True)
+
+    def remove_edge(self, a, b):
+        """
+        Remove the undirected edge a-b
+        """
+        self._editEdge(a, b, False)
+
+    def eigendecomposition(self):
+        """
+        Eigenvalues (ascending) and eigenvectors (columns) of the laplacian,
+        computed on first use and cached until the next edge edit. With
+        num_eigenvectors, only those of the smallest eigenvalues.
+        """
+        if self._eigen is None:
+            L = self.laplacian.astype(float64)
+            num_nodes = L.shape[0]
+            if self.num_eigenvectors is None or self.num_eigenvectors >= num_nodes - 1:
+                values, vectors = eigh(L.toarray())
+            else:
+                # shift-invert around a point just below the smallest eigenvalue (0)
+                values, vectors = eigsh(L.tocsc(), k=self.num_eigenvectors, sigma=-1e-3, which='LM')
+                order = values.argsort()
+                values, vectors = values[order], vectors[:, order]
+            self._eigen = (values, vectors)
+        return self._eigen
+
+    def diffuseTimes(self, vector, times):
+        """
+        Diffuse input heats for each of several diffusion times
+
+        Input:
+            vector: a hash mapping gene labels to heats, as for diffuse
+            times: list of diffusion times t
+
+        Returns:
+            A hash mapping each t to the hash of heats diffused by exp(-t*L)
+        """
+        heats = self._heatArray(vector)
+        times = list(times)
+
+        if self.mode == 'eigen':
+            # exp(-t*L)*h = V*diag(exp(-t*values))*V'*h, for all t at once
+            values, vectors = self.eigendecomposition()
+            coefficients = dot(vectors.T, heats)
+            diffused = dot(vectors, exp(-outer(values, times))*coefficients[:, None])
+        else:
+            diffused = zeros((len(heats), len(times)), dtype=self.dtype)
+            for i, t in enumerate(times):
+                diffused[:, i] = expm_multiply(-t*self.laplacian, heats)
+
+        return dict((t, self._heatDict(diffused[:, i])) for i, t in enumerate(times))
+
     def getLabels(self):
         """
             Return the set of all node/gene labels used by this kernel object
@@ -134,20 +392,52 @@ class SciPYKernel:
                 A hash of diffused heats, indexed by the same names as the
                 input vector
         """
-        # Have to convert to ordered array format for the input vector
-        array = []
+        return self._heatDict(self.diffuseArray(self._heatArray(vector)))
+
+    def diffuseArray(self, heats):
+        """
+            Diffuse an array of input heats in label order, with one column
+            per heat vector for a matrix. Never builds the full kernel: in
+            'eigen' mode, or after edge edits (see kernelMultiplyOne), the
+            exponential is applied to the heats directly.
+
+            Input:
+                heats: numpy array with a row per label
+
+            Returns:
+                numpy array of diffused heats, of the same shape
+        """
+        if self.mode == 'eigen':
+            values, vectors = self.eigendecomposition()
+            scale = exp(self.time_T*values)
+            coefficients = dot(vectors.T, heats)
+            coefficients = coefficients*(scale[:, None] if coefficients.ndim > 1 else scale)
+            return dot(vectors, coefficients).astype(self.dtype)
+
+        # take the dot product; after edge edits, apply the exponential of the
+        # edited laplacian to the heats rather than rebuilding the whole kernel
+        if self._kernel is None:
+            return expm_multiply(self.time_T*self.laplacian, heats)
+        return asarray(self.kernel.dot(heats))
+
+    def _heatArray(self, vector):
+        """
+            Convert a hash of input heats to an array in label order
+        """
+        heats = []
         for label in self.labels:
             # Input heats may not actually be in the network.
             # Check and initialize to zero if not
             if label in vector:
-                array.append(vector[label])
+                heats.append(vector[label])
             else:
-                array.append(0)
+                heats.append(0)
+        return array(heats, dtype=self.dtype)
 
-        # take the dot product
-        value = self.kernel*array
-
-        # Convert back to a hash and return diffused heats
+    def _heatDict(self, value):
+        """
+            Convert an array of heats in label order back to a hash
+        """
         return_vec = {}
         idx = 0
         for label in self.labels:
@@ -156,7 +446,7 @@ class SciPYKernel:
 
         return return_vec
 
-    def diffuse(self, vector, reverse=False):
+    def diffuse(self, vector, reverse=False, diffusion_time=None):
         """
         Diffuse input heats over the set of kernels, add to this object
         
@@ -165,11 +455,16 @@ class SciPYKernel:
              'gene2' : float(heat2)
               ...
             }
+            diffusion_time: t to diffuse for, if not the kernel's own
 
         Returns:
             Diffused heat vector
         """
 
+        if self.mode == 'eigen' or diffusion_time not in (None, -self.time_T):
+            t = -self.time_T if diffusion_time is None else diffusion_time
+            return self.diffuseTimes(vector, [t])[t]
+
         diffused_vector = self.kernelMultiplyOne(vector)
 
         return diffused_vector
@@ -178,10 +473,8 @@ class SciPYKernel:
 #
 # example use and test case:
 """
-G = nx.DiGraph()
-for line in open('pathway.sif', 'r'):
-	edge = line.rstrip().split('\t')
-	G.add_edge(edge[0], edge[2])
+from visJS2jupyter.loaders import load_sif
+G = load_sif('pathway.sif')
 
 input_heats = {}
 for line in open('upstream.input', 'r'):
@@ -0,0 +1,329 @@
+'''
+--------------------------------------------------------
+
+Permutation based significance of network propagation.
+
+The heat a node receives depends on its degree and position in the network as
+much as on the seeds, so raw heat is compared to the heat the node receives
+from random seed sets. Each random seed set replaces every seed with a node of
+similar degree (from the same degree bin). Random seed sets are propagated in
+batches, as the columns of one matrix, and the batches are spread over a
+process pool. Every batch draws its random numbers from its own child of one
+numpy SeedSequence, so results only depend on random_state and batch_size,
+not on the number of workers.
+
+--------------------------------------------------------
+'''
+
+from __future__ import print_function
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import visJS2jupyter.adjacency as adjacency
+import visJS2jupyter.propagation as propagation
+
+# propagation operator, degree bins and observed heat shared by every batch in a worker
+_worker_state = {}
+
+
+def degree_bins(degree, min_bin_size=100):
+    '''
+    Groups nodes of similar degree. Nodes are sorted by degree, and nodes of
+    equal degree are added to the current bin until it holds at least
+    min_bin_size nodes (the last bin is merged into the previous one if it is
+    smaller than that).
+
+    Inputs:
+        - degree: array of node degrees, in node order
+        - min_bin_size: smallest number of nodes per bin, default: 100
+
+    Returns:
+        - node_bin: array mapping each node to its bin
+        - bins: list of arrays of the node indices in each bin
+    '''
+
+    degree = np.asarray(degree)
+    order = np.argsort(degree, kind='stable')
+    values, counts = np.unique(degree[order], return_counts=True)
+
+    bins = []
+    start = 0
+    size = 0
+    for count in counts:
+        size += count
+        if size >= min_bin_size:
+            bins.append(order[start:start+size])
+            start += size
+            size = 0
+    if size:
+        if bins:
+            bins[-1] = np.concatenate([bins[-1], order[start:]])
+        else:
+            bins.append(order[start:])
+
+    node_bin = np.zeros(len(degree), dtype=np.int64)
+    for b, members in enumerate(bins):
+        node_bin[members] = b
+    return node_bin, bins
+
+
+def random_seed_sets(seed_index, node_bin, bins, num_sets, rng):
+    '''
+    Draws degree matched random seed sets: each seed is replaced by a node of
+    its degree bin, and the seeds of one bin are replaced by distinct nodes
+    (when the bin is large enough).
+
+    Inputs:
+        - seed_index: array of seed node indices
+        - node_bin, bins: degree bins, from degree_bins()
+        - num_sets: number of random seed sets
+        - rng: numpy random Generator
+
+    Returns:
+        - num_sets x len(seed_index) array of node indices; column i replaces seed i
+    '''
+
+    seed_index = np.asarray(seed_index, dtype=np.int64)
+    sets = np.empty((num_sets, len(seed_index)), dtype=np.int64)
+    for b in np.unique(node_bin[seed_index]):
+        columns = np.flatnonzero(node_bin[seed_index] == b)
+        members = bins[b]
+        replace = len(columns) > len(members)
+        for s in range(num_sets):
+            sets[s, columns] = rng.choice(members, len(columns), replace=replace)
+    return sets
+
+
+def _seed_matrix(seed_sets, seed_weights, num_nodes, dtype=np.float64):
+    '''
+    num_nodes x len(seed_sets) matrix whose column s holds the heat of the
+    seeds of seed_sets[s].
+    '''
+
+    Y = np.zeros((num_nodes, len(seed_sets)), dtype=dtype)
+    columns = np.repeat(np.arange(len(seed_sets)), seed_sets.shape[1])
+    np.add.at(Y, (seed_sets.ravel(), columns), np.tile(seed_weights, len(seed_sets)))
+    return Y
+
+
+def _propagate_matrix(operator, Y, random_walk, alpha, num_its):
+    '''
+    Propagates every column of Y at once: network_propagation's iteration
+    with Wprime = operator, or diffusion by the heat kernel operator (which
+    never builds the dense kernel of an eigen mode or edited SciPYKernel).
+    '''
+
+    if not random_walk:
+        return np.asarray(operator.diffuseArray(Y))
+    return propagation.power_propagation(operator, Y, alpha=alpha, num_its=num_its)
+
+
+def _batch_heat(seed_sets_1, seed_sets_2):
+    '''
+    Heat of the random seed sets of one batch, one column per set. With a
+    second seed set this is the colocalization heat, the product of the heats
+    from both.
+    '''
+
+    state = _worker_state
+    num_nodes = len(state['node_bin'])
+    # propagate in the precision of the operator (see normalized_adj_matrix's
+    # and SciPYKernel's dtype)
+    dtype = getattr(state['operator'], 'dtype', np.float64)
+    heat = _propagate_matrix(state['operator'],
+                             _seed_matrix(seed_sets_1, state['seed_weights_1'], num_nodes, dtype),
+                             state['random_walk'], state['alpha'], state['num_its'])
+    if seed_sets_2 is not None:
+        heat = heat*_propagate_matrix(state['operator'],
+                                      _seed_matrix(seed_sets_2, state['seed_weights_2'], num_nodes, dtype),
+                                      state['random_walk'], state['alpha'], state['num_its'])
+    return heat
+
+
+def _init_worker(state):
+    '''
+    Process pool initializer: receives the operator and seeds once per worker.
+    '''
+
+    _worker_state.clear()
+    _worker_state.update(state)
+
+
+def _null_batch(seed_sequence, num_sets):
+    '''
+    Propagates num_sets random seed sets, and returns the per node sum and sum
+    of squares of their heat, and how often it reached the observed heat.
+    '''
+
+    state = _worker_state
+    rng = np.random.default_rng(seed_sequence)
+    seed_sets_1 = random_seed_sets(state['seed_index_1'], state['node_bin'], state['bins'], num_sets, rng)
+    seed_sets_2 = None
+    if state['seed_index_2'] is not None:
+        seed_sets_2 = random_seed_sets(state['seed_index_2'], state['node_bin'], state['bins'], num_sets, rng)
+
+    heat = _batch_heat(seed_sets_1, seed_sets_2)
+    observed = state['observed'][:, np.newaxis]
+    heat = heat.astype(np.float64)
+    return heat.sum(axis=1), (heat**2).sum(axis=1), (heat >= observed).sum(axis=1)
+
+
+def _seed_index_and_weights(seed_nodes, node_to_index, random_walk):
+    '''
+    Seed node indices and initial heats: 1/len(seed_nodes) per seed for
+    random walk propagation (as in network_propagation), the values of a
+    seed dictionary (or 1) for diffusion.
+    '''
+
+    seeds = list(seed_nodes)
+    index = np.array([node_to_index[n] for n in seeds], dtype=np.int64)
+    if random_walk:
+        weights = np.full(len(seeds), 1/float(len(seeds)))
+    elif isinstance(seed_nodes, dict):
+        weights = np.array([seed_nodes[n] for n in seeds], dtype=np.float64)
+    else:
+        weights = np.ones(len(seeds))
+    return index, weights
+
+
+def heat_significance(G, seed_nodes,
+                      seed_nodes_2=None,
+                      random_walk=True,
+                      Wprime=None,
+                      heat_kernel=None,
+                      alpha=.5,
+                      num_its=20,
+                      num_sets=1000,
+                      batch_size=100,
+                      n_workers=None,
+                      min_bin_size=100,
+                      random_state=0):
+    '''
+    Compares the heat of every node after propagation from seed_nodes (or
+    the colocalization heat of seed_nodes and seed_nodes_2) to its heat after
+    propagation from num_sets degree matched random seed sets.
+
+    If G is a networkX graph, the z-scores and p-values are also stored in
+    its 'heat_z' and 'heat_p' node attributes, e.g. to color nodes with
+    visJS_module.return_node_to_color(G, field_to_map='heat_z', ...).
+
+    Inputs:
+        - G: a networkX graph, or an (adjacency, labels) pair (see visJS2jupyter.loaders)
+        - seed_nodes: nodes on which to initialize the simulation (may be a
+          dict of initial heats if random_walk = False)
+        - seed_nodes_2: second seed set, for the significance of
+          draw_colocalization's heat, default: None
+        - random_walk: True for random walk style propagation (as in
+          draw_heat_prop), False for diffusion with a heat kernel, default: True
+        - Wprime: normalized adjacency matrix (from normalized_adj_matrix), default:
+          None (a sparse one is computed from G)
+        - heat_kernel: precomputed scipy_heatKernel.SciPYKernel of G, used when
+          random_walk = False, default: None
+        - alpha: heat dissipation coefficient, default: 0.5
+        - num_its: number of propagation iterations, default: 20
+        - num_sets: number of random seed sets, default: 1000
+        - batch_size: number of random seed sets propagated together, default: 100
+        - n_workers: number of worker processes, default: None (one per CPU).
+          With n_workers = 1 the batches run in this process
+        - min_bin_size: smallest number of nodes per degree bin, default: 100
+        - random_state: seed of the random number generator, default: 0
+
+    Returns:
+        - pandas DataFrame indexed by node, with columns 'heat' (observed
+          heat), 'null_mean' and 'null_std' (mean and standard deviation of
+          the random heats), 'z' (z-score) and 'p' (empirical p-value, the
+          fraction of random seed sets, counting the observed one, giving
+          at least the observed heat)
+    '''
+
+    import pandas as pd
+
+    if seed_nodes_2 is not None and not random_walk:
+        print('Colocalization significance requires random_walk = True')
+        return
+    if num_sets <= 0:
+        print('num_sets must be positive')
+        return
+    nodes = adjacency.node_labels(G)
+    graph_nodes = set(nodes)
+    invalid_nodes = [node for node in seed_nodes if node not in graph_nodes]
+    invalid_nodes.extend([node for node in (seed_nodes_2 or []) if node not in graph_nodes])
+    for node in invalid_nodes:
+        print('Node {} not in graph'.format(node))
+    if invalid_nodes:
+        return
+
+    # the operator and its node order
+    if random_walk:
+        if Wprime is None:
+            import visJS2jupyter.visualizations as visualizations
+            Wprime = visualizations.normalized_adj_matrix(G, sparse=True)
+        operator = Wprime
+    else:
+        if heat_kernel is None:
+            import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+            heat_kernel = scipy_heatKernel.SciPYKernel(G)
+        operator = heat_kernel
+        nodes = list(heat_kernel.labels)
+    node_to_index = dict(zip(nodes, range(len(nodes))))
+
+    # undirected degree of each node, in operator order
+    A, labels = adjacency.as_adjacency(G)
+    A = A.maximum(A.T).tocsr()
+    A.eliminate_zeros()
+    degree = dict(zip(labels, A.getnnz(axis=1) - (A.diagonal() != 0)))
+    node_bin, bins = degree_bins([degree[n] for n in nodes], min_bin_size=min_bin_size)
+
+    seed_index_1, seed_weights_1 = _seed_index_and_weights(seed_nodes, node_to_index, random_walk)
+    seed_index_2, seed_weights_2 = None, None
+    if seed_nodes_2 is not None:
+        seed_index_2, seed_weights_2 = _seed_index_and_weights(seed_nodes_2, node_to_index, random_walk)
+
+    state = {'operator': operator,
+             'random_walk': random_walk,
+             'alpha': alpha,
+             'num_its': num_its,
+             'node_bin': node_bin,
+             'bins': bins,
+             'seed_index_1': seed_index_1,
+             'seed_weights_1': seed_weights_1,
+             'seed_index_2': seed_index_2,
+             'seed_weights_2': seed_weights_2}
+    _init_worker(state)
+    observed = _batch_heat(seed_index_1[np.newaxis, :],
+                           None if seed_index_2 is None else seed_index_2[np.newaxis, :])[:, 0]
+    state['observed'] = observed
+    _worker_state['observed'] = observed
+
+    batch_sizes = [batch_size]*(num_sets//batch_size)
+    if num_sets % batch_size:
+        batch_sizes.append(num_sets % batch_size)
+    seed_sequences = np.random.SeedSequence(random_state).spawn(len(batch_sizes))
+
+    if n_workers == 1:
+        results = [_null_batch(s, n) for s, n in zip(seed_sequences, batch_sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 initializer=_init_worker,
+                                 initargs=(state,)) as executor:
+            results = list(executor.map(_null_batch, seed_sequences, batch_sizes))
+    _worker_state.clear()
+
+    heat_sum = sum(r[0] for r in results)
+    heat_sum_sq = sum(r[1] for r in results)
+    exceed = sum(r[2] for r in results)
+
+    null_mean = heat_sum/num_sets
+    null_std = np.sqrt(np.maximum(heat_sum_sq/num_sets - null_mean**2, 0))
+    z = np.divide(observed - null_mean, null_std,
+                  out=np.zeros(len(nodes)), where=null_std > 0)
+    p = (exceed + 1)/float(num_sets + 1)
+
+    result = pd.DataFrame({'heat': observed, 'null_mean': null_mean, 'null_std': null_std,
+                           'z': z, 'p': p}, index=nodes)
+    if not adjacency.is_adjacency(G):
+        import networkx as nx
+        nx.set_node_attributes(G, name='heat_z', values=result['z'].to_dict())
+        nx.set_node_attributes(G, name='heat_p', values=result['p'].to_dict())
+    return result
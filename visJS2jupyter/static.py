@@ -0,0 +1,264 @@
+'''
+--------------------------------------------------------
+
+Static (PNG) pictures of networks too large for an interactive vis.js view.
+
+render_png draws the nodes_dict and edges_dict passed to visjs_network (with
+their layout positions, colors and shapes) with matplotlib, in one scatter
+call per node shape. matplotlib draws lines one at a time (about 20
+microseconds each), so only small networks get a LineCollection: the edges
+of larger ones are rasterized with numpy into an image of the figure's
+resolution, by summing points sampled along the edges into their pixels.
+For millions of edges, the density mode draws how much edge passes through
+each pixel instead.
+
+--------------------------------------------------------
+'''
+
+import io
+import re
+
+import numpy as np
+
+# vis.js node shapes -> matplotlib markers
+_markers = {'dot': 'o', 'circle': 'o', 'ellipse': 'o', 'database': 'o', 'text': 'o',
+            'square': 's', 'box': 's', 'triangle': '^', 'triangleDown': 'v',
+            'diamond': 'D', 'star': '*', 'hexagon': 'h'}
+
+# vis.js node size transforms -> numpy functions
+_size_transforms = {'Math.sqrt': np.sqrt, 'Math.log': np.log1p, 'Math.cbrt': np.cbrt}
+
+_rgba_pattern = re.compile(r'rgba?\(([^)]*)\)')
+
+
+def _to_rgba(colors, default):
+    '''
+    Colors of the nodes or edges dictionaries (as 'rgba(r, g, b, a)' strings
+    from return_node_to_color and return_edge_to_color, or matplotlib color
+    names and hex strings) as an n x 4 numpy array. Each distinct color is
+    only parsed once.
+    '''
+
+    import matplotlib.colors
+
+    codes = {}
+    index = [codes.setdefault(default if color is None else color, len(codes)) for color in colors]
+    parsed = np.empty((len(codes), 4))
+    for color, code in codes.items():
+        match = _rgba_pattern.match(color)
+        if match:
+            values = [float(v) for v in match.group(1).split(',')]
+            # the colormap functions scale channels to 0-256
+            parsed[code] = [min(v/255., 1.) for v in values[:3]] + [min(values[3], 1.) if len(values) > 3 else 1.]
+        else:
+            parsed[code] = matplotlib.colors.to_rgba(color)
+    return parsed[np.asarray(index, dtype=np.int64)].reshape(-1, 4)
+
+
+def _rasterize_edges(x0, y0, x1, y1, colors, shape, limits, density, block=1 << 22):
+    '''
+    RGBA image of shape (rows, columns) of the edges from (x0, y0) to (x1,
+    y1). Points are taken along every edge and counted in the pixels that
+    contain them.
+
+    Without density, each edge gets a point per pixel of its length, and a
+    pixel crossed by k edges gets the color of the last one, with the
+    opacity 1 - (1 - a)^k of k overlapping lines of opacity a. With density,
+    each edge gets 16 points, weighted by its length: pixels get the mean
+    color of their edges, and an opacity that grows with the log of the
+    total length of edge drawn in them. Edges are processed about block
+    points at a time, to bound memory.
+    '''
+
+    rows, columns = shape
+    (xmin, xmax), (ymin, ymax) = limits
+    px0, px1 = (x0 - xmin)*columns/(xmax - xmin), (x1 - xmin)*columns/(xmax - xmin)
+    py0, py1 = (y0 - ymin)*rows/(ymax - ymin), (y1 - ymin)*rows/(ymax - ymin)
+    if density:
+        samples = np.full(len(x0), 16, dtype=np.int64)
+        weight = np.hypot(px1 - px0, py1 - py0)/16
+    else:
+        # a point per pixel along the longer of the edge's x and y extents
+        span = np.maximum(abs(px1 - px0), abs(py1 - py0))
+        samples = np.ceil(np.minimum(span, rows + columns)).astype(np.int64) + 1
+        weight = None
+    step_x, step_y = (px1 - px0)/samples, (py1 - py0)/samples
+    px0, py0 = px0 + step_x/2, py0 + step_y/2
+
+    ink = np.zeros(rows*columns)
+    color_sum = np.zeros((rows*columns, 4)) if density else None
+    top_edge = np.full(rows*columns, -1, dtype=np.int64)
+    ends = np.cumsum(samples)
+    start = 0
+    while start < len(samples):
+        stop = max(np.searchsorted(ends, ends[start] - samples[start] + block, side='right'), start + 1)
+        edge = np.repeat(np.arange(start, stop), samples[start:stop])
+        offset = np.arange(ends[start] - samples[start], ends[stop - 1]) - (ends - samples)[edge]
+        px = (px0[edge] + step_x[edge]*offset).astype(np.int64).clip(0, columns - 1)
+        py = (py0[edge] + step_y[edge]*offset).astype(np.int64).clip(0, rows - 1)
+        pixel = py*columns + px
+
+        if density:
+            ink += np.bincount(pixel, weights=weight[edge], minlength=rows*columns)
+            for c in range(4):
+                color_sum[:, c] += np.bincount(pixel, weights=colors[edge, c]*weight[edge], minlength=rows*columns)
+        else:
+            ink += np.bincount(pixel, minlength=rows*columns)
+            top_edge[pixel] = edge # later edges are drawn on top, as with lines
+        start = stop
+
+    image = np.zeros((rows*columns, 4))
+    drawn = ink > 0
+    if density:
+        image[drawn] = color_sum[drawn]/ink[drawn, None]
+        image[:, 3] *= np.log1p(ink)/np.log1p(ink.max()) if ink.max() > 0 else 0
+    else:
+        image[drawn] = colors[top_edge[drawn]]
+        image[:, 3] = 1 - (1 - image[:, 3])**ink
+    return image.reshape(rows, columns, 4)
+
+
+def render_png(nodes_dict, edges_dict,
+               filename=None,
+               width=900,
+               height=800,
+               dpi=100,
+               node_size_field='degree',
+               node_size_transform='Math.sqrt',
+               node_size_multiplier=3,
+               node_color_border='black',
+               node_label_field=None,
+               max_labels=500,
+               node_font_size=14,
+               edge_color='#848484',
+               edge_width=1,
+               edge_alpha=.5,
+               max_line_edges=20000,
+               density=None,
+               density_edges=500000,
+               background='white',
+               graph_title=''):
+    '''
+    Draws a network as a PNG image, from the same nodes_dict and edges_dict
+    as visjs_network. Nodes are drawn at their x and y positions, with their
+    color, node_shape and border_width, on top of the edges.
+
+    Inputs:
+        - nodes_dict: list of node dictionaries, with x and y positions (an
+          empty list gives a blank image)
+        - edges_dict: list of edge dictionaries, with the source and target
+          positions of the edge's nodes in nodes_dict
+        - filename: file to write the PNG to, default: None (only return it)
+        - width, height: image size in pixels, default: 900 x 800
+        - dpi: resolution, default: 100
+        - node_size_field, node_size_transform, node_size_multiplier: node
+          radius, as in visjs_network, default: 3 * Math.sqrt(degree)
+        - node_color_border: color of node borders, default: 'black'
+        - node_label_field: field to label nodes with, default: None (no
+          labels). Empty labels are not drawn
+        - max_labels: labels are only drawn if there are at most this many,
+          e.g. after label culling, default: 500
+        - node_font_size: label font size, default: 14
+        - edge_color: color of edges without a color, default: '#848484'
+        - edge_width: edge width in pixels, when drawn as lines (rasterized
+          edges are one pixel wide), default: 1
+        - edge_alpha: edge opacity, default: 0.5
+        - max_line_edges: number of edges up to which edges are drawn as
+          antialiased lines. Larger networks have their edges rasterized
+          into an image, which is much faster than drawing each line with
+          matplotlib, default: 20000
+        - density: draw the edges as a density image, whose opacity grows
+          with the log of the amount of edge drawn in each pixel, default:
+          None (if there are more than density_edges edges)
+        - density_edges: number of edges above which density is used by
+          default, default: 500000
+        - background: background color, default: 'white'
+        - graph_title: title drawn above the network, default: ''
+
+    Returns:
+        - the PNG image, as bytes
+    '''
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    x = np.array([n['x'] for n in nodes_dict], dtype=np.float64)
+    y = -np.array([n['y'] for n in nodes_dict], dtype=np.float64) # vis.js y points down
+    transform = _size_transforms.get(node_size_transform, lambda v: v)
+    size = transform(np.array([n.get(node_size_field, 1) for n in nodes_dict], dtype=np.float64))
+    size = np.nan_to_num(size)*node_size_multiplier
+
+    # fit the layout (and the largest node) into the image, with at least a
+    # unit of margin so that a single node or a blank drawing has an extent
+    margin = max(size.max() if len(size) else 0, 1)
+    xmin, xmax = (x.min() - margin, x.max() + margin) if len(x) else (-margin, margin)
+    ymin, ymax = (y.min() - margin, y.max() + margin) if len(y) else (-margin, margin)
+    if (xmax - xmin)/width > (ymax - ymin)/height:
+        extra = (xmax - xmin)*height/width - (ymax - ymin)
+        ymin, ymax = ymin - extra/2, ymax + extra/2
+    else:
+        extra = (ymax - ymin)*width/height - (xmax - xmin)
+        xmin, xmax = xmin - extra/2, xmax + extra/2
+    points_per_unit = width/(xmax - xmin)*72./dpi
+
+    fig = Figure(figsize=(width/float(dpi), height/float(dpi)), dpi=dpi, facecolor=background)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    if graph_title:
+        fig.suptitle(graph_title)
+
+    # edges, as lines or as a density image
+    if edges_dict:
+        source = np.array([e['source'] for e in edges_dict], dtype=np.int64)
+        target = np.array([e['target'] for e in edges_dict], dtype=np.int64)
+        colors = _to_rgba([e.get('color') for e in edges_dict], edge_color)
+        colors[:, 3] *= edge_alpha
+        if density is None:
+            density = len(edges_dict) > density_edges
+        if density or len(edges_dict) > max_line_edges:
+            image = _rasterize_edges(x[source], y[source], x[target], y[target], colors,
+                                     (height, width), ((xmin, xmax), (ymin, ymax)), density)
+            ax.imshow(image, extent=(xmin, xmax, ymin, ymax), origin='lower',
+                      interpolation='nearest', aspect='auto', zorder=1)
+        else:
+            segments = np.stack([np.column_stack([x[source], y[source]]),
+                                 np.column_stack([x[target], y[target]])], axis=1)
+            ax.add_collection(LineCollection(segments, colors=colors,
+                                             linewidths=edge_width*72./dpi, zorder=1))
+
+    # nodes, one scatter call per shape (none for a blank drawing)
+    node_colors = _to_rgba([n.get('color') for n in nodes_dict], '#8BA8D3')
+    border = np.array([n.get('border_width', 0) for n in nodes_dict], dtype=np.float64)
+    shapes = np.array([_markers.get(n.get('node_shape'), 'o') for n in nodes_dict])
+    area = np.maximum(2*size*points_per_unit, 1)**2
+    for marker in np.unique(shapes):
+        drawn = shapes == marker
+        # matplotlib sets up a dash pattern per distinct line width
+        linewidths = border[drawn]*points_per_unit
+        if len(linewidths) and (linewidths == linewidths[0]).all():
+            linewidths = linewidths[0]
+        ax.scatter(x[drawn], y[drawn], s=area[drawn], c=node_colors[drawn], marker=marker,
+                   edgecolors=node_color_border, linewidths=linewidths, zorder=2)
+
+    if node_label_field is not None:
+        labeled = [i for i, n in enumerate(nodes_dict) if n.get(node_label_field)]
+        if len(labeled) > max_labels:
+            print ('Not drawing {} labels (more than max_labels = {})'.format(len(labeled), max_labels))
+        else:
+            for i in labeled:
+                ax.text(x[i], y[i] - size[i], str(nodes_dict[i][node_label_field]),
+                        fontsize=node_font_size*points_per_unit, ha='center', va='top', zorder=3)
+
+    png = io.BytesIO()
+    fig.savefig(png, format='png', dpi=dpi, facecolor=background,
+                pil_kwargs={'compress_level': 1}) # fast compression
+    png = png.getvalue()
+    if filename is not None:
+        f = open(filename, 'wb')
+        f.write(png)
+        f.close()
+    return png
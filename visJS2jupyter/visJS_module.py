@@ -12,16 +12,20 @@ Authors:
 
 # import some packages
 from __future__ import print_function
-from IPython.display import HTML, Javascript
+from collections import OrderedDict
+import hashlib
 import json
 from json import dumps
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 import numpy as np
 import networkx as nx
 
-Javascript("$.getScript('https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.js')")
-#Javascript("https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.js")
+# IPython and matplotlib are imported on first use: they are slow to import,
+# and not needed to write html output
+
+# opt-in cache of rendered networks (see visjs_network's render_cache argument)
+_render_cache = OrderedDict()
+_render_cache_limits = {'max_entries': 32, 'max_bytes': 64*1024*1024}
+_render_cache_stats = {'hits': 0, 'misses': 0, 'bytes': 0}
 
 def visjs_network(nodes_dict, edges_dict,
 
@@ -165,6 +169,14 @@ def visjs_network(nodes_dict, edges_dict,
                            export_edge_attribute = None,
                            override_graph_size_to_max = False,
                            output = "jupyter",
+                           render_cache = False, # reuse the previous render if the data and style options are unchanged
+                           drilldown = None, # {node position: {'nodes': nodes_dict, 'edges': edges_dict}} drawn when a node is clicked
+
+                           # deferred rendering
+                           defer_render = True, # only build the network once its container scrolls into view
+                           defer_render_margin = 200, # distance (px) outside the viewport at which a deferred network starts building
+                           teardown_offscreen = False, # destroy deferred networks that scroll far away, rebuilding them on return
+                           teardown_margin = 3000, # distance (px) outside the viewport beyond which a network is torn down
                            ):
 
     '''
@@ -174,9 +186,24 @@ def visjs_network(nodes_dict, edges_dict,
         - nodes_dict: dictionary of nodes and attributes
         - edges_dict: dictionary of edges and attributes
         - visJS_html_file:  path to visJS_html style file (from create_graph_style_file)
+        - render_cache: if True, renders are memoized on a hash of nodes_dict,
+          edges_dict and the style options, and an unchanged render returns the
+          cached output without regenerating the style file or html. Bounds and
+          hit/miss counters are available through set_render_cache_limits()
+          and render_cache_info(). Renders that export the network are never cached.
+        - drilldown: dictionary mapping the position of a node in nodes_dict
+          to a {'nodes': nodes_dict, 'edges': edges_dict} network. Clicking
+          the node replaces the drawing with that network, and double-clicking
+          the background returns to the original one. default: None
+        - output: "jupyter" (an iframe), "html" (a standalone page), "div"
+          or "zeppelin" for interactive networks, or "png" for a static
+          picture of the network, drawn with matplotlib by
+          visJS2jupyter.static.render_png (for networks too large to
+          interact with). default: "jupyter"
 
     Return:
-        - VisJS html network plot (iframe)
+        - VisJS html network plot (iframe), or the PNG image as bytes if
+          output is "png"
 
     '''
 
@@ -246,6 +273,20 @@ def visjs_network(nodes_dict, edges_dict,
 
     # check nodes_dict and edges_dict and fill in default values
     nodes_dict = check_nodes_dict(nodes_dict)
+    if drilldown:
+      for view in drilldown.values():
+        if view['nodes']:
+          check_nodes_dict(view['nodes'])
+
+    # hash the (default-filled) inputs and options, and reuse an unchanged render
+    cache_key = None
+    if render_cache and not export_network:
+        cache_options = dict(locals())
+        del cache_options['render_cache']
+        cache_key = _render_cache_key(cache_options)
+        cached = _render_cache_lookup(cache_key)
+        if cached is not None:
+            return cached
 
     if export_network:
         export_to_cytoscape(nodes_dict = nodes_dict,
@@ -254,6 +295,25 @@ def visjs_network(nodes_dict, edges_dict,
                             export_node_attribute = export_node_attribute,
                             export_edge_attribute = export_edge_attribute)
 
+    if output == "png":
+      import visJS2jupyter.static as static
+      vis_output = static.render_png(nodes_dict, edges_dict,
+                                     width = graph_width,
+                                     height = graph_height,
+                                     node_size_field = node_size_field,
+                                     node_size_transform = node_size_transform,
+                                     node_size_multiplier = node_size_multiplier,
+                                     node_color_border = node_color_border,
+                                     node_label_field = node_label_field,
+                                     node_font_size = node_font_size,
+                                     edge_color = edge_color,
+                                     edge_width = edge_width,
+                                     edge_alpha = edge_color_opacity,
+                                     graph_title = graph_title)
+      if cache_key is not None:
+        _render_cache_store(cache_key, vis_output, None, None)
+      return vis_output
+
     result = create_graph_style_file(filename = fname_temp,
 
                            # by node
@@ -390,10 +450,17 @@ def visjs_network(nodes_dict, edges_dict,
                            graph_id = graph_id,
                            override_graph_size_to_max = override_graph_size_to_max,
                            output = output,
+
+                           # deferred rendering
+                           defer_render = defer_render,
+                           defer_render_margin = defer_render_margin,
+                           teardown_offscreen = teardown_offscreen,
+                           teardown_margin = teardown_margin,
                            )
 
     if output == "jupyter":
-      html_return = HTML(
+      from IPython.display import HTML
+      vis_output = HTML(
     '<!doctype html>'
    + '<html>'
    + '<head>'
@@ -403,7 +470,7 @@ def visjs_network(nodes_dict, edges_dict,
    + '<script type="text/javascript">'
    + 'function setUpFrame() { '
    + '    var frame = window.frames["' + fname_temp.replace('.html','').replace('html/', '') + '"];'
-   + '    frame.runVis(' + dumps(nodes_dict) + ', ' + dumps(edges_dict) + ');'
+   + '    frame.runVis(' + dumps(nodes_dict) + ', ' + dumps(edges_dict) + ', ' + dumps(drilldown) + ');'
    + '}'
    + '</script>'
    + '<iframe name="' + fname_temp.replace('.html','').replace('html/', '')
@@ -411,14 +478,13 @@ def visjs_network(nodes_dict, edges_dict,
    + '</body>'
    + '</html>'
    )
-      return html_return
     elif output in ["zeppelin", "html", "div"]:
       script = """
         {}
         function setUpFrame() {{
-          window.runVis({}, {});
+          window.runVis({}, {}, {});
         }}{}
-      """.format(result["script"], dumps(nodes_dict), dumps(edges_dict), (("\n" + result["run"]) if output == "zeppelin" else ""))
+      """.format(result["script"], dumps(nodes_dict), dumps(edges_dict), dumps(drilldown), (("\n" + result["run"]) if output == "zeppelin" else ""))
       head = """
         {}
         <style type="text/css">
@@ -429,12 +495,12 @@ def visjs_network(nodes_dict, edges_dict,
         </script>
       """.format(result["external"], result["style"], script)
       if output == "zeppelin":
-        return """%html
+        vis_output = """%html
           {}
           {}
         """.format(result["body"], head)
       elif output == "html":
-        return """
+        vis_output = """
           <!doctype html>
           <html>
           <head>
@@ -452,13 +518,122 @@ def visjs_network(nodes_dict, edges_dict,
         # f.close()
         # print("Saved to {}!".format(standalone_filename))
       elif output == "div":
-        return {
+        vis_output = {
           "external": result["external"],
           "style": result["style"],
           "script": script,
           "run": result["run"],
           "body": result["body"],
         }
+    else:
+      return
+
+    if cache_key is not None:
+      _render_cache_store(cache_key, vis_output, fname_temp if output == "jupyter" else None, result)
+    return vis_output
+
+
+def _render_cache_key(options):
+    '''
+    Hash nodes_dict, edges_dict and the style options of a visjs_network call.
+    '''
+
+    payload = dumps(options, sort_keys=True, default=repr)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _render_size(vis_output):
+    '''
+    Approximate memory footprint (in characters) of a visjs_network output.
+    '''
+
+    if isinstance(vis_output, dict):
+        return sum(len(v) for v in vis_output.values())
+    if hasattr(vis_output, 'data'): # IPython HTML
+        return len(vis_output.data)
+    return len(vis_output)
+
+
+def _render_cache_lookup(cache_key):
+    '''
+    Return the cached output for cache_key, or None on a miss. The style file
+    of a jupyter render is always rewritten, since any other render with the
+    same graph_id (cached or not) may have replaced it since.
+    '''
+
+    if cache_key not in _render_cache:
+        _render_cache_stats['misses'] += 1
+        return None
+
+    _render_cache_stats['hits'] += 1
+    _render_cache[cache_key] = _render_cache.pop(cache_key) # mark as most recently used
+    vis_output, style_file, style_html, nbytes = _render_cache[cache_key]
+    if style_file is not None:
+        f = open(style_file, 'w')
+        f.write(style_html)
+        f.close()
+
+    if isinstance(vis_output, dict):
+        return dict(vis_output)
+    return vis_output
+
+
+def _render_cache_store(cache_key, vis_output, style_file, style_html):
+    '''
+    Add a render to the cache, evicting least recently used renders to stay
+    within the configured entry and byte limits.
+    '''
+
+    if style_file is None:
+        style_html = None
+
+    nbytes = _render_size(vis_output) + (len(style_html) if style_html else 0)
+    if nbytes > _render_cache_limits['max_bytes']:
+        return
+
+    _render_cache[cache_key] = (vis_output, style_file, style_html, nbytes)
+    _render_cache_stats['bytes'] += nbytes
+    while (len(_render_cache) > _render_cache_limits['max_entries']
+           or _render_cache_stats['bytes'] > _render_cache_limits['max_bytes']):
+        evicted = _render_cache.popitem(last=False)[1]
+        _render_cache_stats['bytes'] -= evicted[3]
+
+
+def set_render_cache_limits(max_entries = 32, max_bytes = 64*1024*1024):
+    '''
+    Set the bounds of the visjs_network render cache, evicting renders as needed.
+
+    Inputs:
+        - max_entries: maximum number of cached renders, default: 32
+        - max_bytes: maximum total size (in characters) of cached renders, default: 64 MB
+    '''
+
+    _render_cache_limits['max_entries'] = max_entries
+    _render_cache_limits['max_bytes'] = max_bytes
+    while _render_cache and (len(_render_cache) > max_entries or _render_cache_stats['bytes'] > max_bytes):
+        evicted = _render_cache.popitem(last=False)[1]
+        _render_cache_stats['bytes'] -= evicted[3]
+
+
+def clear_render_cache():
+    '''
+    Empty the visjs_network render cache and reset its hit/miss counters.
+    '''
+
+    _render_cache.clear()
+    _render_cache_stats.update({'hits': 0, 'misses': 0, 'bytes': 0})
+
+
+def render_cache_info():
+    '''
+    Return a dictionary with the hits, misses, entries and bytes of the
+    visjs_network render cache, along with its configured limits.
+    '''
+
+    info = dict(_render_cache_stats)
+    info['entries'] = len(_render_cache)
+    info.update(_render_cache_limits)
+    return info
 
 
 def export_to_cytoscape(nodes_dict = 0,
@@ -643,19 +818,36 @@ def export_to_cytoscape(nodes_dict = 0,
     f.close()
 
 
+def get_cmap(cmap):
+    '''
+    Returns the matplotlib colormap named cmap, or cmap itself if it already
+    is a colormap. matplotlib is only imported here, on first use.
+    '''
+
+    if not isinstance(cmap, str):
+        return cmap
+    import matplotlib
+    if hasattr(matplotlib, 'colormaps'):
+        return matplotlib.colormaps[cmap]
+    import matplotlib.cm
+    return matplotlib.cm.get_cmap(cmap)
+
+
 # development versions of return_node_to_color and return_edge_to_color
 
-def return_node_to_color(G,field_to_map='degree',cmap=mpl.cm.jet,alpha = 1.0, color_vals_transform = None,ceil_val=10,
+def return_node_to_color(G,field_to_map='degree',cmap='jet',alpha = 1.0, color_vals_transform = None,ceil_val=10,
                         color_max_frac = 1.0,color_min_frac = 0.0,vmin=None,vmax=None):
     
 
     '''
     Function to return a dictionary mapping nodes (keys) to colors (values), based on the selected field_to_map.
         - field_to_map must be a node attribute
-        - cmap must be a valid matplotlib colormap
+        - cmap must be a valid matplotlib colormap, or the name of one
         - color_max_frac and color_min_frac allow user to set lower and upper ranges for colormap
     
     '''
+
+    cmap = get_cmap(cmap)
     
     
     
@@ -709,16 +901,18 @@ def return_node_to_color(G,field_to_map='degree',cmap=mpl.cm.jet,alpha = 1.0, co
     
     return node_to_color
 
-def return_edge_to_color(G,field_to_map='degree',cmap=mpl.cm.jet,alpha = 1.0, color_vals_transform = None,ceil_val=10,
+def return_edge_to_color(G,field_to_map='degree',cmap='jet',alpha = 1.0, color_vals_transform = None,ceil_val=10,
                         vmin=None,vmax=None):
     
     
     '''
     Function to return a dictionary mapping edges (keys) to colors (values), based on the selected field_to_map.
         - field_to_map must be an edge attribute
-        - cmap must be a valid matplotlib colormap
+        - cmap must be a valid matplotlib colormap, or the name of one
     
     '''
+
+    cmap = get_cmap(cmap)
     
     # if this is a multigraph or multidigraph, we need to keep track of keys
     if (type(G) == nx.classes.multigraph.MultiGraph) | (type(G) == nx.classes.multidigraph.MultiDiGraph):
@@ -944,6 +1138,12 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
                            graph_id = 0,
                            override_graph_size_to_max = False,
                            output = "jupyter",
+
+                           # deferred rendering
+                           defer_render = True, # only build the network once its container scrolls into view
+                           defer_render_margin = 200, # distance (px) outside the viewport at which a deferred network starts building
+                           teardown_offscreen = False, # destroy deferred networks that scroll far away, rebuilding them on return
+                           teardown_margin = 3000, # distance (px) outside the viewport beyond which a network is torn down
                            ):
 
 
@@ -954,6 +1154,12 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
 
     Temporary file is saved under name filename, and is loaded by function visjs_network
 
+    When defer_render is set, runVis only draws a lightweight placeholder and
+    builds the vis.Network once the container comes within defer_render_margin
+    pixels of the viewport (via an IntersectionObserver), so a notebook with
+    many graphs only pays for the ones on screen. Browsers without
+    IntersectionObserver fall back to building immediately.
+
 
     '''
 
@@ -995,6 +1201,8 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
     zoom_view = stringify_bool(zoom_view)
     config_enabled = stringify_bool(config_enabled)
     showButton = stringify_bool(showButton)
+    defer_render = stringify_bool(defer_render)
+    teardown_offscreen = stringify_bool(teardown_offscreen)
 
     graph_width = scaling_factor * graph_width
     graph_height = scaling_factor * graph_height
@@ -1032,7 +1240,45 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
   <div id="mynetwork{}"></div>""".format(graph_id)
 
     run_vis = """
-    function runVis(visNodes, visEdges) {
+    function runVis(visNodes, visEdges, drilldown) {
+       var container = document.getElementById('mynetwork""" + str(graph_id) + """');
+       if (!""" + defer_render + """ || !('IntersectionObserver' in window)) {
+          buildVis(visNodes, visEdges, container, drilldown);
+          return;
+       }
+
+       // draw a placeholder and only build the network once it scrolls into view
+       var placeholder = '<div style="width: 100%; height: 100%; display: flex; align-items: center; '
+                       + 'justify-content: center; color: #848484; font-family: arial;">'
+                       + 'Network will be drawn when scrolled into view</div>';
+       var network = null;
+       container.innerHTML = placeholder;
+       var nearObserver = new IntersectionObserver(function(entries) {
+          entries.forEach(function(entry) {
+             if (entry.isIntersecting && network === null) {
+                container.innerHTML = '';
+                network = buildVis(visNodes, visEdges, container, drilldown);
+             }
+          });
+       }, {rootMargin: '""" + str(defer_render_margin) + """px'});
+       nearObserver.observe(container);
+
+       // optionally tear the network down again once it is far off-screen
+       if (""" + teardown_offscreen + """) {
+          var farObserver = new IntersectionObserver(function(entries) {
+             entries.forEach(function(entry) {
+                if (!entry.isIntersecting && network !== null) {
+                   network.destroy();
+                   network = null;
+                   container.innerHTML = placeholder;
+                }
+             });
+          }, {rootMargin: '""" + str(teardown_margin) + """px'});
+          farObserver.observe(container);
+       }
+    }
+
+    function buildVis(visNodes, visEdges, container, drilldown) {
        var vizOptions = {
           configure: {
             enabled: """ + config_enabled + """,
@@ -1202,6 +1448,35 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
             }
           }
        };
+       var myNetwork = new vis.Network(container, visData(visNodes, visEdges), vizOptions);
+
+        myNetwork.fit();
+
+       // clicking a node with drill-down data draws its network in place,
+       // and double-clicking the background returns to the first network
+       if (drilldown) {
+          var overview = true;
+          myNetwork.on('click', function(params) {
+             if (overview && params.nodes.length == 1 && drilldown[params.nodes[0]]) {
+                overview = false;
+                myNetwork.setData(visData(drilldown[params.nodes[0]].nodes, drilldown[params.nodes[0]].edges));
+                myNetwork.fit();
+             }
+          });
+          myNetwork.on('doubleClick', function(params) {
+             if (!overview && params.nodes.length == 0) {
+                overview = true;
+                myNetwork.setData(visData(visNodes, visEdges));
+                myNetwork.fit();
+             }
+          });
+       }
+
+       console.log( "ready!" );
+       return myNetwork;
+    }
+
+    function visData(visNodes, visEdges) {
        var python_nodes = visNodes;
        var nodeArray = [];
        for(var i=0; i<python_nodes.length; i++){
@@ -1245,18 +1520,10 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
        var vis_nodes = new vis.DataSet(nodeArray);
        var vis_edges = new vis.DataSet(edgeArray);
 
-        var container = document.getElementById('mynetwork""" + str(graph_id) + """');
-        var data = {
+        return {
             edges: vis_edges,
             nodes: vis_nodes
         };
-        var options = {};
-        var myNetwork = new vis.Network(container, data, vizOptions);
-
-        myNetwork.fit();
-
-
-       console.log( "ready!" );
     }
     """
 
@@ -1290,7 +1557,7 @@ def create_graph_style_file(filename = 'visJS_html_file_temp',
       f = open(filename, 'w')
       f.write(visJS_to_write)
       f.close()
-      return None
+      return visJS_to_write
     else:
       return {
         "external": external,
@@ -10,28 +10,32 @@ Authors:
 '''
 
 from __future__ import print_function
+from collections import OrderedDict
 import json
 import math
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
-import pandas as pd
 #import visJS_module # use this for local testing
 import visJS2jupyter.visJS_module as visJS_module
-import scipy_heatKernel
+import visJS2jupyter.pipeline as pipeline
+import visJS2jupyter.adjacency as adjacency
+
+# node labels and label -> position dictionaries of recent (adjacency, labels) networks
+_node_indices = OrderedDict()
 
 def draw_graph_overlap(G1, G2,
-                       edge_cmap=plt.cm.coolwarm,
+                       edge_cmap='coolwarm',
                        export_file='graph_overlap.json',
                        export_network=False,
                        highlight_nodes=None,
                        k=None,
-                       node_cmap=plt.cm.autumn,
+                       node_cmap='autumn',
                        node_name_1='graph 1',
                        node_name_2='graph 2',
                        node_size=10,
                        physics_enabled=False,
+                       cull_labels=False,
+                       profile=False,
                        **kwargs):
     '''
     Takes two networkX graphs and displays their overlap, where intersecting
@@ -40,148 +44,74 @@ def draw_graph_overlap(G1, G2,
     Inputs:
         - G1: a networkX graph
         - G2: a networkX graph
-        - edge_cmap: matplotlib colormap for edges, default: matplotlib.cm.coolwarm
+        - edge_cmap: matplotlib colormap (or colormap name) for edges, default: 'coolwarm'
         - export_file: JSON file to export graph data, default: 'graph_overlap.json'
         - export_network: export network to Cytoscape, default: False
         - highlight_nodes: list of nodes to place borders around, default: None
         - k: float, optimal distance between nodes for nx.spring_layout(), default: None
-        - node_cmap: matplotlib colormap for nodes, default: matplotlib.cm.autumn
+        - node_cmap: matplotlib colormap (or colormap name) for nodes, default: 'autumn'
         - node_name_1: string to name first graph's nodes, default: 'graph 1'
         - node_name_2: string to name second graph's nodes, default: 'graph 2'
         - node_size: size of nodes, default: 10
         - physics_enabled: enable physics simulation, default: False
+        - cull_labels: only label the nodes whose labels do not overlap the
+          label of a highlighted or higher degree node (see
+          visJS2jupyter.label_culling), default: False
+        - profile: also return a pipeline.RenderProfile with the time, memory
+          and size of each stage, default: False
 
     Returns:
-        - VisJS html network plot (iframe) of the graph overlap.
+        - VisJS html network plot (iframe) of the graph overlap, or a
+          (plot, RenderProfile) tuple if profile is True.
     '''
 
-    G_overlap = create_graph_overlap(G1, G2, node_name_1, node_name_2)
+    if profile:
+        draw_args = dict(locals(), profile=False)
+        draw_args.update(draw_args.pop('kwargs'))
+        return pipeline.profiled(draw_graph_overlap, **draw_args)
 
-    # create nodes dict and edges dict for input to visjs
-    nodes = list(G_overlap.nodes())
-    edges = list(G_overlap.edges())
+    overlap_key = ('overlap', pipeline.graph_key(G1), pipeline.graph_key(G2), node_name_1, node_name_2)
+    G_overlap = pipeline.run_stage('overlap', overlap_key, create_graph_overlap, G1, G2, node_name_1, node_name_2)
 
-    # set the position of each node
-    if k is None:
-        pos = nx.spring_layout(G_overlap)
-    else:
-        pos = nx.spring_layout(G_overlap,k=k)
+    # every node and edge of the overlap is drawn
+    nodes, edges = pipeline.run_stage('select', overlap_key, _graph_elements, G_overlap)
 
-    xpos,ypos=zip(*pos.values())
-    nx.set_node_attributes(G_overlap, name = 'xpos', values = dict(zip(pos.keys(),[x*1000 for x in xpos])))
-    nx.set_node_attributes(G_overlap, name = 'ypos', values = dict(zip(pos.keys(),[y*1000 for y in ypos])))
+    # set the position of each node
+    layout_key = overlap_key + (k,)
+    pos = pipeline.run_stage('layout', layout_key, _spring_layout, G_overlap, nodes, k)
 
-    # set the border width of nodes
+    # set the border width, shape, label and title of each node
     if 'node_border_width' not in kwargs.keys():
         kwargs['node_border_width'] = 2
 
-    border_width = {}
-    for n in nodes:
-        if highlight_nodes is not None and n in highlight_nodes:
-            border_width[n] = kwargs['node_border_width']
-        else:
-            border_width[n] = 0
-
-    nx.set_node_attributes(G_overlap, name = 'nodeOutline', values = border_width)
-
-    # set the shape of each node
-    nodes_shape=[]
-    for node in G_overlap.nodes(data=True):
-        if node[1]['node_overlap']==0:
-            nodes_shape.append('dot')
-        elif node[1]['node_overlap']==2:
-            nodes_shape.append('square')
-        elif node[1]['node_overlap']==1:
-            nodes_shape.append('triangle')
-    node_to_shape=dict(zip(G_overlap.nodes(),nodes_shape))
-    nx.set_node_attributes(G_overlap, name = 'nodeShape', values = node_to_shape)
-
-    # set the node label of each node
-    if highlight_nodes:
-        node_labels = {}
-        for node in nodes:
-            if node in highlight_nodes:
-                node_labels[node] = str(node)
-            else:
-                node_labels[node] = ''
-    else:
-        node_labels = {n:str(n) for n in nodes}
-
-    nx.set_node_attributes(G_overlap, name = 'nodeLabel', values = node_labels)
-
-    # set the node title of each node
-    node_titles = [ node[1]['node_name_membership'] + '<br/>' + str(node[0])
-                    for node in G_overlap.nodes(data=True) ]
-    node_titles = dict(zip(G_overlap.nodes(),node_titles))
-    nx.set_node_attributes(G_overlap, name = 'nodeTitle', values = node_titles)
-
-    # set color of each node
-    node_to_color = visJS_module.return_node_to_color(G_overlap,
-                                                      field_to_map='node_overlap',
-                                                      cmap=node_cmap,
-                                                      color_max_frac=.9,
-                                                      color_min_frac=.1)
+    style_key = overlap_key + (_nodes_key(highlight_nodes), kwargs['node_border_width'])
+    node_styles = pipeline.run_stage('style', style_key, _overlap_node_styles,
+                                     G_overlap, nodes, highlight_nodes, kwargs['node_border_width'])
+    if cull_labels:
+        font_size = kwargs.get('node_font_size', 14)
+        node_styles = pipeline.run_stage('labels', style_key + (k, font_size), _cull_node_labels,
+                                         nodes, pos, node_styles, [G_overlap.degree(n) for n in nodes],
+                                         font_size)
 
-    # set color of each edge
-    edge_to_color = visJS_module.return_edge_to_color(G_overlap,
-                                                      field_to_map='edge_weight',
-                                                      cmap=edge_cmap,
-                                                      alpha=.3)
+    # set color of each node and edge
+    color_key = overlap_key + (pipeline.cmap_key(node_cmap), pipeline.cmap_key(edge_cmap))
+    node_colors, edge_colors = pipeline.run_stage('color', color_key, _overlap_colors,
+                                                  G_overlap, nodes, edges, node_cmap, edge_cmap)
 
-    # create the nodes_dict with all relevant fields
-    nodes_dict = [{'id':str(n),
-                   'border_width':border_width[n],
-                   'color':node_to_color[n],
-                   'degree':G_overlap.degree(n),
-                   'node_label':node_labels[n],
-                   'node_shape':node_to_shape[n],
-                   'node_size':node_size,
-                   'title':node_titles[n],
-                   'x':np.float64(pos[n][0]).item()*1000,
-                   'y':np.float64(pos[n][1]).item()*1000}
-                  for n in nodes]
+    _annotate_graph(G_overlap, nodes, pos, node_styles)
 
-    # map nodes to indices for source/target in edges
-    node_map = dict(zip(nodes,range(len(nodes))))
+    # create the nodes_dict and edges_dict with all relevant fields
+    nodes_dict, edges_dict = pipeline.run_stage('serialize', None, _serialize,
+                                                G_overlap, nodes, edges, pos, node_styles,
+                                                node_colors, edge_colors, node_size)
 
-    # create the edges_dict with all relevant fields
-    edges_dict = [{'source':node_map[edges[i][0]],
-                   'target':node_map[edges[i][1]],
-                   'color':edge_to_color[edges[i]]}
-                  for i in range(len(edges))]
-
-    # set node_size_multiplier to increase node size as graph gets smaller
-    if 'node_size_multiplier' not in kwargs.keys():
-        if len(nodes) > 500:
-            kwargs['node_size_multiplier'] = 3
-        elif len(nodes) > 200:
-            kwargs['node_size_multiplier'] = 5
-        else:
-            kwargs['node_size_multiplier'] = 7
-
-    kwargs['physics_enabled'] = physics_enabled
-
-    # if node hovering color not set, set default to black
-    if 'node_color_hover_background' not in kwargs.keys():
-        kwargs['node_color_hover_background'] = 'black'
-
-    # node size determined by size in nodes_dict, not by id
-    if 'node_size_field' not in kwargs.keys():
-        kwargs['node_size_field'] = 'node_size'
-
-    # node label determined by value in nodes_dict
-    if 'node_label_field' not in kwargs.keys():
-        kwargs['node_label_field'] = 'node_label'
+    _set_render_defaults(kwargs, len(nodes), physics_enabled, (3, 5, 7))
 
     # export the network to JSON for Cytoscape
     if export_network:
-        node_colors = map_node_to_color(G_overlap,'node_overlap',False)
-        nx.set_node_attributes(G_overlap, name = 'nodeColor', values = node_colors)
-        edge_colors = map_edge_to_color(G_overlap,'edge_weight',False)
-        nx.set_edge_attributes(G_overlap, name = 'edgeColor', values = edge_colors)
-        visJS_module.export_to_cytoscape(G = G_overlap, export_file = export_file)
+        pipeline.run_stage('export', None, _export_network, G_overlap, 'node_overlap', False, export_file)
 
-    return visJS_module.visjs_network(nodes_dict,edges_dict,**kwargs)
+    return pipeline.run_stage('render', None, visJS_module.visjs_network, nodes_dict, edges_dict, **kwargs)
 
 
 def create_graph_overlap(G1,G2,node_name_1,node_name_2):
@@ -254,275 +184,598 @@ def create_graph_overlap(G1,G2,node_name_1,node_name_2):
 
 
 def draw_heat_prop(G, seed_nodes, random_walk = True,
-                   edge_cmap=plt.cm.autumn_r,
+                   edge_cmap='autumn_r',
                    export_file='heat_prop.json',
                    export_network=False,
                    highlight_nodes=None,
                    k=None,
                    largest_connected_component=False,
-                   node_cmap=plt.cm.autumn_r,
+                   node_cmap='autumn_r',
                    node_size=10,
                    num_nodes=None,
                    physics_enabled=False,
                    Wprime=None,
+                   heat_kernel=None,
+                   method='power',
+                   tol=None,
+                   prev_heat=None,
+                   prev_seed_nodes=None,
+                   diffusion_time=None,
+                   max_edges=None,
+                   backbone='disparity',
+                   backbone_weight='heat',
+                   cull_labels=False,
+                   label_priority='heat',
+                   profile=False,
                    **kwargs):
     '''
     Implements and displays the network propagation for a given graph and seed
     nodes. Additional kwargs are passed to visJS_module.
 
     Inputs:
-        - G: a networkX graph
+        - G: a networkX graph, or an (adjacency, labels) pair (see
+          visJS2jupyter.loaders), in which case the propagation runs on the
+          sparse matrix and a networkX graph is only built for the drawn nodes
         - seed_nodes: nodes on which to initialize the simulation (must be a dict if random_walk = False)
           - random_walk: True to perform a random walk style heat propagation, False to perform a diffusion style one.
-        - edge_cmap: matplotlib colormap for edges, default: matplotlib.cm.autumn_r
+        - edge_cmap: matplotlib colormap (or colormap name) for edges, default: 'autumn_r'
         - export_file: JSON file to export graph data, default: 'graph_overlap.json'
         - export_network: export network to Cytoscape, default: False
         - highlight_nodes: list of nodes to place borders around, default: None
         - k: float, optimal distance between nodes for nx.spring_layout(), default: None
         - largest_connected_component: boolean, whether or not to display largest_connected_component,
                                        default: False
-        - node_cmap: matplotlib colormap for nodes, default: matplotlib.cm.autumn_r
+        - node_cmap: matplotlib colormap (or colormap name) for nodes, default: 'autumn_r'
         - node_size: size of nodes, default: 10
         - num_nodes: the number of the hottest nodes to graph, default: None (all nodes will be graphed)
         - physics_enabled: enable physics simulation, default: False
-        - Wprime: normalized adjacency matrix (from function normalized_adj_matrix())
+        - Wprime: normalized adjacency matrix (from function normalized_adj_matrix()),
+          or an editable operators.NormalizedAdjacencyOperator
+        - heat_kernel: precomputed scipy_heatKernel.SciPYKernel of G, used when random_walk = False
+        - method: random walk propagation method, 'power' or 'push' (see
+          network_propagation), default: 'power'
+        - tol: convergence tolerance (see network_propagation), default: None
+        - prev_heat: node heats from a previous random walk propagation on G
+          (e.g. G's 'node_heat' attribute), to warm start from, default: None
+        - prev_seed_nodes: seed nodes of prev_heat, to only propagate the
+          change in seeds, default: None
+        - diffusion_time: diffusion time t of the heat kernel exp(-t*L) when
+          random_walk = False, default: None (the kernel's own, 0.1). A
+          heat_kernel built with mode = 'eigen' diffuses for any t cheaply
+        - max_edges: maximum number of edges drawn, default: None (all edges
+          of the drawn nodes). Larger subgraphs are reduced to an edge
+          backbone (see visJS2jupyter.backbone), and the number of edges
+          dropped is printed
+        - backbone: how edges are chosen when there are more than max_edges,
+          'disparity' (the most significant edges under the disparity
+          filter) or 'top_k' (the strongest edges of each node), default:
+          'disparity'
+        - backbone_weight: edge weight the backbone is computed on, 'heat'
+          (the product of the endpoints' heats) or the name of an edge
+          attribute (for an (adjacency, labels) pair, any other name uses
+          the matrix entries), default: 'heat'
+        - cull_labels: only label the nodes whose labels do not overlap the
+          label of a seed, highlighted or higher priority node (see
+          visJS2jupyter.label_culling), default: False
+        - label_priority: order in which labels are kept when cull_labels is
+          True, 'heat' or 'degree' (in the drawn subgraph), default: 'heat'
+        - profile: also return a pipeline.RenderProfile with the time, memory
+          and size of each stage, default: False
 
     Returns:
-        - VisJS html network plot (iframe) of the heat propagation.
+        - VisJS html network plot (iframe) of the heat propagation, or a
+          (plot, RenderProfile) tuple if profile is True.
     '''
 
+    if profile:
+        draw_args = dict(locals(), profile=False)
+        draw_args.update(draw_args.pop('kwargs'))
+        return pipeline.profiled(draw_heat_prop, **draw_args)
+
+    if backbone not in ('disparity', 'top_k'):
+        print ("backbone must be 'disparity' or 'top_k'")
+        return
+
+    if label_priority not in ('heat', 'degree'):
+        print ("label_priority must be 'heat' or 'degree'")
+        return
+
     # check for invalid nodes in seed_nodes
-    invalid_nodes = [node for node in seed_nodes if node not in G.nodes()]
+    graph_nodes = _graph_nodes(G)
+    invalid_nodes = [node for node in seed_nodes if node not in graph_nodes]
     for node in invalid_nodes:
         print ('Node {} not in graph'.format(node))
     if invalid_nodes:
         return
 
-    # perform the network propagation
-    if random_walk == True: # perform random walk style heat propagation
-        if Wprime is None:
-            Wprime = normalized_adj_matrix(G)    
-        prop_graph = network_propagation(G, Wprime, seed_nodes).to_dict()
-        nx.set_node_attributes(G, name = 'node_heat', values = prop_graph)
-    else: # perform diffusion style heat propagation
+    if not random_walk:
         if (type(seed_nodes) == list): # if the user supplies a list, convert to dict
             one_list = [1]*len(seed_nodes) # all seed nodes get start value of 1
             seed_nodes = dict(zip(seed_nodes, one_list))
         elif (type(seed_nodes) != dict):
             print('seed_nodes must be a list or a dict')
             return -1
-        heat_kernel = scipy_heatKernel.SciPYKernel(G) # need a graph
-        diffused_heats = heat_kernel.diffuse(seed_nodes) # need seed_to_heat mapping
-        nx.set_node_attributes(G, name = 'node_heat', values = dict(diffused_heats))
-
-    # find top num_nodes hottest nodes and connected component if requested
-    G = set_num_nodes(G,num_nodes)
-    if largest_connected_component:
-        G = max(nx.connected_component_subgraphs(G), key=len)
-    nodes = list(G.nodes())
-    edges = list(G.edges())
-
-    # check for empty nodes and edges after getting subgraph of G
-    if not nodes:
-        print ('There are no nodes in the graph. Try increasing num_nodes.')
-        return
-    if not edges:
-        print ('There are no edges in the graph. Try increasing num_nodes.')
-        return
-
-    # set the position of each node
-    if k is None:
-        pos = nx.spring_layout(G)
-    else:
-        pos = nx.spring_layout(G,k=k)
-
-    xpos,ypos=zip(*pos.values())
-    nx.set_node_attributes(G, name = 'xpos', values = dict(zip(pos.keys(),[x*1000 for x in xpos])))
-    nx.set_node_attributes(G, name = 'ypos', values = dict(zip(pos.keys(),[y*1000 for y in ypos])))
-
-    # set the border width of nodes
-    if 'node_border_width' not in kwargs.keys():
-        kwargs['node_border_width'] = 2
-
-    border_width = {}
-    for n in nodes:
-        if n in seed_nodes:
-            border_width[n] = kwargs['node_border_width']
-        elif highlight_nodes is not None and n in highlight_nodes:
-            border_width[n] = kwargs['node_border_width']
-        else:
-            border_width[n] = 0
-
-    nx.set_node_attributes(G, name = 'nodeOutline', values = border_width)
-
-    # set the shape of each node
-    nodes_shape=[]
-    for node in G.nodes():
-        if node in seed_nodes:
-            nodes_shape.append('triangle')
-        else:
-            nodes_shape.append('dot')
-    node_to_shape=dict(zip(G.nodes(),nodes_shape))
-    nx.set_node_attributes(G, name = 'nodeShape', values = node_to_shape)
-
-    # add a field for node labels
-    if highlight_nodes:
-        node_labels = {}
-        for node in nodes:
-            if node in seed_nodes:
-                node_labels[node] = str(node)
-            elif node in highlight_nodes:
-                node_labels[node] = str(node)
-            else:
-                node_labels[node] = ''
-    else:
-        node_labels = {n:str(n) for n in nodes}
-
-    nx.set_node_attributes(G, name = 'nodeLabel', values = node_labels)
-
-    # set title for each node
-    node_titles = [str(node[0]) + '<br/>heat = ' + str(round(node[1]['node_heat'],5))
-                   for node in G.nodes(data=True)]
-    node_titles = dict(zip(G.nodes(),node_titles))
-    nx.set_node_attributes(G, name = 'nodeTitle', values = node_titles)
-
-    # set color of each node
-    node_to_color = visJS_module.return_node_to_color(G,
-                                                      field_to_map='node_heat',
-                                                      cmap=node_cmap,
-                                                      color_vals_transform='log')
-
-    # set heat value of edge based off hottest connecting node's value
-    node_attr = nx.get_node_attributes(G,'node_heat')
-    edge_weights = {}
-    for e in edges:
-        if node_attr[e[0]] > node_attr[e[1]]:
-            edge_weights[e] = node_attr[e[0]]
-        else:
-            edge_weights[e] = node_attr[e[1]]
-
-    nx.set_edge_attributes(G, name = 'edge_weight', values = edge_weights)
-
-    # set color of each edge
-    edge_to_color = visJS_module.return_edge_to_color(G,
-                                                      field_to_map='edge_weight',
-                                                      cmap=edge_cmap,
-                                                      color_vals_transform='log')
-
-    # create the nodes_dict with all relevant fields
-    nodes_dict = [{'id':str(n),
-                   'border_width':border_width[n],
-                   'degree':G.degree(n),
-                   'color':node_to_color[n],
-                   'node_label':node_labels[n],
-                   'node_size':node_size,
-                   'node_shape':node_to_shape[n],
-                   'title':node_titles[n],
-                   'x':np.float64(pos[n][0]).item()*1000,
-                   'y':np.float64(pos[n][1]).item()*1000} for n in nodes]
-
-    # map nodes to indices for source/target in edges
-    node_map = dict(zip(nodes,range(len(nodes))))
-
-    # create the edges_dict with all relevant fields
-    edges_dict = [{'source':node_map[edges[i][0]],
-                   'target':node_map[edges[i][1]],
-                   'color':edge_to_color[edges[i]]} for i in range(len(edges))]
-
-    # set node_size_multiplier to increase node size as graph gets smaller
-    if 'node_size_multiplier' not in kwargs.keys():
-        if len(nodes) > 500:
-            kwargs['node_size_multiplier'] = 3
-        elif len(nodes) > 200:
-            kwargs['node_size_multiplier'] = 5
-        else:
-            kwargs['node_size_multiplier'] = 7
-
-    kwargs['physics_enabled'] = physics_enabled
-
-    # if node hovering color not set, set default to black
-    if 'node_color_hover_background' not in kwargs.keys():
-        kwargs['node_color_hover_background'] = 'black'
-
-    # node size determined by size in nodes_dict, not by id
-    if 'node_size_field' not in kwargs.keys():
-        kwargs['node_size_field'] = 'node_size'
 
-    # node label determined by value in nodes_dict
-    if 'node_label_field' not in kwargs.keys():
-        kwargs['node_label_field'] = 'node_label'
-
-    # export the network to JSON for Cytoscape
-    if export_network:
-        node_colors = map_node_to_color(G,'node_heat',True)
-        nx.set_node_attributes(G, name = 'nodeColor', values = node_colors)
-        edge_colors = map_edge_to_color(G,'edge_weight',True)
-        nx.set_edge_attributes(G, name = 'edgeColor', values = edge_colors)
-        visJS_module.export_to_cytoscape(G = G,export_file = export_file)
-
-    return visJS_module.visjs_network(nodes_dict,edges_dict,**kwargs)
+    # perform the network propagation
+    heat_key = _heat_prop_key(G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                              prev_heat, prev_seed_nodes, diffusion_time)
+    node_heat = pipeline.run_stage('propagate', heat_key, _propagate_heat,
+                                   G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                                   prev_heat, prev_seed_nodes, diffusion_time)
+    if not adjacency.is_adjacency(G):
+        nx.set_node_attributes(G, name = 'node_heat', values = node_heat)
+
+    return _draw_heat(G, node_heat, heat_key, [(seed_nodes, 'triangle')],
+                      title_precision=5,
+                      size_multipliers=(3, 5, 7),
+                      max_edges=max_edges,
+                      backbone=backbone,
+                      backbone_weight=backbone_weight,
+                      cull_labels=cull_labels,
+                      label_priority=label_priority,
+                      edge_cmap=edge_cmap,
+                      export_file=export_file,
+                      export_network=export_network,
+                      highlight_nodes=highlight_nodes,
+                      k=k,
+                      largest_connected_component=largest_connected_component,
+                      node_cmap=node_cmap,
+                      node_size=node_size,
+                      num_nodes=num_nodes,
+                      physics_enabled=physics_enabled,
+                      kwargs=kwargs)
 
 
 def draw_colocalization(G, seed_nodes_1, seed_nodes_2,
-                        edge_cmap=plt.cm.autumn_r,
+                        edge_cmap='autumn_r',
                         export_file='colocalization.json',
                         export_network=False,
                         highlight_nodes=None,
                         k=None,
                         largest_connected_component=False,
-                        node_cmap=plt.cm.autumn_r,
+                        node_cmap='autumn_r',
                         node_size=10,
                         num_nodes=None,
                         physics_enabled=False,
                         Wprime=None,
+                        max_edges=None,
+                        backbone='disparity',
+                        backbone_weight='heat',
+                        cull_labels=False,
+                        label_priority='heat',
+                        profile=False,
                         **kwargs):
     '''
     Implements and displays the network propagation for a given graph and two
     sets of seed nodes. Additional kwargs are passed to visJS_module.
 
     Inputs:
-        - G: a networkX graph
+        - G: a networkX graph, or an (adjacency, labels) pair (see
+          visJS2jupyter.loaders), in which case the propagation runs on the
+          sparse matrix and a networkX graph is only built for the drawn nodes
         - seed_nodes_1: first set of nodes on which to initialize the simulation
         - seed_nodes_2: second set of nodes on which to initialize the simulation
-        - edge_cmap: matplotlib colormap for edges, optional, default: matplotlib.cm.autumn_r
+        - edge_cmap: matplotlib colormap (or colormap name) for edges, optional, default: 'autumn_r'
         - export_file: JSON file to export graph data, default: 'colocalization.json'
         - export_network: export network to Cytoscape, default: False
         - highlight_nodes: list of nodes to place borders around, default: None
         - k: float, optional, optimal distance between nodes for nx.spring_layout(), default: None
         - largest_connected_component: boolean, optional, whether or not to display largest_connected_component,
                                        default: False
-        - node_cmap: matplotlib colormap for nodes, optional, default: matplotlib.cm.autumn_r
+        - node_cmap: matplotlib colormap (or colormap name) for nodes, optional, default: 'autumn_r'
         - node_size: size of nodes, default: 10
         - num_nodes: the number of the hottest nodes to graph, default: None (all nodes will be graphed)
         - physics_enabled: enable physics simulation, default: False
-        - Wprime:  Normalized adjacency matrix (from normalized_adj_matrix)
+        - Wprime:  Normalized adjacency matrix (from normalized_adj_matrix),
+          or an editable operators.NormalizedAdjacencyOperator
+        - max_edges, backbone, backbone_weight: edge backbone options, as in
+          draw_heat_prop
+        - cull_labels, label_priority: label culling options, as in
+          draw_heat_prop
+        - profile: also return a pipeline.RenderProfile with the time, memory
+          and size of each stage, default: False
 
     Returns:
-        - VisJS html network plot (iframe) of the colocalization.
+        - VisJS html network plot (iframe) of the colocalization, or a
+          (plot, RenderProfile) tuple if profile is True.
     '''
 
+    if profile:
+        draw_args = dict(locals(), profile=False)
+        draw_args.update(draw_args.pop('kwargs'))
+        return pipeline.profiled(draw_colocalization, **draw_args)
+
+    if backbone not in ('disparity', 'top_k'):
+        print ("backbone must be 'disparity' or 'top_k'")
+        return
+
+    if label_priority not in ('heat', 'degree'):
+        print ("label_priority must be 'heat' or 'degree'")
+        return
+
     # check for invalid nodes in seed_nodes
-    invalid_nodes = [(node,'seed_nodes_1') for node in seed_nodes_1 if node not in G.nodes()]
-    invalid_nodes.extend([(node,'seed_nodes_2') for node in seed_nodes_2 if node not in G.nodes()])
+    graph_nodes = _graph_nodes(G)
+    invalid_nodes = [(node,'seed_nodes_1') for node in seed_nodes_1 if node not in graph_nodes]
+    invalid_nodes.extend([(node,'seed_nodes_2') for node in seed_nodes_2 if node not in graph_nodes])
     for node in invalid_nodes:
         print ('Node {} in {} not in graph'.format(node[0], node[1]))
     if invalid_nodes:
         return
 
     # perform the colocalization
+    heat_key = ('colocalization', pipeline.graph_key(G), pipeline.seeds_key(seed_nodes_1),
+                pipeline.seeds_key(seed_nodes_2), pipeline.operator_key(Wprime))
+    node_heat = pipeline.run_stage('propagate', heat_key, _colocalization_heat,
+                                   G, seed_nodes_1, seed_nodes_2, Wprime)
+    if not adjacency.is_adjacency(G):
+        nx.set_node_attributes(G, name = 'node_heat', values = node_heat)
+
+    return _draw_heat(G, node_heat, heat_key, [(seed_nodes_1, 'triangle'), (seed_nodes_2, 'square')],
+                      title_precision=10,
+                      size_multipliers=(1, 3, 5),
+                      max_edges=max_edges,
+                      backbone=backbone,
+                      backbone_weight=backbone_weight,
+                      cull_labels=cull_labels,
+                      label_priority=label_priority,
+                      edge_cmap=edge_cmap,
+                      export_file=export_file,
+                      export_network=export_network,
+                      highlight_nodes=highlight_nodes,
+                      k=k,
+                      largest_connected_component=largest_connected_component,
+                      node_cmap=node_cmap,
+                      node_size=node_size,
+                      num_nodes=num_nodes,
+                      physics_enabled=physics_enabled,
+                      kwargs=kwargs)
+
+
+def draw_heat_prop_overview(G, seed_nodes, random_walk = True,
+                            max_communities=200,
+                            max_nodes=200,
+                            aggregate='mean',
+                            edge_cmap='autumn_r',
+                            k=None,
+                            node_cmap='autumn_r',
+                            node_size=10,
+                            physics_enabled=False,
+                            Wprime=None,
+                            heat_kernel=None,
+                            method='power',
+                            tol=None,
+                            diffusion_time=None,
+                            random_state=0,
+                            profile=False,
+                            **kwargs):
+    '''
+    Overview of the network propagation on a graph too large to draw: the
+    graph is coarsened into at most max_communities communities (see
+    visJS2jupyter.coarsen), drawn as nodes sized by their number of members
+    and colored by their aggregate heat. Clicking a community draws its
+    max_nodes hottest members and the edges between them in its place, and
+    double-clicking the background returns to the overview, so the browser
+    never holds more than max(max_communities, max_nodes) nodes at a time.
+    Communities holding seed nodes are drawn as triangles. Additional kwargs
+    are passed to visJS_module.
+
+    Inputs:
+        - G: a networkX graph, or an (adjacency, labels) pair (see
+          visJS2jupyter.loaders)
+        - seed_nodes: nodes on which to initialize the simulation (must be a dict if random_walk = False)
+        - random_walk: True to perform a random walk style heat propagation, False to perform a diffusion style one.
+        - max_communities: maximum number of communities drawn, default: 200
+        - max_nodes: maximum number of members drawn per community, default: 200
+        - aggregate: heat of a community, 'mean', 'sum' or 'max' of its
+          members' heats, default: 'mean'
+        - edge_cmap: matplotlib colormap (or colormap name) for edges, default: 'autumn_r'
+        - k: float, optimal distance between nodes for nx.spring_layout(), default: None
+        - node_cmap: matplotlib colormap (or colormap name) for nodes, default: 'autumn_r'
+        - node_size: size of nodes (of a single-member community), default: 10
+        - physics_enabled: enable physics simulation, default: False
+        - Wprime, heat_kernel, method, tol, diffusion_time: propagation
+          options, as in draw_heat_prop
+        - random_state: seed of the community detection, default: 0
+        - profile: also return a pipeline.RenderProfile with the time, memory
+          and size of each stage, default: False
+
+    Returns:
+        - VisJS html network plot (iframe) of the communities, or a
+          (plot, RenderProfile) tuple if profile is True.
+    '''
+
+    if profile:
+        draw_args = dict(locals(), profile=False)
+        draw_args.update(draw_args.pop('kwargs'))
+        return pipeline.profiled(draw_heat_prop_overview, **draw_args)
+
+    if aggregate not in ('mean', 'sum', 'max'):
+        print ("aggregate must be 'mean', 'sum' or 'max'")
+        return
+
+    # check for invalid nodes in seed_nodes
+    graph_nodes = _graph_nodes(G)
+    invalid_nodes = [node for node in seed_nodes if node not in graph_nodes]
+    for node in invalid_nodes:
+        print ('Node {} not in graph'.format(node))
+    if invalid_nodes:
+        return
+
+    if not random_walk:
+        if (type(seed_nodes) == list): # if the user supplies a list, convert to dict
+            seed_nodes = dict(zip(seed_nodes, [1]*len(seed_nodes)))
+        elif (type(seed_nodes) != dict):
+            print('seed_nodes must be a list or a dict')
+            return -1
+
+    # perform the network propagation (shared with draw_heat_prop), on a
+    # sparse matrix even for networkX graphs
+    heat_key = _heat_prop_key(G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                              None, None, diffusion_time)
+    node_heat = pipeline.run_stage('propagate', heat_key, _propagate_heat,
+                                   G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                                   None, None, diffusion_time, sparse=True)
+    if not adjacency.is_adjacency(G):
+        nx.set_node_attributes(G, name = 'node_heat', values = node_heat)
+
+    # group the nodes into communities
+    coarsen_key = ('coarsen', pipeline.graph_key(G), max_communities, random_state)
+    A, labels, membership = pipeline.run_stage('coarsen', coarsen_key, _coarsen_graph,
+                                               G, max_communities, random_state)
+    heat = np.fromiter((node_heat[n] for n in labels), dtype=np.float64, count=len(labels))
+
+    # the graph of communities, with the heat and size of each community
+    select_key = heat_key + coarsen_key + (aggregate,)
+    H, counts = pipeline.run_stage('select', select_key, _community_graph,
+                                   A, labels, membership, heat, aggregate)
+    nodes, edges = list(H.nodes()), list(H.edges())
+    if not edges:
+        print ('There are no edges between communities. Try increasing max_communities.')
+        return
+
+    if 'node_border_width' not in kwargs.keys():
+        kwargs['node_border_width'] = 2
+
+    layout_key = select_key + (k,)
+    pos = pipeline.run_stage('layout', layout_key, _spring_layout, H, nodes, k)
+    style_key = select_key + (pipeline.seeds_key(seed_nodes), kwargs['node_border_width'])
+    node_styles = pipeline.run_stage('style', style_key, _community_node_styles,
+                                     H, labels, membership, heat, counts, seed_nodes,
+                                     kwargs['node_border_width'])
+    color_key = select_key + (pipeline.cmap_key(node_cmap), pipeline.cmap_key(edge_cmap))
+    community_heat = nx.get_node_attributes(H, 'node_heat')
+    node_colors, edge_colors, edge_weights = pipeline.run_stage('color', color_key, _heat_colors,
+                                                                H, nodes, edges, community_heat,
+                                                                node_cmap, edge_cmap)
+
+    nodes_dict, edges_dict = pipeline.run_stage('serialize', None, _serialize,
+                                                H, nodes, edges, pos, node_styles,
+                                                node_colors, edge_colors, node_size)
+    for i, c in enumerate(nodes):
+        nodes_dict[i]['node_size'] = node_size*(1 + math.log(counts[c], 2))
+
+    # the drawing of each community's hottest members
+    members_key = layout_key + (max_nodes,)
+    members = pipeline.run_stage('layout', members_key, _community_member_layouts,
+                                 A, labels, membership, heat, nodes, max_nodes, k)
+    drilldown_key = members_key + style_key + color_key + (node_size,)
+    kwargs['drilldown'] = pipeline.run_stage('drilldown', drilldown_key, _community_drilldown,
+                                             members, node_heat, seed_nodes, node_cmap, edge_cmap,
+                                             kwargs['node_border_width'], node_size)
+
+    _set_render_defaults(kwargs, max(len(nodes), max_nodes), physics_enabled, (3, 5, 7))
+
+    return pipeline.run_stage('render', None, visJS_module.visjs_network, nodes_dict, edges_dict, **kwargs)
+
+
+def _heat_prop_key(G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                   prev_heat, prev_seed_nodes, diffusion_time):
+    '''
+    Cache key of the propagate stage of draw_heat_prop.
+    '''
+
+    heat_key = ('heat_prop', pipeline.graph_key(G), pipeline.seeds_key(seed_nodes), random_walk,
+                pipeline.operator_key(Wprime), pipeline.operator_key(heat_kernel))
+    if random_walk and (method != 'power' or tol is not None or prev_heat is not None):
+        heat_key += (method, tol, pipeline.heat_key(prev_heat), pipeline.seeds_key(prev_seed_nodes))
+    if not random_walk and diffusion_time is not None:
+        heat_key += (diffusion_time,)
+    return heat_key
+
+
+def _propagate_heat(G, seed_nodes, random_walk, Wprime, heat_kernel, method, tol,
+                    prev_heat, prev_seed_nodes, diffusion_time=None, sparse=None):
+    '''
+    propagate stage of draw_heat_prop: returns a dictionary mapping every node
+    of G to its heat. sparse is passed to normalized_adj_matrix when Wprime
+    is not given.
+    '''
+
+    if random_walk: # perform random walk style heat propagation
+        if Wprime is None and method == 'power':
+            Wprime = normalized_adj_matrix(G, sparse=sparse)
+        return network_propagation(G, Wprime, seed_nodes, method=method, tol=tol,
+                                   prev_heat=prev_heat, prev_seed_nodes=prev_seed_nodes).to_dict()
+
+    # perform diffusion style heat propagation
+    if heat_kernel is None:
+        import visJS2jupyter.scipy_heatKernel as scipy_heatKernel
+        if diffusion_time is None:
+            heat_kernel = scipy_heatKernel.SciPYKernel(G) # need a graph
+        else:
+            heat_kernel = scipy_heatKernel.SciPYKernel(G, diffusion_time=diffusion_time)
+    return dict(heat_kernel.diffuse(seed_nodes, diffusion_time=diffusion_time)) # need seed_to_heat mapping
+
+
+def _coarsen_graph(G, max_communities, random_state):
+    '''
+    coarsen stage of draw_heat_prop_overview: the adjacency matrix and node
+    labels of G, and the community of each node.
+    '''
+
+    import visJS2jupyter.coarsen as coarsen
+
+    A, labels = adjacency.as_adjacency(G)
+    A = coarsen._symmetric_adjacency(A)
+    return A, labels, coarsen.coarsen(A, max_communities=max_communities, random_state=random_state)
+
+
+def _community_graph(A, labels, membership, heat, aggregate):
+    '''
+    select stage of draw_heat_prop_overview: networkX graph of the
+    communities, whose edges carry the number (or weight) of edges between
+    them and whose nodes carry their aggregate heat, and the number of
+    members of each community.
+    '''
+
+    import scipy.sparse
+    import visJS2jupyter.coarsen as coarsen
+
+    counts = np.bincount(membership)
+    if aggregate == 'max':
+        community_heat = np.full(len(counts), -np.inf)
+        np.maximum.at(community_heat, membership, heat)
+    else:
+        community_heat = np.bincount(membership, weights=heat)
+        if aggregate == 'mean':
+            community_heat /= counts
+
+    Q = scipy.sparse.triu(coarsen.quotient_adjacency(A, membership)).tocoo()
+    H = nx.Graph()
+    H.add_nodes_from(range(len(counts)))
+    H.add_weighted_edges_from(zip(Q.row.tolist(), Q.col.tolist(), Q.data.tolist()))
+    nx.set_node_attributes(H, name = 'node_heat', values = dict(enumerate(community_heat.tolist())))
+    return H, counts
+
+
+def _community_members(membership):
+    '''
+    Node indices of each community, as a list of numpy arrays.
+    '''
+
+    order = np.argsort(membership, kind='stable')
+    return np.split(order, np.cumsum(np.bincount(membership))[:-1])
+
+
+def _community_node_styles(H, labels, membership, heat, counts, seed_nodes, border_width):
+    '''
+    style stage of draw_heat_prop_overview: communities are labeled by their
+    hottest member and size, with their three hottest members and heat in the
+    title, and drawn as triangles if they hold seed nodes.
+    '''
+
+    seed_nodes = set(seed_nodes)
+    members = _community_members(membership)
+
+    border_widths, shapes, node_labels, titles = [], [], [], []
+    for c in H.nodes():
+        hottest = members[c][np.argsort(-heat[members[c]], kind='stable')[:3]]
+        seeded = any(labels[i] in seed_nodes for i in members[c])
+
+        border_widths.append(border_width if seeded else 0)
+        shapes.append('triangle' if seeded else 'dot')
+        node_labels.append('{} ({})'.format(labels[hottest[0]], counts[c]))
+        titles.append('{} nodes<br/>hottest: {}<br/>heat = {}'.format(
+            counts[c], ', '.join(str(labels[i]) for i in hottest), round(H.nodes[c]['node_heat'], 5)))
+
+    return {'border_width': border_widths, 'node_shape': shapes, 'node_label': node_labels, 'title': titles}
+
+
+def _community_member_layouts(A, labels, membership, heat, communities, max_nodes, k):
+    '''
+    layout stage of the drill-down networks of draw_heat_prop_overview: for
+    each community (by position in communities), the networkX graph of its
+    max_nodes hottest members, its nodes and edges, and their positions.
+    Communities of one member, or whose drawn members share no edges, are
+    left out.
+    '''
+
+    members = _community_members(membership)
+    layouts = {}
+    for position, c in enumerate(communities):
+        if len(members[c]) < 2:
+            continue
+        index = np.sort(members[c][np.argsort(-heat[members[c]], kind='stable')[:max_nodes]])
+        G = adjacency.subgraph_from_indices(A, labels, index, weight=None)
+        nodes, edges = list(G.nodes()), list(G.edges())
+        if edges:
+            layouts[position] = (G, nodes, edges, _spring_layout(G, nodes, k))
+    return layouts
+
+
+def _community_drilldown(layouts, node_heat, seed_nodes, node_cmap, edge_cmap, border_width, node_size):
+    '''
+    drilldown stage of draw_heat_prop_overview: the nodes_dict and edges_dict
+    of each community's drill-down network, keyed by its position in the
+    overview.
+    '''
+
+    drilldown = {}
+    for position, (G, nodes, edges, pos) in layouts.items():
+        G = G.copy() # the cached layout's graph is not annotated
+        nx.set_node_attributes(G, name = 'node_heat', values = dict((n, node_heat[n]) for n in nodes))
+        node_styles = _heat_node_styles(nodes, node_heat, [(seed_nodes, 'triangle')], None,
+                                        border_width, 5)
+        node_colors, edge_colors, edge_weights = _heat_colors(G, nodes, edges, node_heat,
+                                                              node_cmap, edge_cmap)
+        nodes_dict, edges_dict = _serialize(G, nodes, edges, pos, node_styles,
+                                            node_colors, edge_colors, node_size)
+        drilldown[position] = {'nodes': nodes_dict, 'edges': edges_dict}
+    return drilldown
+
+
+def _colocalization_heat(G, seed_nodes_1, seed_nodes_2, Wprime):
+    '''
+    propagate stage of draw_colocalization: returns a dictionary mapping every
+    node of G to the product of its heats from the two seed sets.
+    '''
+
     if Wprime is None:
         Wprime = normalized_adj_matrix(G)
     prop_graph_1 = network_propagation(G, Wprime, seed_nodes_1).to_dict()
     prop_graph_2 = network_propagation(G, Wprime, seed_nodes_2).to_dict()
-    prop_graph = {node:(prop_graph_1[node]*prop_graph_2[node]) for node in prop_graph_1}
-    nx.set_node_attributes(G, name = 'node_heat', values = prop_graph)
+    return {node:(prop_graph_1[node]*prop_graph_2[node]) for node in prop_graph_1}
+
+
+def _draw_heat(G, node_heat, heat_key, seed_shapes,
+               title_precision,
+               size_multipliers,
+               max_edges,
+               backbone,
+               backbone_weight,
+               cull_labels,
+               label_priority,
+               edge_cmap,
+               export_file,
+               export_network,
+               highlight_nodes,
+               k,
+               largest_connected_component,
+               node_cmap,
+               node_size,
+               num_nodes,
+               physics_enabled,
+               kwargs):
+    '''
+    Stages shared by draw_heat_prop and draw_colocalization once the heat of
+    each node is known: select, layout, style, color, serialize and render.
+    seed_shapes is a list of (seed nodes, node shape) pairs, in order of precedence.
+    '''
 
     # find top num_nodes hottest nodes and connected component if requested
-    G = set_num_nodes(G,num_nodes)
-    if largest_connected_component:
-        G = max(nx.connected_component_subgraphs(G), key=len)
-    nodes = list(G.nodes())
-    edges = list(G.edges())
+    select_key = heat_key + (num_nodes, largest_connected_component)
+    nodes, edges = pipeline.run_stage('select', select_key, _select_hottest,
+                                      G, node_heat, num_nodes, largest_connected_component)
+
+    # reduce the edges to a backbone of at most max_edges
+    if max_edges is not None and len(edges) > max_edges:
+        num_edges = len(edges)
+        select_key += (max_edges, backbone, backbone_weight)
+        edges = pipeline.run_stage('backbone', select_key, _edge_backbone,
+                                   G, nodes, edges, node_heat, max_edges, backbone, backbone_weight)
+        print ('Edge backbone: kept {} of {} edges ({} dropped)'.format(len(edges), num_edges,
+                                                                       num_edges - len(edges)))
+    G = _drawn_subgraph(G, nodes, edges, node_heat)
 
     # check for empty nodes and edges after getting subgraph of G
     if not nodes:
@@ -532,115 +785,354 @@ def draw_colocalization(G, seed_nodes_1, seed_nodes_2,
         print ('There are no edges in the graph. Try increasing num_nodes.')
         return
 
-    # set position of each node
+    # set the position of each node
+    layout_key = select_key + (k,)
+    pos = pipeline.run_stage('layout', layout_key, _spring_layout, G, nodes, k)
+
+    # set the border width, shape, label and title of each node
+    if 'node_border_width' not in kwargs.keys():
+        kwargs['node_border_width'] = 2
+
+    style_key = select_key + (_nodes_key(highlight_nodes), kwargs['node_border_width'], title_precision)
+    node_styles = pipeline.run_stage('style', style_key, _heat_node_styles,
+                                     nodes, node_heat, seed_shapes, highlight_nodes,
+                                     kwargs['node_border_width'], title_precision)
+
+    # hide the labels that would overlap more important ones
+    if cull_labels:
+        font_size = kwargs.get('node_font_size', 14)
+        if label_priority == 'heat':
+            priority = [node_heat[n] for n in nodes]
+        else:
+            priority = [G.degree(n) for n in nodes]
+        node_styles = pipeline.run_stage('labels', style_key + (k, label_priority, font_size),
+                                         _cull_node_labels, nodes, pos, node_styles, priority,
+                                         font_size)
+
+    # set color of each node, and of each edge based off hottest connecting node's value
+    color_key = select_key + (pipeline.cmap_key(node_cmap), pipeline.cmap_key(edge_cmap))
+    node_colors, edge_colors, edge_weights = pipeline.run_stage('color', color_key, _heat_colors,
+                                                                G, nodes, edges, node_heat,
+                                                                node_cmap, edge_cmap)
+
+    _annotate_graph(G, nodes, pos, node_styles)
+    nx.set_edge_attributes(G, name = 'edge_weight', values = dict(zip(edges, edge_weights)))
+
+    # create the nodes_dict and edges_dict with all relevant fields
+    nodes_dict, edges_dict = pipeline.run_stage('serialize', None, _serialize,
+                                                G, nodes, edges, pos, node_styles,
+                                                node_colors, edge_colors, node_size)
+
+    _set_render_defaults(kwargs, len(nodes), physics_enabled, size_multipliers)
+
+    # export the network to JSON for Cytoscape
+    if export_network:
+        pipeline.run_stage('export', None, _export_network, G, 'node_heat', True, export_file)
+
+    return pipeline.run_stage('render', None, visJS_module.visjs_network, nodes_dict, edges_dict, **kwargs)
+
+
+def _nodes_key(nodes):
+    '''
+    Order independent key for an optional collection of nodes.
+    '''
+
+    if nodes is None:
+        return None
+    return frozenset(nodes)
+
+
+def _graph_nodes(G):
+    '''
+    Container of the nodes of a networkX graph or (adjacency, labels) pair,
+    for membership tests.
+    '''
+
+    if adjacency.is_adjacency(G):
+        return set(G[1])
+    return G
+
+
+def _graph_elements(G):
+    '''
+    select stage of draw_graph_overlap: all nodes and edges of G.
+    '''
+
+    return list(G.nodes()), list(G.edges())
+
+
+def _select_hottest(G, node_heat, num_nodes, largest_connected_component):
+    '''
+    select stage of the heat draw functions: the nodes and edges of the
+    subgraph of the num_nodes hottest nodes (see set_num_nodes), optionally
+    restricted to its largest connected component.
+    '''
+
+    if adjacency.is_adjacency(G):
+        H = _hottest_adjacency_subgraph(G[0], G[1], node_heat, num_nodes)
+    else:
+        nodes = list(G.nodes())
+        if num_nodes != None and num_nodes < len(nodes):
+            nodes = sorted(nodes, key=lambda n: node_heat[n], reverse=True)[:num_nodes]
+        H = G.subgraph(nodes)
+    if largest_connected_component and len(H) > 0:
+        H = H.subgraph(max(nx.connected_components(H), key=len))
+    return list(H.nodes()), list(H.edges())
+
+
+def _hottest_adjacency_subgraph(A, labels, node_heat, num_nodes):
+    '''
+    networkX graph induced by the num_nodes hottest nodes of an (adjacency,
+    labels) network, with nodes in label order.
+    '''
+
+    index = np.arange(len(labels))
+    if num_nodes != None and num_nodes < len(labels):
+        heat = np.fromiter((node_heat[n] for n in labels), dtype=np.float64, count=len(labels))
+        index = np.sort(np.argsort(-heat, kind='stable')[:num_nodes])
+    return adjacency.subgraph_from_indices(A, labels, index, weight=None).to_undirected()
+
+
+def _edge_backbone(G, nodes, edges, node_heat, max_edges, method, weight):
+    '''
+    backbone stage of the heat draw functions: the max_edges edges of the
+    selected subgraph kept by visJS2jupyter.backbone.edge_backbone.
+    '''
+
+    import visJS2jupyter.backbone as backbone
+
+    node_map = dict(zip(nodes, range(len(nodes))))
+    rows = np.array([node_map[e[0]] for e in edges], dtype=np.int64)
+    cols = np.array([node_map[e[1]] for e in edges], dtype=np.int64)
+    if weight == 'heat':
+        heat = np.array([node_heat[n] for n in nodes], dtype=np.float64)
+        weights = heat[rows]*heat[cols]
+    elif adjacency.is_adjacency(G):
+        label_to_index = dict(zip(G[1], range(len(G[1]))))
+        index = np.array([label_to_index[n] for n in nodes], dtype=np.int64)
+        weights = np.asarray(G[0].tocsr()[index[rows], index[cols]]).reshape(-1)
+    else:
+        weights = np.array([G.edges[e].get(weight, 1) for e in edges], dtype=np.float64)
+
+    keep = backbone.edge_backbone(rows, cols, np.abs(weights), len(nodes), max_edges, method)
+    return [e for e, kept in zip(edges, keep) if kept]
+
+
+def _drawn_subgraph(G, nodes, edges, node_heat):
+    '''
+    networkX graph of the selected nodes and edges. For an (adjacency, labels)
+    pair this is the only networkX graph built, and carries the node_heat
+    attribute.
+    '''
+
+    if not adjacency.is_adjacency(G):
+        H = G.subgraph(nodes)
+        if H.number_of_edges() > len(edges): # edges were reduced to a backbone
+            kept = set(edges)
+            H = nx.restricted_view(H, [], [e for e in H.edges() if e not in kept and e[::-1] not in kept])
+        return H
+
+    H = nx.Graph()
+    H.add_nodes_from(nodes)
+    H.add_edges_from(edges)
+    nx.set_node_attributes(H, name = 'node_heat', values = dict((n, node_heat[n]) for n in nodes))
+    return H
+
+
+def _spring_layout(G, nodes, k):
+    '''
+    layout stage: spring layout positions of nodes, as a list of (x, y).
+    '''
+
     if k is None:
         pos = nx.spring_layout(G)
     else:
         pos = nx.spring_layout(G,k=k)
+    return [(np.float64(pos[n][0]).item(), np.float64(pos[n][1]).item()) for n in nodes]
 
-    xpos,ypos=zip(*pos.values())
-    nx.set_node_attributes(G, name = 'xpos', values = dict(zip(pos.keys(),[x*1000 for x in xpos])))
-    nx.set_node_attributes(G, name = 'ypos', values = dict(zip(pos.keys(),[y*1000 for y in ypos])))
 
-    # set the border width of nodes
-    if 'node_border_width' not in kwargs.keys():
-        kwargs['node_border_width'] = 2
+def _heat_node_styles(nodes, node_heat, seed_shapes, highlight_nodes, border_width, title_precision):
+    '''
+    style stage of the heat draw functions: border width, shape, label and
+    title of each node, as lists aligned with nodes.
+    '''
+
+    seed_shapes = [(set(seeds), shape) for seeds, shape in seed_shapes]
+    highlight_nodes = set(highlight_nodes) if highlight_nodes else None
 
-    border_width = {}
+    border_widths, shapes, labels, titles = [], [], [], []
     for n in nodes:
-        if n in seed_nodes_1 or n in seed_nodes_2:
-            border_width[n] = kwargs['node_border_width']
-        elif highlight_nodes is not None and n in highlight_nodes:
-            border_width[n] = kwargs['node_border_width']
+        shape = next((s for seeds, s in seed_shapes if n in seeds), None)
+        highlighted = shape is not None or (highlight_nodes is not None and n in highlight_nodes)
+
+        border_widths.append(border_width if highlighted else 0)
+        shapes.append(shape if shape is not None else 'dot')
+        if highlight_nodes and not highlighted:
+            labels.append('')
         else:
-            border_width[n] = 0
+            labels.append(str(n))
+        titles.append(str(n) + '<br/>heat = ' + str(round(node_heat[n], title_precision)))
+
+    return {'border_width': border_widths, 'node_shape': shapes, 'node_label': labels, 'title': titles}
+
 
-    nx.set_node_attributes(G, name = 'nodeOutline', values = border_width)
+def _cull_node_labels(nodes, pos, node_styles, priority, font_size):
+    '''
+    labels stage of the draw functions: node_styles with the labels that
+    overlap a more important label replaced by None, which _serialize leaves
+    out of the nodes sent to vis.js. Nodes drawn with a border (seed and
+    highlighted nodes) come first, then nodes of higher priority.
+    '''
 
-    # set the shape of each node
-    nodes_shape=[]
-    for node in G.nodes():
-        if node in seed_nodes_1:
-            nodes_shape.append('triangle')
-        elif node in seed_nodes_2:
-            nodes_shape.append('square')
+    import visJS2jupyter.label_culling as label_culling
+
+    priority = [np.inf if width else p for p, width in zip(priority, node_styles['border_width'])]
+    positions = [(p[0]*1000, p[1]*1000) for p in pos] # as in _serialize
+    node_labels = label_culling.cull_labels(positions, node_styles['node_label'], priority,
+                                            font_size=font_size)
+    node_labels = [None if label != culled else culled
+                   for label, culled in zip(node_styles['node_label'], node_labels)]
+    return dict(node_styles, node_label=node_labels)
+
+
+def _overlap_node_styles(G, nodes, highlight_nodes, border_width):
+    '''
+    style stage of draw_graph_overlap: border width, shape, label and title of
+    each node, as lists aligned with nodes.
+    '''
+
+    overlap_shapes = {0: 'dot', 1: 'triangle', 2: 'square'}
+    highlight_nodes = set(highlight_nodes) if highlight_nodes else None
+    node_data = dict(G.nodes(data=True))
+
+    border_widths, shapes, labels, titles = [], [], [], []
+    for n in nodes:
+        highlighted = highlight_nodes is not None and n in highlight_nodes
+        border_widths.append(border_width if highlighted else 0)
+        shapes.append(overlap_shapes[node_data[n]['node_overlap']])
+        if highlight_nodes and not highlighted:
+            labels.append('')
         else:
-            nodes_shape.append('dot')
-    node_to_shape=dict(zip(G.nodes(),nodes_shape))
-    nx.set_node_attributes(G, name = 'nodeShape', values = node_to_shape)
-
-    # add a field for node labels
-    if highlight_nodes:
-        node_labels = {}
-        for node in nodes:
-            if node in seed_nodes_1 or n in seed_nodes_2:
-                node_labels[node] = str(node)
-            elif node in highlight_nodes:
-                node_labels[node] = str(node)
-            else:
-                node_labels[node] = ''
-    else:
-        node_labels = {n:str(n) for n in nodes}
+            labels.append(str(n))
+        titles.append(node_data[n]['node_name_membership'] + '<br/>' + str(n))
+
+    return {'border_width': border_widths, 'node_shape': shapes, 'node_label': labels, 'title': titles}
+
+
+def _align_edge_colors(edges, edge_to_color):
+    '''
+    List of edge colors aligned with edges, for undirected graphs whose edge
+    tuples may come out in either orientation.
+    '''
+
+    return [edge_to_color[e] if e in edge_to_color else edge_to_color[(e[1], e[0])] for e in edges]
 
-    nx.set_node_attributes(G, name = 'nodeLabel', values = node_labels)
 
-    # set the title of each node
-    node_titles = [str(node[0]) + '<br/>heat = ' + str(round(node[1]['node_heat'],10))
-                   for node in G.nodes(data=True)]
-    node_titles = dict(zip(nodes,node_titles))
-    nx.set_node_attributes(G, name = 'nodeTitle', values = node_titles)
+def _heat_colors(G, nodes, edges, node_heat, node_cmap, edge_cmap):
+    '''
+    color stage of the heat draw functions: node colors, edge colors and edge
+    weights (heat of the hottest endpoint), as lists aligned with nodes and edges.
+    '''
 
-    # set the color of each node
+    # color on a log scale, unless nodes far from the seeds got no heat
+    # (e.g. from push propagation or a truncated kernel): the edge log scale
+    # needs every edge to be hot, the node one needs some node to be
+    node_transform = 'log' if any(node_heat[n] > 0 for n in nodes) else None
     node_to_color = visJS_module.return_node_to_color(G,
                                                       field_to_map='node_heat',
                                                       cmap=node_cmap,
-                                                      color_vals_transform='log')
+                                                      color_vals_transform=node_transform)
 
-    # set heat value of edge based off hottest connecting node's value
-    node_attr = nx.get_node_attributes(G,'node_heat')
-    edge_weights = {}
-    for e in edges:
-        if node_attr[e[0]] > node_attr[e[1]]:
-            edge_weights[e] = node_attr[e[0]]
-        else:
-            edge_weights[e] = node_attr[e[1]]
+    edge_weights = [max(node_heat[e[0]], node_heat[e[1]]) for e in edges]
+    nx.set_edge_attributes(G, name = 'edge_weight', values = dict(zip(edges, edge_weights)))
+    edge_to_color = visJS_module.return_edge_to_color(G,
+                                                      field_to_map='edge_weight',
+                                                      cmap=edge_cmap,
+                                                      color_vals_transform='log' if min(edge_weights) > 0 else None)
+
+    return [node_to_color[n] for n in nodes], _align_edge_colors(edges, edge_to_color), edge_weights
 
-    nx.set_edge_attributes(G, name = 'edge_weight', values = edge_weights)
 
-    # set the color of each edge
+def _overlap_colors(G, nodes, edges, node_cmap, edge_cmap):
+    '''
+    color stage of draw_graph_overlap: node and edge colors, as lists aligned
+    with nodes and edges.
+    '''
+
+    node_to_color = visJS_module.return_node_to_color(G,
+                                                      field_to_map='node_overlap',
+                                                      cmap=node_cmap,
+                                                      color_max_frac=.9,
+                                                      color_min_frac=.1)
+
     edge_to_color = visJS_module.return_edge_to_color(G,
-                                                      field_to_map = 'edge_weight',
+                                                      field_to_map='edge_weight',
                                                       cmap=edge_cmap,
-                                                      color_vals_transform = 'log')
+                                                      alpha=.3)
+
+    return [node_to_color[n] for n in nodes], _align_edge_colors(edges, edge_to_color)
+
+
+def _annotate_graph(G, nodes, pos, node_styles):
+    '''
+    Store positions and styles as node attributes of G (used when exporting
+    to Cytoscape). Not cached, so the attributes always match this render.
+    '''
+
+    nx.set_node_attributes(G, name = 'xpos', values = dict(zip(nodes, [p[0]*1000 for p in pos])))
+    nx.set_node_attributes(G, name = 'ypos', values = dict(zip(nodes, [p[1]*1000 for p in pos])))
+    nx.set_node_attributes(G, name = 'nodeOutline', values = dict(zip(nodes, node_styles['border_width'])))
+    nx.set_node_attributes(G, name = 'nodeShape', values = dict(zip(nodes, node_styles['node_shape'])))
+    nx.set_node_attributes(G, name = 'nodeLabel', values = dict((n, label or '') for n, label in zip(nodes, node_styles['node_label'])))
+    nx.set_node_attributes(G, name = 'nodeTitle', values = dict(zip(nodes, node_styles['title'])))
+
+
+def _serialize(G, nodes, edges, pos, node_styles, node_colors, edge_colors, node_size):
+    '''
+    serialize stage: the nodes_dict and edges_dict passed to visjs_network.
+    '''
 
-    # create the nodes_dict with all relevant fields
     nodes_dict = [{'id':str(n),
-                   'border_width':border_width[n],
+                   'border_width':node_styles['border_width'][i],
                    'degree':G.degree(n),
-                   'color':node_to_color[n],
-                   'node_label':node_labels[n],
+                   'color':node_colors[i],
+                   'node_label':node_styles['node_label'][i],
                    'node_size':node_size,
-                   'node_shape':node_to_shape[n],
-                   'title':node_titles[n],
-                   'x':np.float64(pos[n][0]).item()*1000,
-                   'y':np.float64(pos[n][1]).item()*1000} for n in nodes]
+                   'node_shape':node_styles['node_shape'][i],
+                   'title':node_styles['title'][i],
+                   'x':pos[i][0]*1000,
+                   'y':pos[i][1]*1000} for i, n in enumerate(nodes)]
+
+    # culled labels (see _cull_node_labels) are not sent at all
+    for node, label in zip(nodes_dict, node_styles['node_label']):
+        if label is None:
+            del node['node_label']
 
     # map nodes to indices for source/target in edges
-    node_map = dict(zip(nodes, range(len(nodes))))
+    node_map = dict(zip(nodes,range(len(nodes))))
 
-    # create the edges_dict with all relevant fields
     edges_dict = [{'source':node_map[edges[i][0]],
                    'target':node_map[edges[i][1]],
-                   'color':edge_to_color[edges[i]]} for i in range(len(edges))]
+                   'color':edge_colors[i]} for i in range(len(edges))]
+
+    return nodes_dict, edges_dict
+
+
+def _set_render_defaults(kwargs, num_nodes, physics_enabled, size_multipliers):
+    '''
+    Fill in the visjs_network arguments the draw functions default differently.
+    size_multipliers are the node_size_multiplier for graphs of more than 500,
+    more than 200, and at most 200 nodes.
+    '''
 
     # set node_size_multiplier to increase node size as graph gets smaller
     if 'node_size_multiplier' not in kwargs.keys():
-        if len(nodes) > 500:
-            kwargs['node_size_multiplier'] = 1
-        elif len(nodes) > 200:
-            kwargs['node_size_multiplier'] = 3
+        if num_nodes > 500:
+            kwargs['node_size_multiplier'] = size_multipliers[0]
+        elif num_nodes > 200:
+            kwargs['node_size_multiplier'] = size_multipliers[1]
         else:
-            kwargs['node_size_multiplier'] = 5
+            kwargs['node_size_multiplier'] = size_multipliers[2]
 
     kwargs['physics_enabled'] = physics_enabled
 
@@ -656,31 +1148,45 @@ def draw_colocalization(G, seed_nodes_1, seed_nodes_2,
     if 'node_label_field' not in kwargs.keys():
         kwargs['node_label_field'] = 'node_label'
 
-    # export the network to JSON for Cytoscape
-    if export_network:
-        node_colors = map_node_to_color(G,'node_heat',True)
-        nx.set_node_attributes(G, name = 'nodeColor', values = node_colors)
-        edge_colors = map_edge_to_color(G,'edge_weight',True)
-        nx.set_edge_attributes(G, name = 'edgeColor', values = edge_colors)
-        visJS_module.export_to_cytoscape(G = G,export_file = export_file)
 
-    return visJS_module.visjs_network(nodes_dict,edges_dict,**kwargs)
+def _export_network(G, node_field, color_vals_transform, export_file):
+    '''
+    export stage: write G, with node and edge colors, to JSON for Cytoscape.
+    '''
+
+    node_colors = map_node_to_color(G,node_field,color_vals_transform)
+    nx.set_node_attributes(G, name = 'nodeColor', values = node_colors)
+    edge_colors = map_edge_to_color(G,'edge_weight',color_vals_transform)
+    nx.set_edge_attributes(G, name = 'edgeColor', values = edge_colors)
+    visJS_module.export_to_cytoscape(G = G, export_file = export_file)
 
 
-def normalized_adj_matrix(G,conserve_heat=True,weighted=False):
+def normalized_adj_matrix(G,conserve_heat=True,weighted=False,sparse=None,dtype=np.float64):
     '''
     This function returns normalized adjacency matrix.
 
     Inputs:
-        - G: NetworkX graph from which to calculate normalized adjacency matrix
+        - G: NetworkX graph, or (adjacency, labels) pair as returned by
+          visJS2jupyter.loaders, from which to calculate normalized adjacency matrix
         - conserve_heat:
             - True: Heat will be conserved (sum of heat vector = 1).  Graph asymmetric
             - False:  Heat will not be conserved.  Graph symmetric.
+        - weighted: use the 'weight' edge attribute (the adjacency values for
+          an (adjacency, labels) pair), default: False
+        - sparse: return a scipy.sparse CSR matrix instead of a dense numpy
+          array, default: True for an (adjacency, labels) pair, False for a graph
+        - dtype: numpy floating point type of the matrix. np.float32 halves
+          its memory and speeds up propagation, default: np.float64
 
     Returns:
-        - numpy array of the normalized adjacency matrix.
+        - numpy array (or scipy.sparse CSR matrix) of the normalized adjacency matrix.
     '''
 
+    if sparse is None:
+        sparse = adjacency.is_adjacency(G)
+    if sparse:
+        return _sparse_normalized_adj_matrix(G,conserve_heat,weighted,dtype)
+
     wvec=[]
     for e in G.edges(data=True):
         v1 = e[0]
@@ -708,48 +1214,208 @@ def normalized_adj_matrix(G,conserve_heat=True,weighted=False):
 
     G_weighted.add_weighted_edges_from(wvec)
 
-    Wprime = nx.to_numpy_matrix(G_weighted,nodelist=list(G.nodes()))
+    Wprime = nx.to_numpy_matrix(G_weighted,nodelist=list(G.nodes()),dtype=dtype)
     Wprime = np.array(Wprime)
 
     return Wprime
 
 
-def network_propagation(G,Wprime,seed_nodes,alpha=.5, num_its=20):
+def _sparse_normalized_adj_matrix(G,conserve_heat,weighted,dtype=np.float64):
+    '''
+    normalized_adj_matrix as a scipy.sparse CSR matrix, computed without
+    building a dense (or networkX) intermediate. Rows and columns are in the
+    order of G.nodes(), or of the labels of an (adjacency, labels) pair.
+    '''
+
+    import scipy.sparse
+
+    A, labels = adjacency.as_adjacency(G, weight='weight' if weighted else None)
+    A = A.tocsr(copy=True)
+    A.eliminate_zeros()
+    if not weighted:
+        A.data[:] = 1
+
+    # degrees count neighbors (in plus out for directed networks), as G.degree does
+    degree = A.getnnz(axis=1)
+    if (A != A.T).nnz:
+        degree = degree + A.getnnz(axis=0)
+        A = A.maximum(A.T)
+    degree = degree.astype(np.float64)
+
+    A = A.tocoo()
+    if conserve_heat:
+        data = A.data/degree[A.col]
+    else:
+        data = A.data/np.sqrt(degree[A.row]*degree[A.col])
+    Wprime = scipy.sparse.csr_matrix((data.astype(dtype),(A.row,A.col)),shape=A.shape)
+
+    return Wprime
+
+
+def network_propagation(G,Wprime,seed_nodes,alpha=.5, num_its=20, method='power', tol=None,
+                        prev_heat=None, prev_seed_nodes=None, dtype=None, n_workers=None):
     '''
     This function implements network propagation, as detailed in:
     Vanunu, Oron, et al. 'Associating genes and protein complexes with disease
     via network propagation.'
 
+    Propagation is linear in the seed heats, so when the seed set changes a
+    little the previous result can be reused: with prev_heat and
+    prev_seed_nodes only the response to the change in seeds is propagated,
+    and with prev_heat alone the iteration starts from prev_heat instead of
+    from the seeds. Either way it stops as soon as it has converged to tol.
+
     Inputs:
-        - G: NetworkX graph on which to run simulation
-        - Wprime:  Normalized adjacency matrix (from normalized_adj_matrix)
+        - G: NetworkX graph (or (adjacency, labels) pair) on which to run
+          simulation. May be None if Wprime holds its node labels, as an
+          operators.MemmapCSROperator saved with labels does
+        - Wprime:  Normalized adjacency matrix (from normalized_adj_matrix),
+          dense, scipy.sparse, operators.NormalizedAdjacencyOperator or
+          operators.MemmapCSROperator (out of core, for method = 'power'). May
+          be None for method = 'push', in which
+          case a sparse one is computed from G
         - seed_nodes:  Genes on which to initialize the simulation.
         - alpha:  Heat dissipation coefficient.  Default = 0.5
         - num_its:  Number of iterations (Default = 20.  Convergence usually happens within 10)
+        - method: 'power' to iterate over the whole graph num_its times, or
+          'push' for local push propagation (see visJS2jupyter.propagation),
+          whose cost depends on the neighborhood of the seeds rather than the
+          size of the graph. The returned Series still lists every node, an
+          O(n) numpy fill per query; for queries whose cost is bounded by the
+          neighborhood alone, call propagation.push_propagation with a
+          dictionary of seed heats.  Default = 'power'
+        - tol: for method = 'push', the residual per unit of degree at which
+          heat stops being pushed out of a node (default 1e-6). For method =
+          'power', stop iterating once an iteration changes the total heat by
+          less than tol (default: always run num_its iterations, or 1e-6 when
+          prev_heat is given).  Default = None
+        - prev_heat: heat vector returned by a previous call on the same graph
+          and Wprime (a pandas Series, or a dictionary mapping nodes to heat).  Default = None
+        - prev_seed_nodes: seed nodes that prev_heat was computed from.  Default = None
+        - dtype: numpy floating point type of the heat vectors (np.float32 or
+          np.float64).  Default = None (that of Wprime)
+        - n_workers: for method = 'power' and a scipy.sparse Wprime, number
+          of threads that multiply blocks of rows of Wprime in parallel (see
+          operators.ThreadedCSROperator).  Default = None (a single thread)
 
     Returns:
         - Fnew: heat vector after propagation
     '''
 
-    nodes = list(G.nodes())
-    numnodes = len(nodes)
-    edges= list(G.edges())
-    numedges = len(edges)
+    if method not in ('power', 'push'):
+        print('method must be \'power\' or \'push\'')
+        return
+    if prev_seed_nodes is not None and prev_heat is None:
+        print('Please specify prev_heat along with prev_seed_nodes when calling network_propagation')
+        return
+
+    if G is None and getattr(Wprime, 'labels', None) is not None:
+        nodes, node_to_index = _node_index(Wprime, Wprime.labels)
+    elif adjacency.is_adjacency(G):
+        nodes, node_to_index = _node_index(G[0], G[1])
+    else:
+        nodes = adjacency.node_labels(G)
+        node_to_index = dict(zip(nodes,range(len(nodes))))
+
+    if dtype is None:
+        dtype = getattr(Wprime, 'dtype', np.float64)
+
+    Y = _seed_heats(node_to_index, seed_nodes)
+    if prev_heat is not None:
+        prev_heat = _heat_vector(prev_heat, nodes).astype(dtype)
+    if prev_seed_nodes is not None:
+        # only propagate the change in seed heats, and add it to the previous result
+        for i, h in _seed_heats(node_to_index, prev_seed_nodes).items():
+            Y[i] = Y.get(i, 0) - h
+
+    if method == 'push':
+        import visJS2jupyter.propagation as propagation
+        if Wprime is None:
+            Wprime = normalized_adj_matrix(G,sparse=True,dtype=dtype)
+        if prev_heat is not None and prev_seed_nodes is None:
+            # warm start: push only what prev_heat is missing for the new seeds
+            Y = (alpha*Wprime.dot(prev_heat) + np.multiply(1-alpha,_dense_heats(Y,len(nodes))) - prev_heat)/(1-alpha)
+        heat = propagation.push_propagation(Wprime,Y,alpha=alpha,tol=1e-6 if tol is None else tol)[0]
+        Fnew = _dense_heats(heat,len(nodes)).astype(dtype) if isinstance(heat,dict) else heat.astype(dtype)
+        if prev_heat is not None:
+            Fnew = prev_heat + Fnew
+    else:
+        Y = _dense_heats(Y,len(nodes)).astype(dtype)
+        if n_workers is not None and n_workers > 1:
+            import scipy.sparse
+            if scipy.sparse.issparse(Wprime):
+                import visJS2jupyter.operators as operators
+                Wprime = operators.ThreadedCSROperator(Wprime, n_workers=n_workers)
+        if tol is None and prev_heat is not None:
+            tol = 1e-6
+        Fold = Y.copy() if (prev_heat is None or prev_seed_nodes is not None) else prev_heat
+        for t in range(num_its):
+            Fnew = alpha*Wprime.dot(Fold) + np.multiply(1-alpha,Y)
+            converged = tol is not None and np.abs(Fnew-Fold).sum() < tol
+            Fold=Fnew
+            if converged:
+                break
+        if prev_seed_nodes is not None:
+            Fnew = prev_heat + Fnew
+
+    import pandas as pd
+    return pd.Series(Fnew,index=nodes)
+
+
+def _seed_heats(node_to_index, seed_nodes):
+    '''
+    Initial heats of network_propagation, as a dictionary mapping node
+    indices to 1/len(seed_nodes) per occurrence of each seed node.
+    '''
 
-    Fold = np.zeros(numnodes)
-    Fold = pd.Series(Fold,index=list(G.nodes()))
-    Y = np.zeros(numnodes)
-    Y = pd.Series(Y,index=list(G.nodes()))
+    Y = {}
     for g in seed_nodes:
         # normalize total amount of heat added, allow for replacement
-        Y[g] = Y[g]+1/float(len(seed_nodes))
-    Fold = Y.copy(deep=True)
+        Y[node_to_index[g]] = Y.get(node_to_index[g],0)+1/float(len(seed_nodes))
+    return Y
 
-    for t in range(num_its):
-        Fnew = alpha*np.dot(Wprime,Fold) + np.multiply(1-alpha,Y)
-        Fold=Fnew
 
-    return Fnew
+def _dense_heats(heats, num_nodes):
+    '''
+    numpy array of num_nodes heats from a dictionary mapping node indices to heats.
+    '''
+
+    Y = np.zeros(num_nodes)
+    Y[np.fromiter(heats, dtype=np.int64, count=len(heats))] = list(heats.values())
+    return Y
+
+
+def _node_index(owner, labels):
+    '''
+    List of the node labels of an (adjacency, labels) network or labeled
+    operator (the owner of the labels: the adjacency matrix or operator),
+    and a dictionary mapping them to their positions. Cached for the last
+    few owners, so repeated queries on a large network do not rebuild them.
+    '''
+
+    key = (pipeline.object_token(owner), len(labels))
+    if key in _node_indices:
+        _node_indices[key] = _node_indices.pop(key) # mark as most recently used
+        return _node_indices[key]
+
+    nodes = list(labels)
+    _node_indices[key] = (nodes, dict(zip(nodes,range(len(nodes)))))
+    while len(_node_indices) > 2:
+        _node_indices.popitem(last=False)
+    return _node_indices[key]
+
+
+def _heat_vector(heat, nodes):
+    '''
+    numpy array of the heat of each of nodes, from a pandas Series, a
+    dictionary or an array already in node order. Missing nodes get 0.
+    '''
+
+    if hasattr(heat, 'reindex'):
+        return heat.reindex(nodes).fillna(0).values.astype(np.float64)
+    if isinstance(heat, dict):
+        return np.array([heat.get(n, 0) for n in nodes], dtype=np.float64)
+    return np.asarray(heat, dtype=np.float64)
 
 
 def set_num_nodes(G, num_nodes):